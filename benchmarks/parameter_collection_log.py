@@ -0,0 +1,79 @@
+"""
+Benchmark of the in-memory log of evaluated parameter sets: appending
+iterations to a `~dalek.fitter.fitter_log.ParameterCollectionLog` against
+growing a DataFrame with `DataFrame.append` (the previous implementation)
+
+    python benchmarks/parameter_collection_log.py [--iterations 1000]
+        [--samples 1000]
+"""
+import argparse
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from dalek.fitter.fitter_log import ParameterCollectionLog
+from dalek.parallel.parameter_collection import ParameterCollection
+
+
+def make_iteration(iteration, number_of_samples, number_of_parameters=8):
+    parameter_collection = ParameterCollection(
+        np.random.uniform(size=(number_of_samples, number_of_parameters)),
+        columns=['model.abundances.{0:d}'.format(i)
+                 for i in xrange(number_of_parameters)])
+    parameter_collection['dalek.fitness'] = np.random.uniform(
+        size=number_of_samples)
+    parameter_collection['dalek.current_iteration'] = iteration
+    parameter_collection['dalek.engine_id'] = np.random.randint(
+        64, size=number_of_samples)
+    parameter_collection['dalek.time_elapsed'] = np.random.uniform(
+        size=number_of_samples)
+    parameter_collection['dalek.failed'] = False
+    return parameter_collection
+
+
+def benchmark_parameter_collection_log(iterations):
+    start = time()
+    parameter_collection_log = ParameterCollectionLog()
+    for parameter_collection in iterations:
+        parameter_collection_log.append(parameter_collection)
+    append_time = time() - start
+    start = time()
+    parameter_collection_log.to_parameter_collection()
+    return append_time, time() - start
+
+
+def benchmark_dataframe_append(iterations):
+    start = time()
+    parameter_collection_log = None
+    for parameter_collection in iterations:
+        if parameter_collection_log is None:
+            parameter_collection_log = parameter_collection.copy()
+        else:
+            parameter_collection_log = parameter_collection_log.append(
+                parameter_collection, ignore_index=True)
+    return time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split(
+        '\n')[0])
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--samples', type=int, default=1000)
+    args = parser.parse_args()
+
+    np.random.seed(1)
+    iterations = [make_iteration(i, args.samples)
+                  for i in xrange(args.iterations)]
+    print('{0:d} iterations x {1:d} rows ({2:d} rows, {3:d} columns)'.format(
+        args.iterations, args.samples, args.iterations * args.samples,
+        len(iterations[0].columns)))
+    append_time, view_time = benchmark_parameter_collection_log(iterations)
+    print('ParameterCollectionLog.append: {0:.1f} s (+{1:.1f} s for a full '
+          'view)'.format(append_time, view_time))
+    print('DataFrame.append:              {0:.1f} s'.format(
+        benchmark_dataframe_append(iterations)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,4 @@
 import pandas as pd
-import h5py
 import numpy as np
 import pylab as plt
 from matplotlib import animation
@@ -12,13 +11,16 @@ from collections import OrderedDict
 from tardis.io.config_reader import ConfigurationNameSpace
 
 from dalek import triangle
+from dalek.fitter.fitter_log import read_fitter_log
+from dalek.fitter.optimizers import ensemble_chains
+from dalek.fitter.spectral_store import SpectralStore
 
 
 class Analyse(object):
 
     def __init__(self, fitter_log_fname, spectral_store_fname=None,
                  normalize_abundances=True):
-        self.fitter_log = pd.read_csv(fitter_log_fname, index_col=0)
+        self.fitter_log = read_fitter_log(fitter_log_fname)
 
         self.spectral_store_fname = spectral_store_fname
         self.data_columns = [item for item in self.fitter_log.columns
@@ -77,11 +79,42 @@ class Analyse(object):
 
         return param_evolution_hist
 
-    def visualize_triangle_plot(self, truth_config=None, plot_contours=False, bins=100):
+    def mcmc_samples(self, burn_in=0):
+        """
+        Posterior samples of an ensemble sampler fit - the positions of all
+        walkers after the burn-in steps
+
+        Parameters
+        ----------
+
+        burn_in: ~int
+            number of steps to discard [default=0]
+
+        Returns
+        -------
+            : ~pd.DataFrame
+        """
+        chains = ensemble_chains(self.fitter_log, self.data_columns)
+        return pd.DataFrame(
+            chains[burn_in:].reshape(-1, len(self.data_columns)),
+            columns=self.data_columns)
+
+    def visualize_triangle_plot(self, truth_config=None, plot_contours=False,
+                                bins=100, mcmc_burn_in=None):
+        """
+        Triangle plot of the parameters - for an ensemble sampler fit
+        (mcmc_burn_in given) the unweighted posterior samples of the chains,
+        otherwise all logged parameter sets weighted by 1/fitness
+        """
         if truth_config is not None:
             truth_config = ConfigurationNameSpace.from_yaml(truth_config)
 
-        fitness = self.fitter_log['dalek.fitness']
+        if mcmc_burn_in is not None:
+            samples = self.mcmc_samples(burn_in=mcmc_burn_in)
+            weights = None
+        else:
+            samples = self.fitter_log[self.data_columns]
+            weights = 1 / self.fitter_log['dalek.fitness']
         truths = []
         for column in self.data_columns:
 
@@ -95,7 +128,7 @@ class Analyse(object):
 
 
 
-        triangle.corner(self.fitter_log[self.data_columns], weights=1/fitness,
+        triangle.corner(samples, weights=weights,
                         labels=self.data_labels.values(), plot_contours=plot_contours,
                         normed=True, truths=truths, bins=bins)
 
@@ -105,19 +138,18 @@ class Analyse(object):
         fit_wave, fit_flux = np.loadtxt(fit_spectrum, unpack=True)
         fit_flux = savitzky_golay(fit_flux, 21, 3)
         iterations = self.fitter_log['dalek.current_iteration'].unique()
-        fh = h5py.File(spectral_store, 'r')
-        fluxes = []
+        store = SpectralStore(spectral_store, read_only=True)
+        spec_indices = []
         for i in iterations:
             if mode == 'best':
-                spec_idx = (self.fitter_log[
+                spec_indices.append(self.fitter_log[
                                 self.fitter_log['dalek.current_iteration'] == i]
                             ['dalek.fitness'].argmin())
-            fluxes.append(savitzky_golay(np.array(fh['spectral_store/'
-                                      'spectrum{0}'.format(spec_idx)]), 21, 3))
 
-        fluxes = np.array(fluxes)
+        fluxes = np.array([savitzky_golay(flux, 21, 3)
+                           for flux in store.get_spectra(spec_indices)])
 
-        fh.close()
+        store.close()
 
         # First set up the figure, the axis, and the plot element we want to animate
         fig = plt.figure(facecolor='black')
@@ -162,22 +194,18 @@ class Analyse(object):
         fit_wave, fit_flux = np.loadtxt(fit_spectrum, unpack=True)
         fit_flux = savitzky_golay(fit_flux, 21, 3)
         iterations = self.fitter_log['dalek.current_iteration'].unique()
-        fh = h5py.File(spectral_store, 'r')
-        fluxes = []
+        store = SpectralStore(spectral_store, read_only=True)
         fluxes_min = []
         fluxes_max = []
 
         for i in iterations:
             spec_indices = self.fitter_log.index[self.fitter_log['dalek.current_iteration'] == i]
-            fluxes = []
-            for y in spec_indices:
-                fluxes.append(savitzky_golay(np.array(fh['spectral_store/'
-                                          'spectrum{0}'.format(y)]), 21, 3))
-            fluxes = np.array(fluxes)
+            fluxes = np.array([savitzky_golay(flux, 21, 3)
+                               for flux in store.get_spectra(spec_indices)])
             fluxes_min.append(fluxes.min(axis=0))
             fluxes_max.append(fluxes.max(axis=0))
 
-        fh.close()
+        store.close()
 
         # First set up the figure, the axis, and the plot element we want to animate
         fig = plt.figure(facecolor='black')
@@ -1,20 +1,35 @@
 from abc import ABCMeta, abstractmethod
-from dalek.parallel.launcher import FitterLauncher, fitter_worker
+from dalek.parallel.launcher import (FitterLauncher, fitter_worker,
+                                    fitter_delta_worker)
+from dalek.parallel.backends import LocalBackend
 from dalek.fitter.optimizers import optimizer_dict as all_optimizer_dict
+from dalek.fitter.optimizers import IslandModel, EnsembleSampler
+from dalek.fitter.surrogate import SurrogateOptimizer
+from dalek.fitter.noise import AdaptiveReevaluation, measured_noise_level
+from dalek.fitter.convergence import ConvergenceMonitor
+from dalek.fitter.transforms import AbundanceTransform
+from dalek.fitter.sampling import sampler_dict
 from dalek.fitter.fitness_function import fitness_function_dict as all_fitness_function_dict
 import numpy as np
 from tardis.io.config_reader import ConfigurationNameSpace
 from tardis.atomic import AtomData
 import logging
 import sys, os
+import random
 import yaml
 from collections import OrderedDict
-import h5py
 import pandas as pd
-from time import time
+from time import time, sleep
 
 
 from dalek.parallel.parameter_collection import ParameterCollection
+from dalek.fitter.fitter_log import (open_fitter_log, read_fitter_log,
+                                     convert_csv_fitter_log,
+                                     ParameterCollectionLog, write_checkpoint,
+                                     read_checkpoint)
+from dalek.fitter.spectral_store import SpectralStore
+from dalek.fitter.evaluation_cache import (EvaluationCache, CachedResult,
+                                           config_hash)
 
 
 logger = logging.getLogger(__name__)
@@ -68,7 +83,8 @@ class OrderedDictYAMLLoader(yaml.Loader):
         return mapping
 
 
-def run_fitter(dalek_configuration_fname, init_sleep_time=300):
+def run_fitter(dalek_configuration_fname, init_sleep_time=300,
+               local_processes=None):
     """
     Function to start a fit with the given configuration name
 
@@ -82,26 +98,36 @@ def run_fitter(dalek_configuration_fname, init_sleep_time=300):
         time to sleep (in seconds) until to try again to see
         if engines have connected (default 300s)
 
+    local_processes: ~int
+        if given, run the fit on this many local processes instead of an
+        IPython cluster (0 uses all CPUs)
+
     Returns
     -------
         : dalek.BaseFitter
     """
 
-    from IPython.parallel import Client
+    if local_processes is not None:
+        remote_clients = LocalBackend(local_processes or None)
+        logger.info('Running fit on {0} local processes'.format(
+            len(remote_clients)))
+    else:
+        from IPython.parallel import Client
 
-    while True:
-        rc = Client()
-        if len(rc) > 0:
-            break
-        logger.info('No engines currently connected. Sleeping for {0} s '
-                    'before trying again'.format(init_sleep_time))
-        time.sleep(init_sleep_time)
+        while True:
+            remote_clients = Client()
+            if len(remote_clients) > 0:
+                break
+            logger.info('No engines currently connected. Sleeping for {0} s '
+                        'before trying again'.format(init_sleep_time))
+            sleep(init_sleep_time)
 
-    logger.info('{0} engines connected starting fit in 30 s'.format(len(rc)))
+        logger.info('{0} engines connected starting fit in 30 s'.format(
+            len(remote_clients)))
 
     fitter_conf = FitterConfiguration.from_yaml(dalek_configuration_fname)
-    fitter = BaseFitter(rc, fitter_conf)
-    fitter.run_fitter(fitter_conf.get_initial_parameter_collection())
+    fitter = BaseFitter(remote_clients, fitter_conf)
+    fitter.run_fitter(fitter.get_initial_parameter_collection())
 
     return fitter
 
@@ -127,6 +153,72 @@ class FitterConfiguration(object):
         the default config
 
     generate_initial_paramater_collection:
+
+    asynchronous: ~bool
+        if True candidates are handed out to the engines as soon as any engine
+        is free and the optimizer is updated in steady-state fashion instead of
+        waiting for the whole iteration to finish [default=False]
+
+    evaluation_cache: ~dalek.fitter.evaluation_cache.EvaluationCache
+        cache answering repeated parameter sets without running TARDIS
+        [default=None]
+
+    config_deltas: ~bool
+        push the default config to the engines once and only send the changed
+        configuration items of each parameter set [default=False]
+
+    chunk_size: ~int or 'auto'
+        number of parameter sets sent to an engine in one task, 'auto' chooses
+        it from the run times of the previous iteration [default=1]
+
+    result_format: ~str
+        what the engines send back besides the fitness ('spectrum', 'fitness',
+        'flux' or 'features') [default=None - 'flux' if a spectral store is
+        configured, otherwise 'fitness']
+
+    fault_tolerance: ~dict
+        keyword arguments timeout, max_retries, speculation_threshold and
+        penalty_fitness for the `~dalek.parallel.launcher.FitterLauncher`,
+        only available on an IPython cluster [default=None - failing runs
+        abort the fit]
+
+    checkpoint: ~str
+        file to which the optimizer state is written after every iteration
+        and from which it is restored on resume [default=None - the fitter
+        log name with '.checkpoint' appended if a fitter log is given, False
+        disables checkpointing]
+
+    multi_fidelity: ~dict
+        'levels' - list of {dotted.key: value} configuration overrides from
+        the cheapest to the full fidelity (e.g. {montecarlo.no_of_packets:
+        1e4, montecarlo.iterations: 5}, the last level is usually {}) and
+        'promotion_fraction' - fraction of the candidates of a level that is
+        evaluated at the next level [default=None - single fidelity]
+
+    initial_sampling: ~dict
+        'name' of the design in `~dalek.fitter.sampling.sampler_dict`
+        ('uniform', 'sobol', 'lhs' or 'maximin') for the initial parameter
+        collection and keyword arguments of the sampler (e.g. seed)
+        [default=None - uniform]
+
+    reevaluation: ~dict
+        keyword arguments of `~dalek.fitter.noise.AdaptiveReevaluation`
+        (noise_level, threshold, max_replicates, seed) - candidates within
+        the noise level of the incumbent are run again with new Monte Carlo
+        seeds and get the mean fitness of their replicates. Instead of
+        noise_level, noise_log can name the fitter log of a
+        noise_measurement fit the noise level is measured from
+        [default=None - every candidate is run once]
+
+    stopping_criteria: ~dict
+        {name in `~dalek.fitter.convergence.stopping_criterion_dict`
+        ('plateau', 'relative_improvement', 'diversity' or 'budget'):
+        keyword arguments} evaluated after every iteration - the fit stops
+        before max_iterations as soon as one of them is met [default=None]
+
+    abundance_transform: ~dalek.fitter.transforms.AbundanceTransform
+        log-ratio search space of the optimizer for the abundances - the
+        optimizer has to be created with its search_config [default=None]
     """
 
 
@@ -151,30 +243,78 @@ class FitterConfiguration(object):
 
         number_of_samples = conf_dict['fitter']['number_of_samples']
         max_iterations = conf_dict['fitter']['max_iterations']
-        optimizer_dict = conf_dict['fitter'].pop('optimizer')
-        optimizer_class = all_optimizer_dict[optimizer_dict.pop('name')]
-        optimizer = optimizer_class(parameter_config, number_of_samples,
-                                    **optimizer_dict)
         fitness_function_dict = conf_dict['fitter'].pop('fitness_function')
         fitness_function_class = all_fitness_function_dict[
             fitness_function_dict.pop('name')]
         fitness_function = fitness_function_class(**fitness_function_dict)
 
+        abundance_transform_dict = conf_dict['fitter'].get(
+            'abundance_transform', None)
+        if abundance_transform_dict is not None:
+            abundance_transform = AbundanceTransform(
+                parameter_config, **abundance_transform_dict)
+            optimizer_parameter_config = abundance_transform.search_config
+        else:
+            abundance_transform = None
+            optimizer_parameter_config = parameter_config
+
+        optimizer_dict = conf_dict['fitter'].pop('optimizer')
+        optimizer_class = all_optimizer_dict[optimizer_dict.pop('name')]
+        if optimizer_class.requires_fitness_function:
+            optimizer_dict['fitness_function'] = fitness_function
+        surrogate_dict = optimizer_dict.pop('surrogate', None)
+        if surrogate_dict is not None:
+            oversampling = surrogate_dict.pop('oversampling', 4)
+            optimizer = SurrogateOptimizer(
+                optimizer_parameter_config, number_of_samples,
+                optimizer_class(optimizer_parameter_config,
+                                number_of_samples * oversampling,
+                                **optimizer_dict),
+                oversampling=oversampling, **surrogate_dict)
+        else:
+            optimizer = optimizer_class(optimizer_parameter_config,
+                                        number_of_samples, **optimizer_dict)
+
         resume = conf_dict['fitter'].get('resume', resume_fit)
         fitter_log = conf_dict['fitter'].get('fitter_log', None)
+        asynchronous = conf_dict['fitter'].get('asynchronous', False)
+        config_deltas = conf_dict['fitter'].get('config_deltas', False)
+        chunk_size = conf_dict['fitter'].get('chunk_size', 1)
+        result_format = conf_dict['fitter'].get('result_format', None)
+        fault_tolerance = conf_dict['fitter'].get('fault_tolerance', None)
+        checkpoint = conf_dict['fitter'].get('checkpoint', None)
+        multi_fidelity = conf_dict['fitter'].get('multi_fidelity', None)
+        initial_sampling = conf_dict['fitter'].get('initial_sampling', None)
+        reevaluation = conf_dict['fitter'].get('reevaluation', None)
+        stopping_criteria = conf_dict['fitter'].get('stopping_criteria', None)
+        generate_initial_parameter_collection = getattr(
+            optimizer, 'generate_initial_parameter_collection', None)
 
         spectral_store_dict = conf_dict['fitter'].get('spectral_store', None)
         if spectral_store_dict is not None:
             spectral_store_fname = spectral_store_dict['fname']
             spectral_store_mode = spectral_store_dict.get('mode', 'all')
             spectral_store_clobber = spectral_store_dict.get('clobber', False)
+            spectral_store_float32 = spectral_store_dict.get('float32', False)
             spectral_store = SpectralStore(spectral_store_fname,
                                            mode=spectral_store_mode,
                                            resume=resume,
-                                           clobber=spectral_store_clobber)
+                                           clobber=spectral_store_clobber,
+                                           float32=spectral_store_float32,
+                                           k=spectral_store_dict.get('k'),
+                                           thin_every=spectral_store_dict.get(
+                                               'thin_every'))
         else:
             spectral_store = None
 
+        evaluation_cache_dict = conf_dict['fitter'].get('evaluation_cache',
+                                                        None)
+        if evaluation_cache_dict is not None:
+            evaluation_cache = EvaluationCache(
+                parameter_config, config_hash(default_config),
+                **evaluation_cache_dict)
+        else:
+            evaluation_cache = None
 
 
 
@@ -184,7 +324,19 @@ class FitterConfiguration(object):
                    default_config=default_config, atom_data=atom_data,
                    number_of_samples=number_of_samples,
                    max_iterations=max_iterations, fitter_log=fitter_log,
-                   spectral_store=spectral_store, resume=resume)
+                   spectral_store=spectral_store, resume=resume,
+                   asynchronous=asynchronous,
+                   evaluation_cache=evaluation_cache,
+                   config_deltas=config_deltas, chunk_size=chunk_size,
+                   result_format=result_format,
+                   fault_tolerance=fault_tolerance, checkpoint=checkpoint,
+                   multi_fidelity=multi_fidelity,
+                   initial_sampling=initial_sampling,
+                   reevaluation=reevaluation,
+                   stopping_criteria=stopping_criteria,
+                   abundance_transform=abundance_transform,
+                   generate_initial_parameter_collection=
+                   generate_initial_parameter_collection)
 
 
 
@@ -194,7 +346,12 @@ class FitterConfiguration(object):
     def __init__(self, optimizer, fitness_function, parameter_config, default_config,
                  atom_data, number_of_samples, max_iterations=50,
                  generate_initial_parameter_collection=None, fitter_log=None,
-                 spectral_store=None, resume=None):
+                 spectral_store=None, resume=None, asynchronous=False,
+                 evaluation_cache=None, config_deltas=False, chunk_size=1,
+                 result_format=None, fault_tolerance=None, checkpoint=None,
+                 multi_fidelity=None, initial_sampling=None,
+                 reevaluation=None, stopping_criteria=None,
+                 abundance_transform=None):
 
         self.optimizer = optimizer
         self.fitness_function = fitness_function
@@ -208,11 +365,87 @@ class FitterConfiguration(object):
             generate_initial_parameter_collection
         self.fitter_log = fitter_log
         self.spectral_store = spectral_store
+        self.asynchronous = asynchronous
+        self.evaluation_cache = evaluation_cache
+        self.config_deltas = config_deltas
+        self.chunk_size = chunk_size
+        if result_format is None:
+            result_format = 'flux' if spectral_store is not None else 'fitness'
+        self.result_format = result_format
+        self.fault_tolerance = dict(fault_tolerance or {})
+        if (fitter_log is not None and
+                os.path.splitext(fitter_log)[1].lower() == '.csv'):
+            # CSV logs can only be read - the fit continues in a binary log
+            # next to it
+            binary_fitter_log = os.path.splitext(fitter_log)[0] + '.h5'
+            if (resume is not False and os.path.exists(fitter_log) and
+                    not os.path.exists(binary_fitter_log)):
+                logger.info('Converting the CSV fitter log {0} to {1} - the '
+                            'fit is continued in {1}'.format(
+                                fitter_log, binary_fitter_log))
+                convert_csv_fitter_log(fitter_log, binary_fitter_log)
+            else:
+                logger.info('CSV fitter logs can only be read - writing the '
+                            'fitter log to {0}'.format(binary_fitter_log))
+            fitter_log = binary_fitter_log
+            self.fitter_log = fitter_log
+        if checkpoint is None and fitter_log is not None:
+            checkpoint = fitter_log + '.checkpoint'
+        self.checkpoint = checkpoint or None
+        self.initial_sampling = dict(initial_sampling or {'name': 'uniform'})
+
+        multi_fidelity = dict(multi_fidelity or {})
+        self.fidelity_levels = [dict(level) for level in
+                                multi_fidelity.get('levels', [])]
+        self.promotion_fraction = multi_fidelity.get('promotion_fraction',
+                                                     1 / 3.)
+        if len(self.fidelity_levels) > 0 and asynchronous:
+            raise ValueError('Multi-fidelity evaluation is only available for '
+                             'the synchronous fitter')
+        if not 0 < self.promotion_fraction <= 1:
+            raise ValueError('promotion_fraction has to be in (0, 1] - got '
+                             '{0}'.format(self.promotion_fraction))
+
+        self.reevaluation = (dict(reevaluation) if reevaluation is not None
+                             else None)
+        if self.reevaluation is not None and 'noise_log' in self.reevaluation:
+            noise_log = self.reevaluation.pop('noise_log')
+            noise_level = measured_noise_level(read_fitter_log(noise_log))
+            if noise_level is None:
+                raise ValueError('The noise measurement {0} has no parameter '
+                                 'set with two successful runs'.format(
+                                     noise_log))
+            logger.info('Using the noise level {0:g} measured in {1}'.format(
+                noise_level, noise_log))
+            self.reevaluation['noise_level'] = noise_level
+        self.stopping_criteria = dict(stopping_criteria or {})
+        self.abundance_transform = abundance_transform
+        if self.reevaluation is not None and asynchronous:
+            raise ValueError('reevaluation is not supported by the '
+                             'asynchronous fitter')
+        if self.reevaluation is not None and len(self.fidelity_levels) > 0:
+            raise ValueError('reevaluation can not be combined with '
+                             'multi_fidelity')
+        if isinstance(optimizer, IslandModel) and (
+                asynchronous or len(self.fidelity_levels) > 0 or
+                self.reevaluation is not None):
+            raise ValueError('The islands of an island model are run with '
+                             'single fidelity, without re-evaluation and '
+                             'asynchronous to each other already')
+        if isinstance(getattr(optimizer, 'optimizer', optimizer),
+                      EnsembleSampler) and (
+                isinstance(optimizer, SurrogateOptimizer) or
+                len(self.fidelity_levels) > 0 or self.reevaluation is not None):
+            raise ValueError('The ensemble sampler needs the likelihood of '
+                             'every proposal at full fidelity - it can not be '
+                             'combined with a surrogate, multi-fidelity '
+                             'evaluation or re-evaluation')
 
         self.resume = resume
         self.current_iteration = 0
 
-        if os.path.exists(fitter_log) and self.resume is None:
+        if (fitter_log is not None and os.path.exists(fitter_log)
+                and self.resume is None):
             logger.info('Detected an old logfile {0} - resuming'.format(fitter_log))
             self.resume = True
 
@@ -221,8 +454,7 @@ class FitterConfiguration(object):
                 raise IOError('Requested resume - but previous fitter log ({0})'
                               ' doesn\'t exist'.format(fitter_log))
 
-            resume_log = ParameterCollection(
-                pd.read_csv(fitter_log, index_col=0))
+            resume_log = read_fitter_log(fitter_log)
 
             log_parameters = set([item for item in resume_log.columns
                                   if not (item.startswith('dalek.') or
@@ -254,6 +486,13 @@ class FitterConfiguration(object):
     def resume_generate_parameters(self, number_of_samples=None):
         mask = (self.resume_log['dalek.current_iteration'] ==
                 self.current_iteration - 1)
+        if 'dalek.fidelity' in self.resume_log.columns:
+            # every candidate of the iteration was evaluated at the lowest level
+            mask &= self.resume_log['dalek.fidelity'] == 0
+        if (self.reevaluation is not None and
+                'dalek.seed' in self.resume_log.columns):
+            # the candidates and not their replicates
+            mask &= ~(self.resume_log['dalek.seed'] >= 0)
         return self.resume_log[mask]
 
 
@@ -278,66 +517,25 @@ class FitterConfiguration(object):
         if self.resume:
             return self.resume_generate_parameters().reset_index()
 
-        initial_data = np.array([np.random.uniform(lbound, ubound,
-                                          size=number_of_samples)
-                        for lbound, ubound in self.parameter_config.parameter_bounds])
+        if self.initial_sampling['name'] == 'uniform':
+            initial_data = np.array([np.random.uniform(lbound, ubound,
+                                              size=number_of_samples)
+                            for lbound, ubound in self.parameter_config.parameter_bounds])
 
-        initial_paramater_collection = ParameterCollection(
-            initial_data.T, columns=self.parameter_config.parameter_names)
+            initial_paramater_collection = ParameterCollection(
+                initial_data.T, columns=self.parameter_config.parameter_names)
+        else:
+            sampler_kwargs = dict(self.initial_sampling)
+            sampler_class = sampler_dict[sampler_kwargs.pop('name')]
+            initial_paramater_collection = sampler_class(
+                self.parameter_config, number_of_points=number_of_samples,
+                **sampler_kwargs).generate(number_of_samples)
         return self.optimizer.normalize_parameter_collection(
             initial_paramater_collection)
 
 
 
 
-class SpectralStore(object):
-    """
-    Spectral store to store the generated spectra in an HDF5 file
-
-    Parameters
-    ----------
-
-    h5_fname: ~str
-        path to HDF5 file to store it in
-
-    spectral_store_name: ~str
-        string for path in h5py [default='spectral_store']
-
-    mode: ~str
-        mode to store spectra, currently only 'all' is supported
-
-    """
-
-    def __init__(self, h5_fname, spectral_store_name='spectral_store',
-                 mode='all', clobber=False, resume=False):
-        self.h5_fname = h5_fname
-        self.spectral_store_name = spectral_store_name
-        self.mode = mode.strip().lower()
-
-        if os.path.exists(h5_fname) and not (clobber or resume):
-            raise IOError('HDF5 spectral store {0} exists - '
-                          'will not overwrite'.format(h5_fname))
-        if resume:
-            self.h5_file_handle = h5py.File(h5_fname, mode='a')
-        else:
-            self.h5_file_handle = h5py.File(h5_fname, mode='w')
-
-    def store_spectrum(self, id, spectrum):
-        specname = 'spectrum{:d}'.format(id)
-        self.h5_file_handle[os.path.join(self.spectral_store_name, specname)] = \
-            spectrum.flux_lambda.value
-
-
-    def store_spectra(self, spectra, indices, parameter_collection=None):
-        if self.mode == 'all':
-            for idx, spectrum in zip(indices, spectra):
-                self.store_spectrum(idx, spectrum)
-
-
-        self.h5_file_handle.flush()
-
-
-
 class ParameterConfiguration(object):
     """
     Configuration of the different Parameters
@@ -382,18 +580,37 @@ class BaseFitter(object):
     Parameters
     ----------
 
+    remote_clients: ~IPython.parallel.Client or ~dalek.parallel.backends.BaseBackend
+        IPython remote clients or an execution backend
+
+    fitter_configuration: ~dalek.fitter.FitterConfiguration
+
+    worker: func
+        worker function running on the engines [default=fitter_worker or
+        fitter_delta_worker if the configuration asks for config_deltas]
 
     """
 
     def __init__(self, remote_clients,
-                 fitter_configuration, worker=fitter_worker):
+                 fitter_configuration, worker=None):
 
         self.fitter_configuration = fitter_configuration
         self.default_config = fitter_configuration.default_config
+        self.config_deltas = fitter_configuration.config_deltas
+
+        if worker is None:
+            worker = fitter_delta_worker if self.config_deltas else fitter_worker
 
+        self.result_format = fitter_configuration.result_format
+        self.wavelength = None
         self.launcher = FitterLauncher(
             remote_clients, self.fitter_configuration.fitness_function,
-            fitter_configuration.atom_data, worker)
+            fitter_configuration.atom_data, worker,
+            chunk_size=fitter_configuration.chunk_size,
+            result_format=self.result_format,
+            **fitter_configuration.fault_tolerance)
+        if self.config_deltas:
+            self.launcher.push_default_config(self.default_config)
 
         self.optimizer = self.fitter_configuration.optimizer
         
@@ -401,80 +618,564 @@ class BaseFitter(object):
 
         self.fitter_log = fitter_configuration.fitter_log
         self.spectral_store = fitter_configuration.spectral_store
+        self.evaluation_cache = fitter_configuration.evaluation_cache
         self.current_iteration = fitter_configuration.current_iteration
         if self.fitter_configuration.resume:
-            self.parameter_collection_log = self.fitter_configuration.resume_log
+            self.parameter_collection_log = (
+                ParameterCollectionLog.from_parameter_collection(
+                    self.fitter_configuration.resume_log))
+            if isinstance(self.optimizer, SurrogateOptimizer):
+                self.optimizer.surrogate.add_parameter_collection(
+                    self.fitter_configuration.resume_log)
+            if self.evaluation_cache is not None:
+                self.evaluation_cache.add_log(
+                    self.fitter_configuration.resume_log,
+                    self.parameter_collection_log.index,
+                    fidelity=len(fitter_configuration.fidelity_levels) - 1)
         else:
-            self.parameter_collection_log = None
-
+            self.parameter_collection_log = ParameterCollectionLog()
 
+        if fitter_configuration.reevaluation is not None:
+            self.reevaluation = AdaptiveReevaluation(
+                **fitter_configuration.reevaluation)
+            if self.fitter_configuration.resume:
+                self.add_replicates(self.fitter_configuration.resume_log)
+        else:
+            self.reevaluation = None
+
+        if len(fitter_configuration.stopping_criteria) > 0:
+            self.convergence_monitor = ConvergenceMonitor.from_config_dict(
+                fitter_configuration.parameter_config,
+                fitter_configuration.stopping_criteria)
+            if self.fitter_configuration.resume:
+                self.convergence_monitor.add_log(
+                    self.fitter_configuration.resume_log)
+        else:
+            self.convergence_monitor = None
+        self.monitored_rows = len(self.parameter_collection_log)
+        self.stopping_reason = None
+        self.abundance_transform = fitter_configuration.abundance_transform
+
+        if self.fitter_log is not None:
+            self.fitter_log_writer = open_fitter_log(
+                self.fitter_log, clobber=not self.fitter_configuration.resume)
+            self.logged_rows = len(self.fitter_log_writer)
+        else:
+            self.fitter_log_writer = None
+
+        self.checkpoint = fitter_configuration.checkpoint
+        self.checkpoint_parameters = None
+        if self.checkpoint is not None and os.path.exists(self.checkpoint):
+            if self.fitter_configuration.resume:
+                self.load_checkpoint()
+            else:
+                logger.info('Removing old checkpoint {0}'.format(
+                    self.checkpoint))
+                os.remove(self.checkpoint)
+        if (self.fitter_configuration.resume and
+                self.checkpoint_parameters is None):
+            # no optimizer state to restore - e.g. skip the design points of
+            # a random sampling fit that are already in the log
+            self.optimizer.resume_from_log(
+                self.fitter_configuration.resume_log)
+
+
+
+    def clean_dalek_results(self, dalek_results, launcher=None):
+        (launcher or self.launcher).backend.clean(dalek_results)
+
+    def assign_results(self, parameter_collection, results, metadata,
+                       cached=None):
+        """
+        Write the results and metadata coming back from the engines into the
+        'dalek.*' columns of the parameter collection
 
-    def clean_dalek_results(self, dalek_results):
-        for msg_id in dalek_results.msg_ids:
-            if msg_id in self.launcher.lbv.results:
-                del self.launcher.lbv.results[msg_id]
+        Parameters
+        ----------
 
-            if msg_id in  self.launcher.remote_clients.results:
-                del self.launcher.remote_clients.results[msg_id]
+        parameter_collection: ~dalek.parallel.ParameterCollection
 
-            if msg_id in self.launcher.remote_clients.metadata:
-                del self.launcher.remote_clients.metadata[msg_id]
+        results: ~list
+            list of (fitness, payload[, wavelength]) tuples as returned by the
+            worker (see `~dalek.parallel.launcher.compact_worker_result`)
 
-    def evaluate_parameter_collection(self, parameter_collection):
-        config_dict_list = parameter_collection.to_config(self.default_config)
-        fitnesses_result = self.launcher.queue_parameter_set_list(
-            config_dict_list)
+        metadata: ~list
+            list of the metadata dictionaries of the tasks
 
-        while fitnesses_result.progress < len(fitnesses_result):
-            fitnesses_result.wait(timeout=1)
-            sys.stdout.write('\r{0}/{1} TARDIS runs done for current iteration'.format(
-                fitnesses_result.progress, len(fitnesses_result)))
-            sys.stdout.flush()
-        print ' - done with iterations'
-        fitnesses = zip(*fitnesses_result.result)[0]
-        spectra = zip(*fitnesses_result.result)[1]
+        cached: ~list of ~bool
+            which of the results were answered by the evaluation cache
 
-        self.clean_dalek_results(fitnesses_result)
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection, ~list of spectra
+        """
+        fitnesses = [result[0] for result in results]
+        spectra = [result[1] for result in results]
+        for result in results:
+            if len(result) > 2 and result[2] is not None:
+                self.wavelength = result[2]
+
+        if self.result_format == 'features':
+            number_of_features = max([len(features) for features in spectra
+                                      if features is not None] + [0])
+            features = np.ones((len(spectra), number_of_features)) * np.nan
+            for i, row_features in enumerate(spectra):
+                if row_features is not None:
+                    features[i] = row_features
+            for i in xrange(number_of_features):
+                parameter_collection['dalek.feature{0:d}'.format(i)] = (
+                    features[:, i])
+            spectra = [None] * len(spectra)
 
         parameter_collection['dalek.fitness'] = fitnesses
         parameter_collection['dalek.time_elapsed'] = [(item['completed'] -
                                                        item['started']).
                                                           total_seconds()
-                                                      for item in
-                                                      fitnesses_result.metadata]
+                                                      for item in metadata]
         parameter_collection['dalek.engine_id'] = [item['engine_id']
-                                                   for item in
-                                                   fitnesses_result.metadata]
+                                                   for item in metadata]
         parameter_collection['dalek.current_iteration'] = self.current_iteration
+        if self.launcher.fault_tolerant:
+            parameter_collection['dalek.failed'] = [item.get('failed', False)
+                                                    for item in metadata]
+        if self.evaluation_cache is not None:
+            if cached is None:
+                cached = np.zeros(len(parameter_collection), dtype=bool)
+            parameter_collection['dalek.cached'] = cached
 
+        return parameter_collection, spectra
 
+    def to_tasks(self, parameter_collection, config_overrides=None):
+        """
+        Convert a parameter collection to the task arguments for the worker -
+        either full TARDIS configurations or configuration deltas
 
-        return parameter_collection, spectra
+        Parameters
+        ----------
 
+        parameter_collection: ~dalek.parallel.ParameterCollection
 
-    def run_single_fitter_iteration(self, parameter_collection):
-        evaluated_parameter_collection, spectra = (
-            self.evaluate_parameter_collection(parameter_collection))
+        config_overrides: ~dict
+            configuration items set in all tasks (fidelity level)
+            [default=None]
+
+        Returns
+        -------
+            : ~list
+        """
+        if self.config_deltas:
+            return parameter_collection.to_config_deltas(
+                config_overrides=config_overrides)
+        else:
+            return parameter_collection.to_config(
+                self.default_config, config_overrides=config_overrides)
+
+    def complete_parameter_collection(self, parameter_collection):
+        """
+        Map the log-ratio coordinates of the optimizer to the abundances of
+        the TARDIS configuration (or the initial abundances to coordinates)
+        if an abundance transform is configured
+        """
+        if self.abundance_transform is None:
+            return parameter_collection
+        return self.abundance_transform.complete(parameter_collection)
+
+    def get_cached_result(self, fitness, log_index):
+        """
+        Result object for a cache hit - the spectrum is taken from the
+        spectral store if requested and available
+        """
+        spectrum = None
+        if self.evaluation_cache.spectra and self.spectral_store is not None:
+            try:
+                spectrum = self.spectral_store.get_spectra([log_index])[0]
+            except KeyError:
+                pass
+        return CachedResult(fitness, spectrum)
+
+    def submit_parameter_collection(self, parameter_collection,
+                                    config_overrides=None, launcher=None):
+        """
+        Answer what the evaluation cache knows and queue the remaining
+        parameter sets without waiting for them
 
+        Parameters
+        ----------
 
+        parameter_collection: ~dalek.parallel.ParameterCollection
 
+        config_overrides: ~dict
+            configuration items set in all tasks [default=None]
 
-        if self.parameter_collection_log is None:
-            self.parameter_collection_log = evaluated_parameter_collection.copy()
+        launcher: ~dalek.parallel.launcher.FitterLauncher
+            [default=None - the launcher of the fitter]
+
+        Returns
+        -------
+            : ~tuple
+            pending evaluation for `evaluation_ready` and
+            `collect_parameter_collection`
+        """
+        launcher = launcher or self.launcher
+        parameter_collection = self.complete_parameter_collection(
+            parameter_collection)
+        results = [None] * len(parameter_collection)
+        metadata = [None] * len(parameter_collection)
+
+        # the cache only holds results of the full fidelity and default seed
+        if (self.evaluation_cache is not None and not config_overrides and
+                'dalek.seed' not in parameter_collection.columns):
+            cached, cached_fitness, cached_log_index = (
+                self.evaluation_cache.lookup(parameter_collection))
+            for i in np.where(cached)[0]:
+                cached_result = self.get_cached_result(cached_fitness[i],
+                                                       cached_log_index[i])
+                results[i] = cached_result.get()
+                metadata[i] = cached_result.metadata
+            logger.info('{0} of {1} parameter sets found in the evaluation '
+                        'cache'.format(cached.sum(), len(parameter_collection)))
+        else:
+            cached = np.zeros(len(parameter_collection), dtype=bool)
+
+        run_indices = np.where(~cached)[0]
+        if len(run_indices) > 0:
+            config_dict_list = self.to_tasks(
+                parameter_collection.iloc[run_indices],
+                config_overrides=config_overrides)
+            fitnesses_result = launcher.queue_parameter_set_list(
+                config_dict_list)
         else:
-            self.parameter_collection_log = self.parameter_collection_log.append(
-                evaluated_parameter_collection, ignore_index=True)
+            fitnesses_result = None
+
+        return (parameter_collection, results, metadata, cached, run_indices,
+                fitnesses_result)
+
+    @staticmethod
+    def evaluation_ready(pending_evaluation):
+        fitnesses_result = pending_evaluation[-1]
+        return (fitnesses_result is None or
+                fitnesses_result.progress >= len(fitnesses_result))
+
+    def collect_parameter_collection(self, pending_evaluation, launcher=None):
+        """
+        Assign the results of a finished pending evaluation (see
+        `submit_parameter_collection`)
 
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection, ~list of spectra
+        """
+        launcher = launcher or self.launcher
+        (parameter_collection, results, metadata, cached, run_indices,
+         fitnesses_result) = pending_evaluation
+        if fitnesses_result is not None:
+            for i, result, result_metadata in zip(run_indices,
+                                                  fitnesses_result.result,
+                                                  fitnesses_result.metadata):
+                results[i] = result
+                metadata[i] = result_metadata
+
+            self.clean_dalek_results(fitnesses_result, launcher=launcher)
+
+        evaluated_parameter_collection, spectra = self.assign_results(
+            parameter_collection, results, metadata, cached=cached)
+        launcher.record_time_elapsed(
+            evaluated_parameter_collection['dalek.time_elapsed'].values[~cached])
+
+        return evaluated_parameter_collection, spectra
+
+    def evaluate_parameter_collection(self, parameter_collection,
+                                      config_overrides=None):
+        pending_evaluation = self.submit_parameter_collection(
+            parameter_collection, config_overrides=config_overrides)
+        fitnesses_result = pending_evaluation[-1]
+        if fitnesses_result is not None:
+            while fitnesses_result.progress < len(fitnesses_result):
+                fitnesses_result.wait(timeout=1)
+                sys.stdout.write('\r{0}/{1} TARDIS runs done for current iteration'.format(
+                    fitnesses_result.progress, len(fitnesses_result)))
+                sys.stdout.flush()
+            print ' - done with iterations'
+        return self.collect_parameter_collection(pending_evaluation)
+
+    def record_evaluated_parameter_collection(self, evaluated_parameter_collection,
+                                              spectra):
+        """
+        Add evaluated parameter sets to the log and store their spectra
+
+        Parameters
+        ----------
+
+        evaluated_parameter_collection: ~dalek.parallel.ParameterCollection
+
+        spectra: ~list
+        """
+
+        self.parameter_collection_log.append(evaluated_parameter_collection)
+
+        if self.evaluation_cache is not None:
+            # the cache only holds results of the full fidelity
+            self.evaluation_cache.add_log(
+                evaluated_parameter_collection,
+                self.parameter_collection_log.index[
+                    -len(evaluated_parameter_collection):],
+                fidelity=len(self.fitter_configuration.fidelity_levels) - 1)
 
         if self.spectral_store is not None:
             self.spectral_store.store_spectra(
-                spectra, self.parameter_collection_log.index[-len(spectra):])
+                spectra, self.parameter_collection_log.index[-len(spectra):],
+                parameter_collection=evaluated_parameter_collection,
+                wavelength=self.wavelength)
+
+    def write_fitter_log(self):
+        """
+        Append the rows that were added to the parameter collection log since
+        the last call to the fitter log on disk
+        """
+        if self.fitter_log_writer is None:
+            return
+        self.fitter_log_writer.append(
+            self.parameter_collection_log.to_parameter_collection(
+                start=self.logged_rows))
+        self.logged_rows = len(self.parameter_collection_log)
+
+    def save_checkpoint(self, parameter_collection):
+        """
+        Atomically write the optimizer state, the global random states and
+        the parameter sets that still have to be evaluated to the checkpoint
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+            parameter sets proposed by the optimizer but not yet evaluated
+        """
+        if self.checkpoint is None:
+            return
+        write_checkpoint(self.checkpoint, {
+            'parameter_names': list(
+                self.fitter_configuration.parameter_config.parameter_names),
+            'current_iteration': self.current_iteration,
+            'logged_rows': len(self.parameter_collection_log),
+            'optimizer_state': self.optimizer.get_state(),
+            'numpy_random_state': np.random.get_state(),
+            'python_random_state': random.getstate(),
+            'parameter_collection': pd.DataFrame(parameter_collection)})
+
+    def load_checkpoint(self):
+        """
+        Restore the optimizer and random states from the checkpoint - the
+        fit continues with the parameter sets that were pending when the
+        checkpoint was written (see `get_initial_parameter_collection`)
+        """
+        checkpoint = read_checkpoint(self.checkpoint)
+        if checkpoint['parameter_names'] != list(
+                self.fitter_configuration.parameter_config.parameter_names):
+            raise ValueError('Requested resume - but the checkpoint ({0}) '
+                             'indicates different parameters than requested '
+                             'parameters'.format(self.checkpoint))
+        if checkpoint['logged_rows'] != len(self.parameter_collection_log):
+            logger.warning('The checkpoint {0} was written after {1} logged '
+                           'rows but the fitter log has {2} - resuming from '
+                           'the checkpoint'.format(
+                self.checkpoint, checkpoint['logged_rows'],
+                len(self.parameter_collection_log)))
+        self.optimizer.set_state(checkpoint['optimizer_state'])
+        np.random.set_state(checkpoint['numpy_random_state'])
+        random.setstate(checkpoint['python_random_state'])
+        self.current_iteration = checkpoint['current_iteration']
+        self.checkpoint_parameters = ParameterCollection(
+            checkpoint['parameter_collection'])
+        logger.info('Restored the optimizer state from checkpoint {0} at '
+                    'iteration {1}'.format(self.checkpoint,
+                                           self.current_iteration))
+
+    def get_initial_parameter_collection(self):
+        """
+        Parameter sets to start the fit with - the pending parameter sets of
+        a restored checkpoint or the initial parameter collection of the
+        fitter configuration
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+        """
+        if (self.checkpoint_parameters is not None and
+                len(self.checkpoint_parameters) > 0):
+            return self.checkpoint_parameters
+        return self.fitter_configuration.get_initial_parameter_collection()
+
+    def evaluate_multi_fidelity(self, parameter_collection):
+        """
+        Successive halving over the fidelity levels of the fitter
+        configuration: all candidates are evaluated at the lowest level and
+        only the best promotion_fraction of a level is evaluated at the next
+        one. Every level is recorded in the log with its 'dalek.fidelity'.
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+            all candidates with the fitness of the highest level they reached
+        """
+        fidelity_levels = self.fitter_configuration.fidelity_levels
+        promotion_fraction = self.fitter_configuration.promotion_fraction
+
+        result_parameter_collection = None
+        candidates = parameter_collection.reset_index(drop=True)
+        candidate_indices = np.arange(len(candidates))
+        for fidelity, config_overrides in enumerate(fidelity_levels):
+            logger.info('Evaluating {0} candidates at fidelity {1}'.format(
+                len(candidates), fidelity))
+            evaluated_parameter_collection, spectra = (
+                self.evaluate_parameter_collection(
+                    candidates, config_overrides=config_overrides))
+            evaluated_parameter_collection['dalek.fidelity'] = fidelity
+            self.record_evaluated_parameter_collection(
+                evaluated_parameter_collection, spectra)
+
+            if result_parameter_collection is None:
+                result_parameter_collection = (
+                    evaluated_parameter_collection.copy())
+            else:
+                for column in result_parameter_collection.columns:
+                    result_parameter_collection.loc[
+                        candidate_indices, column] = (
+                        evaluated_parameter_collection[column].values)
+
+            if fidelity == len(fidelity_levels) - 1:
+                break
+            number_of_promoted = int(np.ceil(len(candidates) *
+                                             promotion_fraction))
+            fitness = np.array(
+                evaluated_parameter_collection['dalek.fitness'].values,
+                dtype=np.float64)
+            fitness[np.isnan(fitness)] = np.inf
+            promoted = np.sort(np.argsort(fitness, kind='mergesort')[
+                               :number_of_promoted])
+            candidates = candidates.iloc[promoted].reset_index(drop=True)
+            candidate_indices = candidate_indices[promoted]
+
+        return result_parameter_collection
+
+    def add_replicates(self, evaluated_parameter_collection):
+        """
+        Add evaluated rows to the re-evaluation statistics - failed rows are
+        ignored
+        """
+        fitness = np.array(evaluated_parameter_collection['dalek.fitness'].values,
+                           dtype=np.float64)
+        if 'dalek.failed' in evaluated_parameter_collection.columns:
+            fitness[evaluated_parameter_collection['dalek.failed'].values.astype(
+                bool)] = np.nan
+        self.reevaluation.add(evaluated_parameter_collection[
+            self.fitter_configuration.parameter_config.parameter_names].values,
+                              fitness)
+
+    def reevaluate(self, evaluated_parameter_collection):
+        """
+        Adaptive re-evaluation: the candidates within the noise level of the
+        incumbent are run again with new Monte Carlo seeds (one replicate per
+        round, all selected candidates of a round in parallel) until the
+        policy is satisfied or they reached max_replicates. Replicates are
+        recorded in the log with their 'dalek.seed'.
+
+        Parameters
+        ----------
+
+        evaluated_parameter_collection: ~dalek.parallel.ParameterCollection
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+            the candidates with the mean fitness of their replicates and the
+            number of runs in 'dalek.replicates'
+        """
+        parameter_names = self.fitter_configuration.parameter_config.parameter_names
+        candidates = evaluated_parameter_collection[parameter_names].reset_index(
+            drop=True)
+        parameters = candidates.values
+        self.add_replicates(evaluated_parameter_collection)
+
+        for _ in xrange(self.reevaluation.max_replicates - 1):
+            rerun = np.where(self.reevaluation.select(parameters))[0]
+            if len(rerun) == 0:
+                break
+            logger.info('Re-evaluating {0} candidates within the noise level '
+                        'of the incumbent'.format(len(rerun)))
+            replicates = candidates.iloc[rerun].reset_index(drop=True)
+            replicates['dalek.seed'] = self.reevaluation.new_seeds(len(rerun))
+            evaluated_replicates, spectra = self.evaluate_parameter_collection(
+                replicates)
+            self.record_evaluated_parameter_collection(evaluated_replicates,
+                                                       spectra)
+            self.add_replicates(evaluated_replicates)
+
+        mean_fitness, runs = self.reevaluation.statistics(parameters)
+        averaged_parameter_collection = evaluated_parameter_collection.copy()
+        fitness = np.array(averaged_parameter_collection['dalek.fitness'].values,
+                           dtype=np.float64)
+        fitness[runs > 0] = mean_fitness[runs > 0]
+        averaged_parameter_collection['dalek.fitness'] = fitness
+        averaged_parameter_collection['dalek.replicates'] = runs
+        return averaged_parameter_collection
+
+    def run_single_fitter_iteration(self, parameter_collection):
+        if len(self.fitter_configuration.fidelity_levels) > 0:
+            evaluated_parameter_collection = self.evaluate_multi_fidelity(
+                parameter_collection)
+        else:
+            evaluated_parameter_collection, spectra = (
+                self.evaluate_parameter_collection(parameter_collection))
+            evaluated_parameter_collection = self.optimizer.annotate(
+                evaluated_parameter_collection)
+
+            self.record_evaluated_parameter_collection(
+                evaluated_parameter_collection, spectra)
+            if self.reevaluation is not None:
+                evaluated_parameter_collection = self.reevaluate(
+                    evaluated_parameter_collection)
 
         new_parameter_collection = self.optimizer(
             evaluated_parameter_collection)
         return new_parameter_collection
 
+    def check_stopping_criteria(self):
+        """
+        Evaluate the stopping criteria on the rows logged since the last
+        check (one iteration)
+
+        Returns
+        -------
+            : ~bool
+            True if the fit should stop - the reason is logged and kept in
+            stopping_reason
+        """
+        if self.convergence_monitor is None:
+            return False
+        new_rows = self.parameter_collection_log.to_parameter_collection(
+            start=self.monitored_rows)
+        self.monitored_rows = len(self.parameter_collection_log)
+        if len(new_rows) == 0:
+            return False
+        reason = self.convergence_monitor.check(new_rows)
+        if reason is None:
+            return False
+        logger.info('Stopping the fit after iteration {0}: {1}'.format(
+            self.current_iteration, reason))
+        self.stopping_reason = reason
+        return True
+
     def run_fitter(self, initial_parameters):
+        if self.fitter_configuration.asynchronous:
+            return self.run_asynchronous_fitter(initial_parameters)
+        if isinstance(self.optimizer, IslandModel):
+            return self.run_island_fitter(initial_parameters)
+
         self.current_parameters = initial_parameters
 
 
@@ -484,11 +1185,231 @@ class BaseFitter(object):
                 self.fitter_configuration.max_iterations))
             self.current_parameters = self.run_single_fitter_iteration(
                 self.current_parameters)
-            if self.fitter_log is not None:
-                self.parameter_collection_log.to_csv(self.fitter_log)
+            self.write_fitter_log()
 
             self.current_iteration += 1
+            self.save_checkpoint(self.current_parameters)
+            if len(self.current_parameters) == 0:
+                logger.info('The optimizer proposed no further parameter sets '
+                            '- stopping')
+                break
+            if self.check_stopping_criteria():
+                break
+
+    def run_island_fitter(self, initial_parameters, poll_interval=0.1):
+        """
+        Run every island of an `~dalek.fitter.optimizers.IslandModel` on its
+        own group of engines (one group per node if the number of islands
+        allows it). An island submits its next iteration as soon as its
+        previous one is done, so no island waits for the slowest run of
+        another one. The 'dalek.current_iteration' of a row is the iteration
+        of its island, the current_iteration of the fitter is the one of the
+        slowest island.
 
-        
-            
+        Parameters
+        ----------
+
+        initial_parameters: ~dalek.parallel.ParameterCollection
+
+        poll_interval: ~float
+            time in seconds to wait between checks for finished islands
+        """
+        islands = self.optimizer
+        max_iterations = self.fitter_configuration.max_iterations
+        if max(islands.iterations) == 0 and self.current_iteration > 0:
+            # resumed from the log without a checkpoint
+            islands.iterations = ([self.current_iteration] *
+                                  islands.number_of_islands)
+
+        engine_groups = self.launcher.backend.engine_groups(
+            islands.number_of_islands)
+        launchers = [self.launcher.for_engines(engine_ids)
+                     for engine_ids in engine_groups]
+        logger.info('Running {0} islands on engine groups {1}'.format(
+            islands.number_of_islands, engine_groups))
+
+        pending_evaluations = {}
+        stopped = []
+
+        def submit(island_id, parameter_collection):
+            if (islands.iterations[island_id] < max_iterations and
+                    len(parameter_collection) > 0 and not stopped):
+                pending_evaluations[island_id] = (
+                    self.submit_parameter_collection(
+                        parameter_collection, launcher=launchers[island_id]))
+
+        for island_id, island_collection in enumerate(
+                islands.split(initial_parameters)):
+            submit(island_id, island_collection)
+        slowest_iteration = min(islands.iterations)
+
+        while len(pending_evaluations) > 0:
+            finished_islands = [
+                island_id for island_id in sorted(pending_evaluations)
+                if self.evaluation_ready(pending_evaluations[island_id])]
+            if len(finished_islands) == 0:
+                sleep(poll_interval)
+                continue
+
+            for island_id in finished_islands:
+                self.current_iteration = islands.iterations[island_id]
+                evaluated_parameter_collection, spectra = (
+                    self.collect_parameter_collection(
+                        pending_evaluations.pop(island_id),
+                        launcher=launchers[island_id]))
+                self.record_evaluated_parameter_collection(
+                    evaluated_parameter_collection, spectra)
+                submit(island_id, islands.update_island(
+                    island_id, evaluated_parameter_collection))
+                logger.info('Island {0} finished iteration {1} - best '
+                            'fitness {2}'.format(
+                    island_id, islands.iterations[island_id],
+                    islands.best_fitness[island_id]))
+
+            self.write_fitter_log()
+            self.current_iteration = min(islands.iterations)
+            if self.current_iteration > slowest_iteration:
+                # every island finished another iteration
+                slowest_iteration = self.current_iteration
+                if not stopped and self.check_stopping_criteria():
+                    # the running island iterations are still finished
+                    stopped.append(True)
+            if len(pending_evaluations) > 0:
+                self.save_checkpoint(pd.concat(
+                    [pending_evaluations[island_id][0]
+                     for island_id in sorted(pending_evaluations)],
+                    ignore_index=True))
+            else:
+                self.save_checkpoint(ParameterCollection(
+                    columns=self.fitter_configuration.parameter_config.
+                    parameter_names))
+
+    def run_asynchronous_fitter(self, initial_parameters, poll_interval=0.1):
+        """
+        Run the fitter without a barrier at the end of each iteration. Every
+        parameter set is sent to the engines as a single task and as soon as
+        a task comes back the optimizer is asked (through
+        `update_steady_state`) for a new candidate for the same population
+        member. Only as many tasks as there are engines are in flight, the
+        other candidates wait in the fitter until an engine is free. An
+        iteration is counted every `number_of_samples` results.
+
+        Parameters
+        ----------
+
+        initial_parameters: ~dalek.parallel.ParameterCollection
+
+        poll_interval: ~float
+            time in seconds to wait between checks for finished tasks
+        """
+
+        number_of_samples = self.fitter_configuration.number_of_samples
+        max_evaluations = ((self.fitter_configuration.max_iterations -
+                            self.current_iteration) * number_of_samples)
+
+        initial_parameters = initial_parameters.copy()
+        if 'dalek.population_index' not in initial_parameters.columns:
+            initial_parameters['dalek.population_index'] = np.arange(
+                len(initial_parameters))
+
+        # at most one task per engine is in flight - a task waiting for an
+        # engine would otherwise use up its timeout in the queue
+        max_running_tasks = len(self.launcher.backend)
+        pending_tasks = []
+        unsubmitted = []
+
+        def submit(max_tasks):
+            submitted = 0
+            while len(unsubmitted) > 0 and submitted < max_tasks:
+                if self.evaluation_cache is not None:
+                    cached, cached_fitness, cached_log_index = (
+                        self.evaluation_cache.lookup(unsubmitted[0].iloc[:1]))
+                else:
+                    cached = [False]
+                running_tasks = len([
+                    task_result for task_result, _ in pending_tasks
+                    if not isinstance(task_result, CachedResult)])
+                if not cached[0] and running_tasks >= max_running_tasks:
+                    break
+
+                parameter_set = unsubmitted[0].iloc[:1]
+                if len(unsubmitted[0]) > 1:
+                    unsubmitted[0] = unsubmitted[0].iloc[1:]
+                else:
+                    del unsubmitted[0]
+                submitted += 1
+                if cached[0]:
+                    pending_tasks.append((self.get_cached_result(
+                        cached_fitness[0], cached_log_index[0]),
+                                          parameter_set))
+                    continue
+                config_dict = self.to_tasks(parameter_set)[0]
+                pending_tasks.append(
+                    (self.launcher.queue_parameter_set(config_dict),
+                     parameter_set))
+            return submitted
+
+        unsubmitted.append(
+            self.complete_parameter_collection(initial_parameters))
+        submitted_evaluations = submit(max_evaluations)
+        completed_evaluations = 0
+
+        while len(pending_tasks) > 0:
+            finished_tasks = [task for task in pending_tasks if task[0].ready()]
+            if len(finished_tasks) == 0:
+                sleep(poll_interval)
+                continue
+
+            for task in finished_tasks:
+                pending_tasks.remove(task)
+
+            evaluated_parameter_collection, spectra = self.assign_results(
+                pd.concat([parameter_set for _, parameter_set in finished_tasks],
+                          ignore_index=True),
+                [task_result.get() for task_result, _ in finished_tasks],
+                [task_result.metadata for task_result, _ in finished_tasks],
+                cached=[isinstance(task_result, CachedResult)
+                        for task_result, _ in finished_tasks])
+
+            for task_result, _ in finished_tasks:
+                self.clean_dalek_results(task_result)
+
+            self.record_evaluated_parameter_collection(
+                evaluated_parameter_collection, spectra)
+
+            new_parameter_collection = self.optimizer.update_steady_state(
+                evaluated_parameter_collection)
+            if len(new_parameter_collection) > 0:
+                unsubmitted.append(self.complete_parameter_collection(
+                    new_parameter_collection))
+
+            submitted_evaluations += submit(
+                max_evaluations - submitted_evaluations)
+
+            completed_evaluations += len(finished_tasks)
+            sys.stdout.write('\r{0}/{1} TARDIS runs done for current '
+                             'iteration'.format(
+                completed_evaluations % number_of_samples, number_of_samples))
+            sys.stdout.flush()
 
+            if (completed_evaluations // number_of_samples >
+                    (completed_evaluations - len(finished_tasks)) //
+                    number_of_samples):
+                self.write_fitter_log()
+                self.current_iteration += 1
+                if self.check_stopping_criteria():
+                    # the running tasks are still finished
+                    max_evaluations = submitted_evaluations
+                    del unsubmitted[:]
+                pending_parameter_sets = [
+                    parameter_set for _, parameter_set in pending_tasks] + \
+                    unsubmitted
+                if len(pending_parameter_sets) > 0:
+                    self.save_checkpoint(pd.concat(pending_parameter_sets,
+                                                   ignore_index=True))
+                if len(pending_tasks) > 0:
+                    logger.info('\n\nAt iteration {0} of {1}\n'.format(
+                        self.current_iteration + 1,
+                        self.fitter_configuration.max_iterations))
+
+        self.write_fitter_log()
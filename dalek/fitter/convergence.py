@@ -0,0 +1,264 @@
+from abc import ABCMeta, abstractmethod
+import logging
+from time import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class BaseStoppingCriterion(object):
+    """
+    Criterion deciding after every iteration whether the fit should stop -
+    it is given the `ConvergenceMonitor` holding the history of the fit
+    """
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def __call__(self, monitor):
+        """
+        Returns
+        -------
+            : ~str
+            reason for stopping or None to continue
+        """
+        raise NotImplementedError
+
+
+class FitnessPlateau(BaseStoppingCriterion):
+    """
+    Stop if the best fitness did not improve by more than tolerance during
+    the last window iterations
+
+    Parameters
+    ----------
+
+    window: ~int
+        [default=20]
+
+    tolerance: ~float
+        [default=0.]
+    """
+
+    def __init__(self, window=20, tolerance=0.):
+        self.window = window
+        self.tolerance = tolerance
+
+    def __call__(self, monitor):
+        if len(monitor.best_fitness) <= self.window:
+            return None
+        improvement = (monitor.best_fitness[-self.window - 1] -
+                       monitor.best_fitness[-1])
+        if improvement <= self.tolerance:
+            return ('the best fitness improved by {0:g} in the last {1} '
+                    'iterations'.format(improvement, self.window))
+
+
+class RelativeImprovement(BaseStoppingCriterion):
+    """
+    Stop if the best fitness improved by less than the fraction threshold
+    during the last window iterations
+
+    Parameters
+    ----------
+
+    window: ~int
+        [default=20]
+
+    threshold: ~float
+        [default=1e-3]
+    """
+
+    def __init__(self, window=20, threshold=1e-3):
+        self.window = window
+        self.threshold = threshold
+
+    def __call__(self, monitor):
+        if len(monitor.best_fitness) <= self.window:
+            return None
+        old_best_fitness = monitor.best_fitness[-self.window - 1]
+        if not np.isfinite(old_best_fitness) or old_best_fitness == 0:
+            return None
+        relative_improvement = ((old_best_fitness - monitor.best_fitness[-1]) /
+                                abs(old_best_fitness))
+        if relative_improvement < self.threshold:
+            return ('the best fitness improved by a fraction of {0:g} in the '
+                    'last {1} iterations'.format(relative_improvement,
+                                                 self.window))
+
+
+class PopulationDiversity(BaseStoppingCriterion):
+    """
+    Stop if the parameter sets of the last iteration collapsed: the largest
+    standard deviation of a parameter in units of its bounds is below
+    threshold
+
+    Parameters
+    ----------
+
+    threshold: ~float
+        [default=1e-3]
+    """
+
+    def __init__(self, threshold=1e-3):
+        self.threshold = threshold
+
+    def __call__(self, monitor):
+        if len(monitor.diversity) == 0 or np.isnan(monitor.diversity[-1]):
+            return None
+        if monitor.diversity[-1] < self.threshold:
+            return ('the parameter spread of the population collapsed to '
+                    '{0:g} of the bounds'.format(monitor.diversity[-1]))
+
+
+class Budget(BaseStoppingCriterion):
+    """
+    Stop once the wall-clock time of the fit or the core hours of all
+    TARDIS runs (including those of a resumed fit) exceed the budget
+
+    Parameters
+    ----------
+
+    wall_clock_hours: ~float
+        [default=None - unlimited]
+
+    core_hours: ~float
+        [default=None - unlimited]
+    """
+
+    def __init__(self, wall_clock_hours=None, core_hours=None):
+        self.wall_clock_hours = wall_clock_hours
+        self.core_hours = core_hours
+
+    def __call__(self, monitor):
+        if (self.wall_clock_hours is not None and
+                monitor.wall_clock_hours >= self.wall_clock_hours):
+            return 'the wall-clock budget of {0:g} hours is used up'.format(
+                self.wall_clock_hours)
+        if (self.core_hours is not None and
+                monitor.core_hours >= self.core_hours):
+            return 'the budget of {0:g} core hours is used up'.format(
+                self.core_hours)
+
+
+class ConvergenceMonitor(object):
+    """
+    History of a fit (best fitness so far and population diversity of every
+    iteration, run time) and the stopping criteria evaluated on it
+
+    Parameters
+    ----------
+
+    parameter_config: ~dalek.fitter.ParameterConfiguration
+
+    criteria: ~list of ~dalek.fitter.convergence.BaseStoppingCriterion
+    """
+
+    @classmethod
+    def from_config_dict(cls, parameter_config, criteria_dict):
+        """
+        Parameters
+        ----------
+
+        parameter_config: ~dalek.fitter.ParameterConfiguration
+
+        criteria_dict: ~dict
+            {name in `stopping_criterion_dict`: keyword arguments}
+        """
+        return cls(parameter_config,
+                   [stopping_criterion_dict[name](**(kwargs or {}))
+                    for name, kwargs in criteria_dict.items()])
+
+    def __init__(self, parameter_config, criteria):
+        self.parameter_config = parameter_config
+        self.criteria = criteria
+        self.best_fitness = []
+        self.diversity = []
+        self.core_seconds = 0.
+        self.start_time = time()
+
+    @property
+    def wall_clock_hours(self):
+        return (time() - self.start_time) / 3600.
+
+    @property
+    def core_hours(self):
+        return self.core_seconds / 3600.
+
+    def population_diversity(self, parameters):
+        if len(parameters) < 2:
+            return np.nan
+        spread = np.std(parameters, axis=0) / (
+            np.array(self.parameter_config.ubounds, dtype=np.float64) -
+            self.parameter_config.lbounds)
+        return spread.max()
+
+    def add_iteration(self, parameter_collection):
+        """
+        Add the evaluated rows of an iteration to the history - rows below
+        the full fidelity and failed rows only count for the run time
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+        """
+        time_elapsed = np.array(parameter_collection['dalek.time_elapsed'],
+                                dtype=np.float64)
+        if 'dalek.cached' in parameter_collection.columns:
+            time_elapsed = time_elapsed[
+                ~parameter_collection['dalek.cached'].values.astype(bool)]
+        self.core_seconds += np.sum(time_elapsed[np.isfinite(time_elapsed)])
+
+        use = np.ones(len(parameter_collection), dtype=bool)
+        if 'dalek.failed' in parameter_collection.columns:
+            use &= ~parameter_collection['dalek.failed'].values.astype(bool)
+        if 'dalek.fidelity' in parameter_collection.columns:
+            fidelity = parameter_collection['dalek.fidelity'].values
+            use &= fidelity == fidelity.max()
+        fitness = np.array(parameter_collection['dalek.fitness'].values[use],
+                           dtype=np.float64)
+        fitness = fitness[np.isfinite(fitness)]
+
+        best_fitness = self.best_fitness[-1] if self.best_fitness else np.inf
+        if len(fitness) > 0:
+            best_fitness = min(best_fitness, fitness.min())
+        self.best_fitness.append(best_fitness)
+        self.diversity.append(self.population_diversity(
+            parameter_collection[self.parameter_config.parameter_names].values[
+                use]))
+
+    def add_log(self, parameter_collection_log):
+        """
+        Rebuild the history from the log of a resumed fit
+
+        Parameters
+        ----------
+
+        parameter_collection_log: ~dalek.parallel.ParameterCollection
+        """
+        iterations = parameter_collection_log['dalek.current_iteration'].values
+        for iteration in np.unique(iterations):
+            self.add_iteration(parameter_collection_log[iterations == iteration])
+
+    def check(self, parameter_collection):
+        """
+        Add an iteration and evaluate the stopping criteria
+
+        Returns
+        -------
+            : ~str
+            the reason for stopping or None to continue
+        """
+        self.add_iteration(parameter_collection)
+        for criterion in self.criteria:
+            reason = criterion(self)
+            if reason is not None:
+                return reason
+        return None
+
+
+stopping_criterion_dict = {'plateau': FitnessPlateau,
+                           'relative_improvement': RelativeImprovement,
+                           'diversity': PopulationDiversity,
+                           'budget': Budget}
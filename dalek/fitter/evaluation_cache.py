@@ -0,0 +1,210 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def config_hash(config):
+    """
+    Deterministic hash of a (nested) configuration dictionary
+
+    Parameters
+    ----------
+
+    config: ~dict or ~tardis.io.config_reader.ConfigurationNameSpace
+
+    Returns
+    -------
+        : ~str
+    """
+
+    def canonical(item):
+        if isinstance(item, dict):
+            return '{' + ','.join(['{0!r}:{1}'.format(key, canonical(item[key]))
+                                   for key in sorted(item.keys())]) + '}'
+        elif isinstance(item, (list, tuple)):
+            return '[' + ','.join([canonical(value) for value in item]) + ']'
+        else:
+            return repr(item)
+
+    return hashlib.md5(canonical(config)).hexdigest()
+
+
+class CachedResult(object):
+    """
+    Stands in for the result of a task that was answered from the
+    `EvaluationCache` - it has the interface of a finished `AsyncResult`
+    """
+
+    msg_ids = []
+
+    def __init__(self, fitness, spectrum=None):
+        self.fitness = fitness
+        self.spectrum = spectrum
+        now = datetime.now()
+        self.metadata = {'started': now, 'completed': now, 'engine_id': -1}
+
+    def ready(self):
+        return True
+
+    def get(self, timeout=None):
+        return self.fitness, self.spectrum
+
+
+class EvaluationCache(object):
+    """
+    Cache of the fitness of already evaluated parameter sets. Parameter sets
+    are looked up by their parameter vector quantized to `tolerance` times
+    the range of each parameter (any other non-'dalek.' column, e.g.
+    'montecarlo.seed', has to match exactly). The cache is only valid for
+    one default configuration which is recorded through its hash. A resumed
+    fit rebuilds the cache from its fitter log (see `add_log`).
+
+    Parameters
+    ----------
+
+    parameter_config: ~dalek.fitter.base.ParameterConfiguration
+
+    default_config_hash: ~str
+        hash of the default TARDIS configuration (see `config_hash`)
+
+    tolerance: ~float
+        quantization step as a fraction of each parameter's range
+        [default=1e-9]
+
+    max_size: ~int
+        maximum number of entries, the least recently used entries are
+        evicted first [default=None - unlimited]
+
+    spectra: ~bool
+        also return the spectrum of a cache hit from the spectral store if
+        available [default=False]
+    """
+
+    def __init__(self, parameter_config, default_config_hash, tolerance=1e-9,
+                 max_size=None, spectra=False):
+        self.parameter_names = list(parameter_config.parameter_names)
+        self.lbounds = parameter_config.lbounds
+        self.scale = tolerance * (parameter_config.ubounds -
+                                  parameter_config.lbounds)
+        self.default_config_hash = default_config_hash
+        self.tolerance = tolerance
+        self.max_size = max_size
+        self.spectra = spectra
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def keys(self, parameter_collection, context=None):
+        """
+        Cache keys of all rows of parameter_collection
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+
+        context: hashable
+            anything else the result depends on (e.g. a fidelity level)
+        """
+        quantized = np.round((parameter_collection[self.parameter_names].values
+                              - self.lbounds) / self.scale).astype(np.int64)
+        extra_columns = [column for column in parameter_collection.columns
+                         if column not in self.parameter_names and
+                         not column.startswith('dalek.')]
+        extra_values = parameter_collection[extra_columns].values
+        return [(context, tuple(quantized_row), tuple(extra_row))
+                for quantized_row, extra_row in zip(quantized, extra_values)]
+
+    def lookup(self, parameter_collection, context=None):
+        """
+        Look up all rows of parameter_collection
+
+        Returns
+        -------
+            hits: ~np.ndarray of ~bool
+
+            fitness: ~np.ndarray
+                cached fitness (NaN for misses)
+
+            log_index: ~np.ndarray
+                fitter log index of the original evaluation (-1 for misses)
+        """
+        hits = np.zeros(len(parameter_collection), dtype=bool)
+        fitness = np.ones(len(parameter_collection)) * np.nan
+        log_index = -np.ones(len(parameter_collection), dtype=np.int64)
+        for i, key in enumerate(self.keys(parameter_collection, context)):
+            if key in self.entries:
+                entry = self.entries.pop(key)
+                self.entries[key] = entry
+                hits[i] = True
+                fitness[i], log_index[i] = entry
+        self.hits += hits.sum()
+        self.misses += (~hits).sum()
+        return hits, fitness, log_index
+
+    def add(self, parameter_collection, log_indices, context=None):
+        """
+        Add evaluated parameter sets to the cache - parameter sets without a
+        finite fitness are not cached
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+
+        log_indices: ~list of ~int
+            fitter log index of each row
+        """
+        fitness = parameter_collection['dalek.fitness'].values
+        for key, row_fitness, log_index in zip(
+                self.keys(parameter_collection, context), fitness, log_indices):
+            if not np.isfinite(row_fitness):
+                continue
+            self.entries.pop(key, None)
+            self.entries[key] = (row_fitness, log_index)
+
+        if self.max_size is not None:
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def add_log(self, parameter_collection, log_indices, fidelity=None):
+        """
+        Add the rows of a fitter log that were evaluated by TARDIS - rows
+        answered by the cache, failed runs and replicates with their own
+        Monte Carlo seed are skipped
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+
+        log_indices: ~list of ~int
+            fitter log index of each row
+
+        fidelity: ~int
+            only add the rows evaluated at this fidelity level
+            [default=None - all rows]
+        """
+        evaluated = np.ones(len(parameter_collection), dtype=bool)
+        if 'dalek.cached' in parameter_collection.columns:
+            evaluated &= ~parameter_collection['dalek.cached'].values.astype(
+                bool)
+        if 'dalek.failed' in parameter_collection.columns:
+            evaluated &= ~parameter_collection['dalek.failed'].values.astype(
+                bool)
+        if fidelity is not None and 'dalek.fidelity' in \
+                parameter_collection.columns:
+            evaluated &= (parameter_collection['dalek.fidelity'].values ==
+                          fidelity)
+        if 'dalek.seed' in parameter_collection.columns:
+            evaluated &= ~(parameter_collection['dalek.seed'].values >= 0)
+        self.add(parameter_collection[evaluated],
+                 np.asarray(log_indices)[evaluated])
@@ -3,14 +3,98 @@ import numpy as np
 from specutils import Spectrum1D
 from astropy import units as u, constants as const
 
+from dalek.util import rebin_matrix
+
 class BaseFitnessFunction(object):
     __metaclass__ = ABCMeta
 
     def __init__(self, *args, **kwargs):
         pass
 
+    def __call__(self, radial1d_mdl):
+        """
+        Fitness of a TARDIS model - the synthetic spectrum scored with
+        `evaluate_fluxes`
+
+        Parameters
+        ----------
+
+        radial1d_mdl: ~tardis.model.Radial1DModel
+
+        Returns
+        -------
+            : ~float, spectrum object
+        """
+        synth_spectrum = self.synthetic_spectrum(radial1d_mdl)
+        fitness = self.evaluate_fluxes(synth_spectrum.wavelength.value,
+                                       synth_spectrum.flux_lambda.value)
+        return fitness[0], synth_spectrum
+
     @abstractmethod
-    def __call__(self, *args, **kwargs):
+    def evaluate_fluxes(self, wavelength, fluxes):
+        """
+        Fitness of many synthetic spectra on a shared wavelength grid in one
+        vectorized call (e.g. for re-scoring the spectra of a
+        `~dalek.fitter.SpectralStore`)
+
+        Parameters
+        ----------
+
+        wavelength: ~np.ndarray
+            synthetic wavelength grid
+
+        fluxes: ~np.ndarray
+            (spectra, wavelength) flux densities - a single spectrum of shape
+            (wavelength,) is treated as one row
+
+        Returns
+        -------
+            : ~np.ndarray
+            (spectra,) fitness
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def synthetic_spectrum(radial1d_mdl):
+        """
+        Virtual packet spectrum of a TARDIS model if it was computed,
+        otherwise the real packet spectrum
+        """
+        if radial1d_mdl.spectrum_virtual.flux_nu.sum() > 0:
+            return radial1d_mdl.spectrum_virtual
+        return radial1d_mdl.spectrum
+
+    def log_likelihood(self, fitness):
+        """
+        Log likelihood of a model with the given fitness (used by the
+        `~dalek.fitter.optimizers.EnsembleSampler`) - by default the fitness
+        is taken to be a chi-square
+
+        Parameters
+        ----------
+
+        fitness: ~np.ndarray
+
+        Returns
+        -------
+            : ~np.ndarray
+        """
+        return -0.5 * np.asarray(fitness, dtype=np.float64)
+
+    def features(self, spectrum):
+        """
+        Reduced description of a synthetic spectrum (e.g. band fluxes) that
+        is sent back by the engines for result_format 'features'
+
+        Parameters
+        ----------
+
+        spectrum: spectrum object returned by `__call__`
+
+        Returns
+        -------
+            : ~np.ndarray
+        """
         raise NotImplementedError
 
     def get_spectrum(self, spectrum):
@@ -23,7 +107,8 @@ class BaseFitnessFunction(object):
 
 class SimpleRMSFitnessFunction(BaseFitnessFunction):
 
-    def __init__(self, spectrum):
+    def __init__(self, spectrum, number_of_feature_bands=16,
+                 flux_uncertainty=None):
 
         if hasattr(spectrum, '.flux'):
             self.observed_spectrum = spectrum
@@ -36,21 +121,96 @@ class SimpleRMSFitnessFunction(BaseFitnessFunction):
 
         self.observed_spectrum_wavelength = self.observed_spectrum.wavelength.value
         self.observed_spectrum_flux = self.observed_spectrum.flux.value
+        self.feature_band_edges = np.linspace(
+            self.observed_spectrum_wavelength.min(),
+            self.observed_spectrum_wavelength.max(),
+            number_of_feature_bands + 1)
+        self.flux_uncertainty = flux_uncertainty
+        # synthetic wavelength grid -> rebinning operator onto the observed
+        # grid (TARDIS spectra of one configuration share their grid)
+        self.rebin_operators = {}
+
+    def rebin_operator(self, wavelength):
+        """
+        Sparse flux-conserving rebinning operator from a synthetic wavelength
+        grid onto the observed grid - built once per grid and cached
 
-    def __call__(self, radial1d_mdl):
+        Parameters
+        ----------
 
-        if radial1d_mdl.spectrum_virtual.flux_nu.sum() > 0:
-            synth_spectrum = radial1d_mdl.spectrum_virtual
-        else:
-            synth_spectrum = radial1d_mdl.spectrum
-        synth_spectrum_flux = np.interp(self.observed_spectrum_wavelength,
-                                        synth_spectrum.wavelength.value[::-1],
-                                        synth_spectrum.flux_lambda.value[::-1])
+        wavelength: ~np.ndarray
+
+        Returns
+        -------
+            : ~scipy.sparse.csr_matrix
+        """
+        wavelength = np.ascontiguousarray(wavelength, dtype=np.float64)
+        # the grid itself is the key - dict lookups compare it in full, so
+        # grids with colliding hashes never share an operator
+        key = wavelength.tostring()
+        if key not in self.rebin_operators:
+            self.rebin_operators[key] = rebin_matrix(
+                wavelength, self.observed_spectrum_wavelength)
+        return self.rebin_operators[key]
+
+    def rebin(self, wavelength, flux):
+        """
+        Synthetic flux on the observed wavelength grid
 
-        fitness = np.sum((synth_spectrum_flux -
-                          self.observed_spectrum_flux) ** 2)
+        Parameters
+        ----------
 
-        return fitness, synth_spectrum
+        wavelength: ~np.ndarray
+            synthetic wavelength grid (ascending or descending)
+
+        flux: ~np.ndarray
+            (wavelength,) for one spectrum or (spectra, wavelength)
+
+        Returns
+        -------
+            : ~np.ndarray
+            (observed wavelength,) or (spectra, observed wavelength)
+        """
+        operator = self.rebin_operator(wavelength)
+        flux = np.asarray(flux, dtype=np.float64)
+        if flux.ndim == 1:
+            return operator.dot(flux)
+        return operator.dot(flux.T).T
+
+    def evaluate_fluxes(self, wavelength, fluxes):
+        """
+        Sum of the squared residuals of the rebinned synthetic fluxes to the
+        observed flux - one sparse mat-mat for all spectra
+        """
+        fluxes = np.atleast_2d(np.asarray(fluxes, dtype=np.float64))
+        residuals = self.rebin(wavelength, fluxes) - self.observed_spectrum_flux
+        return np.einsum('ij,ij->i', residuals, residuals)
+
+    def log_likelihood(self, fitness):
+        """
+        Gaussian log likelihood of the squared flux residuals - with unit
+        flux uncertainty if none was given
+        """
+        log_likelihood = super(SimpleRMSFitnessFunction,
+                               self).log_likelihood(fitness)
+        if self.flux_uncertainty is not None:
+            log_likelihood /= self.flux_uncertainty ** 2
+        return log_likelihood
+
+    def features(self, spectrum):
+        """
+        Mean synthetic flux in equally wide bands across the observed
+        wavelength range
+        """
+        wavelength = spectrum.wavelength.value
+        flux = spectrum.flux_lambda.value
+        band = np.digitize(wavelength, self.feature_band_edges) - 1
+        in_range = (band >= 0) & (band < len(self.feature_band_edges) - 1)
+        band_flux = np.bincount(band[in_range], weights=flux[in_range],
+                                minlength=len(self.feature_band_edges) - 1)
+        band_count = np.bincount(band[in_range],
+                                 minlength=len(self.feature_band_edges) - 1)
+        return band_flux / np.maximum(band_count, 1)
 
 
 fitness_function_dict = {'simple_rms': SimpleRMSFitnessFunction}
\ No newline at end of file
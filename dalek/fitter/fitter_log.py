@@ -0,0 +1,440 @@
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import json
+import logging
+import os
+from collections import OrderedDict
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from dalek.parallel.parameter_collection import ParameterCollection
+
+logger = logging.getLogger(__name__)
+
+
+def missing_value(dtype):
+    """
+    Value used to fill columns for rows in which they were not present
+
+    Parameters
+    ----------
+
+    dtype: ~np.dtype
+
+    Returns
+    -------
+        : NaN for floating point columns, -1 for integer columns and False
+          for boolean columns
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return np.nan
+    elif dtype.kind in 'iu':
+        return -1
+    elif dtype.kind == 'b':
+        return False
+    else:
+        raise ValueError('Only numerical columns can be stored in the fitter '
+                         'log (got dtype {0})'.format(dtype))
+
+
+def column_values(parameter_collection, column):
+    values = np.asarray(parameter_collection[column].values)
+    if values.dtype.kind == 'O':
+        values = values.astype(np.float64)
+    missing_value(values.dtype)
+    return values
+
+
+class BaseFitterLog(object):
+    """
+    Base class for the on-disk fitter logs. Rows are only ever appended -
+    each call to `append` writes exactly the rows that it was given.
+
+    Parameters
+    ----------
+
+    fname: ~str
+        file name of the log
+
+    clobber: ~bool
+        remove an existing log instead of appending to it [default=False]
+    """
+
+    def __init__(self, fname, clobber=False):
+        self.fname = fname
+        if clobber and os.path.exists(fname):
+            logger.info('Removing old fitter log {0}'.format(fname))
+            os.remove(fname)
+
+    def append(self, parameter_collection):
+        raise NotImplementedError
+
+    def read(self):
+        raise NotImplementedError
+
+    def to_csv(self, csv_fname):
+        """
+        Export the full log to a CSV file
+        """
+        self.read().to_csv(csv_fname)
+
+
+class HDF5FitterLog(BaseFitterLog):
+    """
+    Binary fitter log. Every column is stored as its own extendable, chunked
+    HDF5 dataset so that appending an iteration only writes the new rows and
+    reading the log back does not need any text parsing.
+
+    Parameters
+    ----------
+
+    fname: ~str
+        file name of the log
+
+    group_name: ~str
+        HDF5 group holding the columns [default='fitter_log']
+
+    chunk_size: ~int
+        number of rows per HDF5 chunk [default=4096]
+
+    clobber: ~bool
+        remove an existing log instead of appending to it [default=False]
+    """
+
+    def __init__(self, fname, group_name='fitter_log', chunk_size=4096,
+                 clobber=False):
+        super(HDF5FitterLog, self).__init__(fname, clobber=clobber)
+        self.group_name = group_name
+        self.chunk_size = chunk_size
+
+    def _get_group(self, h5_file):
+        if self.group_name not in h5_file:
+            group = h5_file.create_group(self.group_name)
+            group.attrs['columns'] = json.dumps([])
+            group.attrs['length'] = 0
+        return h5_file[self.group_name]
+
+    def __len__(self):
+        if not os.path.exists(self.fname):
+            return 0
+        with h5py.File(self.fname, 'r') as h5_file:
+            if self.group_name not in h5_file:
+                return 0
+            return int(h5_file[self.group_name].attrs['length'])
+
+    @property
+    def columns(self):
+        if not os.path.exists(self.fname):
+            return []
+        with h5py.File(self.fname, 'r') as h5_file:
+            if self.group_name not in h5_file:
+                return []
+            return json.loads(h5_file[self.group_name].attrs['columns'])
+
+    def append(self, parameter_collection):
+        """
+        Append the rows of parameter_collection to the log. Columns that
+        were not in the log before are created and filled with missing
+        values for the old rows; columns of the log that are not in
+        parameter_collection are filled with missing values for the new rows.
+        Columns are upcast if the new values need a wider dtype.
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+        """
+        new_rows = len(parameter_collection)
+        if new_rows == 0:
+            return
+
+        with h5py.File(self.fname, 'a') as h5_file:
+            group = self._get_group(h5_file)
+            columns = json.loads(group.attrs['columns'])
+            old_length = int(group.attrs['length'])
+            new_length = old_length + new_rows
+
+            for column in parameter_collection.columns:
+                values = column_values(parameter_collection, column)
+                if column in columns:
+                    dtype = np.result_type(group[column].dtype, values.dtype)
+                    if dtype != group[column].dtype:
+                        # HDF5 datasets can not change their dtype
+                        old_values = group[column][()].astype(dtype)
+                        del group[column]
+                        group.create_dataset(
+                            column, data=old_values, maxshape=(None,),
+                            chunks=(self.chunk_size,), dtype=dtype)
+                    continue
+                dataset = group.create_dataset(
+                    column, shape=(old_length,), maxshape=(None,),
+                    chunks=(self.chunk_size,), dtype=values.dtype)
+                if old_length > 0:
+                    dataset[:] = missing_value(values.dtype)
+                columns.append(column)
+
+            for column in columns:
+                dataset = group[column]
+                dataset.resize((new_length,))
+                if column in parameter_collection.columns:
+                    dataset[old_length:] = column_values(parameter_collection,
+                                                         column)
+                else:
+                    dataset[old_length:] = missing_value(dataset.dtype)
+
+            group.attrs['columns'] = json.dumps(columns)
+            group.attrs['length'] = new_length
+
+    def read(self, start=0, stop=None):
+        """
+        Read the log (or the rows between start and stop)
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+        """
+        with h5py.File(self.fname, 'r') as h5_file:
+            group = h5_file[self.group_name]
+            columns = json.loads(group.attrs['columns'])
+            length = int(group.attrs['length'])
+            if stop is None:
+                stop = length
+            data = pd.DataFrame(
+                OrderedDict([(column, group[column][start:stop])
+                             for column in columns]), columns=columns)
+        data.index = np.arange(start, start + len(data))
+        return ParameterCollection(data)
+
+
+class CSVFitterLog(object):
+    """
+    Read-only text fitter log - written by the offline conversion
+    `convert_fitter_log_to_csv` and by fits before the binary log (CSV has a
+    fixed header, so columns that first appear in a later iteration cannot
+    be appended)
+
+    Parameters
+    ----------
+
+    fname: ~str
+        file name of the log
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+
+    def __len__(self):
+        if not os.path.exists(self.fname):
+            return 0
+        return len(self.read())
+
+    def read(self):
+        return ParameterCollection(pd.read_csv(self.fname, index_col=0))
+
+
+# fitter logs that can be appended to
+fitter_log_dict = {'.h5': HDF5FitterLog,
+                   '.hdf5': HDF5FitterLog}
+
+# fitter logs that can only be read
+read_only_fitter_log_dict = {'.csv': CSVFitterLog}
+
+
+def open_fitter_log(fname, **kwargs):
+    """
+    Open a fitter log for appending - the format is chosen by the file
+    extension ('.h5' or '.hdf5')
+
+    Parameters
+    ----------
+
+    fname: ~str
+
+    Returns
+    -------
+        : ~dalek.fitter.fitter_log.BaseFitterLog
+    """
+    extension = os.path.splitext(fname)[1].lower()
+    if extension in read_only_fitter_log_dict:
+        raise ValueError('{0} fitter logs can only be read - write a binary '
+                         'fitter log ({1}) and export it with '
+                         'convert_fitter_log_to_csv'.format(
+                             extension, ', '.join(sorted(fitter_log_dict))))
+    if extension not in fitter_log_dict:
+        raise ValueError('Unknown fitter log format {0} - allowed are '
+                         '{1}'.format(extension, fitter_log_dict.keys()))
+    return fitter_log_dict[extension](fname, **kwargs)
+
+
+def read_fitter_log(fname):
+    """
+    Read a fitter log of any supported format ('.h5', '.hdf5' or '.csv')
+
+    Returns
+    -------
+        : ~dalek.parallel.ParameterCollection
+    """
+    extension = os.path.splitext(fname)[1].lower()
+    if extension in read_only_fitter_log_dict:
+        return read_only_fitter_log_dict[extension](fname).read()
+    return open_fitter_log(fname).read()
+
+
+def convert_fitter_log_to_csv(fname, csv_fname):
+    """
+    Offline conversion of a (binary) fitter log to CSV
+    """
+    read_fitter_log(fname).to_csv(csv_fname)
+
+
+def convert_csv_fitter_log(csv_fname, fname):
+    """
+    Convert a CSV fitter log (e.g. of a fit before the binary log) to a
+    binary fitter log that the fit can be continued in
+    """
+    open_fitter_log(fname, clobber=True).append(read_fitter_log(csv_fname))
+
+
+def write_checkpoint(fname, checkpoint):
+    """
+    Atomically write a checkpoint (a picklable dictionary) - the checkpoint
+    is written to a temporary file that replaces fname only once it is
+    completely on disk, so an interrupted fit never leaves a truncated
+    checkpoint behind
+
+    Parameters
+    ----------
+
+    fname: ~str
+
+    checkpoint: ~dict
+    """
+    temporary_fname = fname + '.tmp'
+    with open(temporary_fname, 'wb') as fh:
+        pickle.dump(checkpoint, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.rename(temporary_fname, fname)
+
+
+def read_checkpoint(fname):
+    """
+    Read a checkpoint written by `write_checkpoint`
+
+    Returns
+    -------
+        : ~dict
+    """
+    with open(fname, 'rb') as fh:
+        return pickle.load(fh)
+
+
+class ParameterCollectionLog(object):
+    """
+    In-memory log of all evaluated parameter sets. Every column (the
+    parameter names as well as the 'dalek.*' bookkeeping columns) is kept in
+    its own preallocated numpy array whose capacity is doubled when it runs
+    full, so appending an iteration costs amortized O(rows appended) instead
+    of copying the whole log as `DataFrame.append` does.
+
+    Parameters
+    ----------
+
+    initial_capacity: ~int
+        number of rows to preallocate [default=1024]
+    """
+
+    @classmethod
+    def from_parameter_collection(cls, parameter_collection):
+        parameter_collection_log = cls(
+            initial_capacity=max(2 * len(parameter_collection), 1024))
+        parameter_collection_log.append(parameter_collection)
+        return parameter_collection_log
+
+    def __init__(self, initial_capacity=1024):
+        self.capacity = initial_capacity
+        self.length = 0
+        self.data = OrderedDict()
+
+    @property
+    def columns(self):
+        return list(self.data.keys())
+
+    @property
+    def index(self):
+        return np.arange(self.length)
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, column):
+        return column in self.data
+
+    def __getitem__(self, column):
+        """
+        View (no copy) of the logged values of column
+        """
+        return self.data[column][:self.length]
+
+    def _grow(self, required_capacity):
+        self.capacity = max(2 * self.capacity, required_capacity)
+        for column, values in self.data.items():
+            new_values = np.empty(self.capacity, dtype=values.dtype)
+            new_values[:self.length] = values[:self.length]
+            self.data[column] = new_values
+
+    def append(self, parameter_collection):
+        """
+        Append the rows of parameter_collection. Columns not seen before are
+        added and filled with missing values for the older rows; columns are
+        upcast if the new values need a wider dtype.
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+        """
+        new_length = self.length + len(parameter_collection)
+        if new_length > self.capacity:
+            self._grow(new_length)
+
+        for column in parameter_collection.columns:
+            values = column_values(parameter_collection, column)
+            if column not in self.data:
+                self.data[column] = np.empty(self.capacity, dtype=values.dtype)
+                self.data[column][:self.length] = missing_value(values.dtype)
+            else:
+                dtype = np.result_type(self.data[column].dtype, values.dtype)
+                if dtype != self.data[column].dtype:
+                    # e.g. integer fitness in the first batch - never cast
+                    # the new values down
+                    self.data[column] = self.data[column].astype(dtype)
+            self.data[column][self.length:new_length] = values
+
+        for column, values in self.data.items():
+            if column not in parameter_collection.columns:
+                values[self.length:new_length] = missing_value(values.dtype)
+
+        self.length = new_length
+
+    def to_parameter_collection(self, start=0, stop=None):
+        """
+        Build a `ParameterCollection` of the logged rows between start and
+        stop (all rows by default)
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+        """
+        start, stop, _ = slice(start, stop).indices(self.length)
+        parameter_collection = ParameterCollection(
+            OrderedDict([(column, values[start:stop])
+                         for column, values in self.data.items()]),
+            columns=self.columns)
+        parameter_collection.index = np.arange(start, stop)
+        return parameter_collection
@@ -0,0 +1,205 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def pooled_noise_level(fitness, groups):
+    """
+    Standard deviation of the fitness noise pooled over groups of replicates
+    (runs of the same parameter set with different Monte Carlo seeds)
+
+    Parameters
+    ----------
+
+    fitness: ~np.ndarray
+
+    groups: ~np.ndarray
+        group label of every run
+
+    Returns
+    -------
+        : ~float
+        None if no group has two finite runs
+    """
+    fitness = np.asarray(fitness, dtype=np.float64)
+    groups = np.asarray(groups)
+    finite = np.isfinite(fitness)
+    _, group_index = np.unique(groups[finite], return_inverse=True)
+    fitness = fitness[finite]
+    counts = np.bincount(group_index)
+    means = np.bincount(group_index, weights=fitness) / np.maximum(counts, 1)
+    squared_deviations = np.sum((fitness - means[group_index]) ** 2)
+    degrees_of_freedom = np.sum(np.maximum(counts - 1, 0))
+    if degrees_of_freedom == 0:
+        return None
+    return np.sqrt(squared_deviations / degrees_of_freedom)
+
+
+def measured_noise_level(parameter_collection):
+    """
+    Noise level measured by a `~dalek.fitter.optimizers.NoiseMeasurement`
+    fit - pooled over the replicates of its 'dalek.noise_set' column
+
+    Parameters
+    ----------
+
+    parameter_collection: ~dalek.parallel.ParameterCollection
+        fitter log of the noise measurement
+
+    Returns
+    -------
+        : ~float
+        None if no parameter set has two successful runs
+    """
+    if 'dalek.noise_set' not in parameter_collection.columns:
+        raise ValueError('The fitter log does not contain a noise measurement '
+                         '(no dalek.noise_set column)')
+    noise_set = parameter_collection['dalek.noise_set'].values
+    fitness = np.array(parameter_collection['dalek.fitness'].values,
+                       dtype=np.float64)
+    if 'dalek.failed' in parameter_collection.columns:
+        fitness[parameter_collection['dalek.failed'].values.astype(
+            bool)] = np.nan
+    replicates = noise_set >= 0
+    return pooled_noise_level(fitness[replicates], noise_set[replicates])
+
+
+class AdaptiveReevaluation(object):
+    """
+    Re-evaluation policy for noisy fitness: a candidate is run again with a
+    new Monte Carlo seed only if it is within threshold standard errors of
+    the incumbent (the parameter set with the best mean fitness so far), so
+    lucky runs are not chased and clearly worse candidates are never
+    repeated. The fitness of repeated parameter sets is the mean of their
+    replicates.
+
+    Parameters
+    ----------
+
+    noise_level: ~float
+        standard deviation of the fitness of a single run (e.g. measured
+        with `~dalek.fitter.optimizers.NoiseMeasurement`, see
+        `measured_noise_level`) [default=None - estimated from the
+        replicates]
+
+    threshold: ~float
+        number of standard errors [default=1.]
+
+    max_replicates: ~int
+        maximum number of runs of a parameter set [default=4]
+
+    seed: ~int
+        seed for drawing the Monte Carlo seeds [default=None]
+    """
+
+    def __init__(self, noise_level=None, threshold=1., max_replicates=4,
+                 seed=None):
+        self.configured_noise_level = noise_level
+        self.threshold = threshold
+        self.max_replicates = max_replicates
+        self.random_state = np.random.RandomState(seed)
+
+        # parameter set -> [sum of fitness, sum of squared fitness, runs]
+        self.replicates = {}
+        self.incumbent = None
+
+    @staticmethod
+    def keys(parameters):
+        return [tuple(row) for row in np.asarray(parameters,
+                                                 dtype=np.float64).tolist()]
+
+    @property
+    def noise_level(self):
+        """
+        Configured noise level or the estimate pooled over all replicates
+        """
+        if self.configured_noise_level is not None:
+            return self.configured_noise_level
+        squared_deviations = 0.
+        degrees_of_freedom = 0
+        for fitness_sum, squared_sum, runs in self.replicates.values():
+            if runs > 1:
+                squared_deviations += max(squared_sum -
+                                          fitness_sum ** 2 / runs, 0.)
+                degrees_of_freedom += runs - 1
+        if degrees_of_freedom == 0:
+            return None
+        return np.sqrt(squared_deviations / degrees_of_freedom)
+
+    def mean_fitness(self, key):
+        fitness_sum, _, runs = self.replicates[key]
+        return fitness_sum / runs
+
+    def add(self, parameters, fitness):
+        """
+        Add runs - non-finite fitness (failed runs) is ignored
+        """
+        update_incumbent = False
+        for key, value in zip(self.keys(parameters), fitness):
+            if not np.isfinite(value):
+                continue
+            statistics = self.replicates.setdefault(key, [0., 0., 0])
+            statistics[0] += value
+            statistics[1] += value ** 2
+            statistics[2] += 1
+            if key == self.incumbent:
+                update_incumbent = True
+            elif (self.incumbent is None or self.mean_fitness(key) <
+                  self.mean_fitness(self.incumbent)):
+                self.incumbent = key
+
+        if update_incumbent:
+            # the incumbent got worse - search the best mean again
+            self.incumbent = min(self.replicates, key=self.mean_fitness)
+
+    def statistics(self, parameters):
+        """
+        Mean fitness and number of runs of parameter sets (NaN and 0 for
+        parameter sets that never ran successfully)
+        """
+        means, runs = [], []
+        for key in self.keys(parameters):
+            if key in self.replicates:
+                means.append(self.mean_fitness(key))
+                runs.append(self.replicates[key][2])
+            else:
+                means.append(np.nan)
+                runs.append(0)
+        return np.array(means), np.array(runs, dtype=np.int64)
+
+    def select(self, parameters):
+        """
+        Which of the parameter sets should be run again
+
+        Returns
+        -------
+            : ~np.ndarray of ~bool
+        """
+        means, runs = self.statistics(parameters)
+        selected = np.zeros(len(means), dtype=bool)
+        if self.incumbent is None:
+            return selected
+
+        noise_level = self.noise_level
+        if noise_level is None:
+            # no replicates yet - repeat the best candidate to start the
+            # noise estimate
+            best = np.nanargmin(means) if np.isfinite(means).any() else None
+            if best is not None and runs[best] < self.max_replicates:
+                selected[best] = True
+            return selected
+
+        incumbent_mean = self.mean_fitness(self.incumbent)
+        incumbent_runs = self.replicates[self.incumbent][2]
+        standard_error = noise_level * np.sqrt(
+            1. / np.maximum(runs, 1) + 1. / incumbent_runs)
+        with np.errstate(invalid='ignore'):
+            selected = ((means - self.threshold * standard_error <=
+                         incumbent_mean) & (runs > 0) &
+                        (runs < self.max_replicates))
+        return selected
+
+    def new_seeds(self, number_of_seeds):
+        return self.random_state.randint(1, 2 ** 31 - 1, size=number_of_seeds)
@@ -1,12 +1,25 @@
 from abc import ABCMeta, abstractmethod
+import logging
 
+from dalek.fitter.noise import pooled_noise_level
+from dalek.fitter.sampling import sampler_dict
 from dalek.parallel import ParameterCollection
 import numpy as np
-import random
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
 
 class BaseOptimizer(object):
     __metaclass__ = ABCMeta
 
+    # optimizers setting this get the fitness function as keyword argument
+    requires_fitness_function = False
+
+    # whether evaluated rows of the parameter collection handed to __call__
+    # may be replaced by migrants of other islands (see `IslandModel`)
+    accepts_migrants = True
+
     def __init__(self):
         pass
 
@@ -14,6 +27,82 @@ class BaseOptimizer(object):
     def __call__(self, *args, **kwargs):
         pass
 
+    def update_steady_state(self, parameter_collection):
+        """
+        Steady-state update used by the asynchronous fitter. The given
+        parameter collection contains only the results that have just come
+        back from the engines and has a 'dalek.population_index' column
+        assigning each row to a member of the population. For each row one
+        new candidate for the same population member is returned.
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+
+        """
+        raise NotImplementedError('{0} does not support asynchronous '
+                                  'fitting'.format(self.__class__.__name__))
+
+    def annotate(self, parameter_collection):
+        """
+        Add bookkeeping columns to evaluated rows before they are logged (e.g.
+        whether MCMC proposals were accepted) - by default none
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+        """
+        return parameter_collection
+
+    def resume_from_log(self, resume_log):
+        """
+        Advance the optimizer past the rows of a resumed fit when no
+        checkpoint of its state is available - by default nothing is done
+        and the fit continues from the last logged iteration (see
+        `~dalek.fitter.FitterConfiguration.resume_generate_parameters`)
+
+        Parameters
+        ----------
+
+        resume_log: ~dalek.parallel.ParameterCollection
+        """
+        pass
+
+    def get_state(self):
+        """
+        Serializable (picklable) state of the optimizer including its random
+        state - everything that is needed to continue the optimization
+        exactly where it stopped
+
+        Returns
+        -------
+            : ~dict
+        """
+        state = dict(self.__dict__)
+        state.pop('parameter_config', None)
+        return state
+
+    def set_state(self, state):
+        """
+        Restore a state returned by `get_state`
+
+        Parameters
+        ----------
+
+        state: ~dict
+        """
+        self.__dict__.update(state)
+
     @staticmethod
     def normalize_parameter_collection(parameter_collection):
         """
@@ -48,28 +137,178 @@ class BaseOptimizer(object):
 
 
 class RandomSampling(BaseOptimizer):
-    def __init__(self, fitter_configuration):
-        raise NotImplementedError
-        self.fitter_configuration = fitter_configuration
-        self.lbounds = self.fitter_configuration.lbounds
-        self.ubounds = self.fitter_configuration.ubounds
-        self.n = self.fitter_configuration.number_of_samples
+    """
+    Maps the parameter space with a fixed design instead of optimizing -
+    every call returns the next number_of_samples points of the design
+    regardless of the fitness. Once the design is exhausted an empty
+    collection is returned, which ends the fit.
+
+    Parameters
+    ----------
+
+    parameter_conf: ~dalek.fitter.ParameterConfiguration
+
+    number_of_samples: ~int
+
+    sampler: ~str
+        design from `~dalek.fitter.sampling.sampler_dict` ('uniform',
+        'sobol', 'lhs' or 'maximin') [default='sobol']
+
+    sampler_kwargs:
+        passed to the sampler (number_of_points, seed, shard_index,
+        number_of_shards, ...)
+    """
+
+    accepts_migrants = False
+
+    def __init__(self, parameter_conf, number_of_samples, sampler='sobol',
+                 **sampler_kwargs):
+        self.parameter_config = parameter_conf
+        self.n = number_of_samples
+        self.sampler = sampler_dict[sampler](parameter_conf, **sampler_kwargs)
+
+    def generate_initial_parameter_collection(self, number_of_samples=None):
+        """
+        The first points of the design - used as the initial parameter
+        collection of the fit
+        """
+        return self.sampler.generate(number_of_samples or self.n)
+
+    def resume_from_log(self, resume_log):
+        """
+        Skip the points of the design that are already in the log
+        """
+        self.sampler.position += len(resume_log)
+        if self.sampler.stop is not None:
+            self.sampler.position = min(self.sampler.position,
+                                        self.sampler.stop)
 
     def __call__(self, parameter_collection):
-        parameters = []
-        for _ in range(self.n):
-            parameters.append(np.random.uniform(lbounds, ubounds))
-        return ParameterCollection(np.array(parameters), columns=self.fitter_configuration.parameter_names)
+        new_parameter_collection = self.sampler.generate(self.n)
+        if len(new_parameter_collection) == 0:
+            logger.info('All points of the design have been sampled')
+        return new_parameter_collection
 
 class NoiseMeasurement(BaseOptimizer):
-    def __init__(self, fitter_configuration):
-        raise NotImplementedError
-        self.fitter_configuration = fitter_configuration
-        self.n = self.fitter_configuration.number_of_samples
+    """
+    Measures the Monte Carlo noise of the fitness instead of optimizing -
+    every call runs number_of_samples replicates of fixed parameter sets,
+    each with its own Monte Carlo seed ('dalek.seed' column), in parallel.
+    The 'dalek.noise_set' column says which parameter set a row replicates.
+    The pooled standard deviation of the replicates (`noise_level`) is
+    computed from the fitter log of the measurement by the adaptive
+    re-evaluation of later fits (reevaluation option noise_log, see
+    `~dalek.fitter.noise.measured_noise_level`).
+
+    Parameters
+    ----------
+
+    parameter_conf: ~dalek.fitter.ParameterConfiguration
+
+    number_of_samples: ~int
+        number of replicates per call - distributed round robin over the
+        parameter sets
+
+    parameter_sets: ~list of ~dict
+        {parameter name: value} of the parameter sets to replicate
+        [default=None - the centre of the parameter bounds]
+
+    seed: ~int
+        seed for drawing the Monte Carlo seeds [default=None]
+    """
+
+    accepts_migrants = False
+
+    def __init__(self, parameter_conf, number_of_samples, parameter_sets=None,
+                 seed=None):
+        self.parameter_config = parameter_conf
+        self.n = number_of_samples
+        parameter_names = self.parameter_config.parameter_names
+        if parameter_sets is None:
+            self.parameter_sets = np.atleast_2d(
+                (np.array(self.parameter_config.lbounds, dtype=np.float64) +
+                 self.parameter_config.ubounds) * 0.5)
+        else:
+            self.parameter_sets = np.array(
+                [[parameter_set[name] for name in parameter_names]
+                 for parameter_set in parameter_sets], dtype=np.float64)
+        self.random_state = np.random.RandomState(seed)
+        self.fitness = [[] for _ in xrange(len(self.parameter_sets))]
+
+    def generate_initial_parameter_collection(self, number_of_samples=None):
+        """
+        The first replicates - used as the initial parameter collection of
+        the fit
+        """
+        return self.replicates(number_of_samples or self.n)
+
+    def replicates(self, number_of_replicates):
+        noise_set = np.arange(number_of_replicates) % len(self.parameter_sets)
+        parameter_collection = ParameterCollection(
+            self.parameter_sets[noise_set],
+            columns=self.parameter_config.parameter_names)
+        parameter_collection['dalek.noise_set'] = noise_set
+        parameter_collection['dalek.seed'] = self.random_state.randint(
+            1, 2 ** 31 - 1, size=number_of_replicates)
+        return parameter_collection
+
+    @property
+    def noise_level(self):
+        """
+        Standard deviation of the fitness of a single run pooled over the
+        parameter sets (None with fewer than two runs of any set)
+        """
+        fitness = np.concatenate([np.array(set_fitness, dtype=np.float64)
+                                  for set_fitness in self.fitness])
+        groups = np.concatenate([np.ones(len(set_fitness)) * i
+                                 for i, set_fitness in enumerate(self.fitness)])
+        return pooled_noise_level(fitness, groups)
+
+    @property
+    def fitness_variance(self):
+        """
+        Variance of the fitness of every parameter set (NaN with fewer than
+        two runs)
+        """
+        return np.array([np.var(set_fitness, ddof=1)
+                         if len(set_fitness) > 1 else np.nan
+                         for set_fitness in self.fitness])
+
+    def add_runs(self, parameter_collection):
+        """
+        Add the fitness of evaluated replicates - failed runs are ignored
+
+        Returns
+        -------
+            : ~int
+            number of replicate rows
+        """
+        if 'dalek.noise_set' not in parameter_collection.columns:
+            return 0
+        fitness = parameter_collection['dalek.fitness'].values.astype(
+            np.float64)
+        if 'dalek.failed' in parameter_collection.columns:
+            fitness[parameter_collection['dalek.failed'].values.astype(
+                bool)] = np.nan
+        noise_sets = parameter_collection['dalek.noise_set'].values
+        for noise_set, value in zip(noise_sets, fitness):
+            if noise_set >= 0 and np.isfinite(value):
+                self.fitness[int(noise_set)].append(value)
+        return int(np.sum(noise_sets >= 0))
+
+    def resume_from_log(self, resume_log):
+        """
+        Add the logged replicates and skip the Monte Carlo seeds they used
+        """
+        number_of_replicates = self.add_runs(resume_log)
+        self.random_state.randint(1, 2 ** 31 - 1, size=number_of_replicates)
 
     def __call__(self, parameter_collection):
-        parameters = [random.randint(0, 2**16) for _ in range(self.n)]
-        return ParameterCollection(np.array(parameters), columns=['montecarlo.seed'])
+        if self.add_runs(parameter_collection) > 0:
+            logger.info('Fitness noise level {0} from {1} runs'.format(
+                self.noise_level, sum(map(len, self.fitness))))
+        return self.replicates(self.n)
+
 
 class LuusJaakolaOptimizer(BaseOptimizer):
     def __init__(self, parameter_conf, number_of_samples, **kwargs):
@@ -79,132 +318,1320 @@ class LuusJaakolaOptimizer(BaseOptimizer):
         self.n = number_of_samples
         self.d = np.array(self.parameter_config.ubounds -
                           self.parameter_config.lbounds) * 0.5
+        self.best_fitness = np.inf
+        self.steady_state_evaluations = 0
+
+    def sample_around_best(self, best_x, number_of_samples):
+        lbounds = self.parameter_config.lbounds
+        ubounds = self.parameter_config.ubounds
+        return [np.random.uniform(np.clip(best_x - self.d, lbounds, ubounds),
+                                  np.clip(best_x + self.d, lbounds, ubounds))
+                for _ in range(number_of_samples)]
 
     def __call__(self, parameter_collection):
 
         fitness, split_param_collection = self.split_parameter_collection(
             parameter_collection)
-        best_fit = split_param_collection.ix[fitness.argmin()]
+        best_fit = split_param_collection.iloc[np.nanargmin(fitness.values)]
 
         best_x = best_fit[self.parameter_config.parameter_names].values
-        new_parameters = [best_x]
-        lbounds = self.parameter_config.lbounds
-        ubounds = self.parameter_config.ubounds
-        for _ in range(self.n):
-            new_parameters.append(np.random.uniform(np.clip(best_x - self.d,
-                                                            lbounds, ubounds),
-                                                    np.clip(best_x + self.d,
-                                                            lbounds, ubounds)))
+        new_parameters = [best_x] + self.sample_around_best(best_x, self.n)
         self.d *= 0.95
         new_parameter_collection = ParameterCollection(np.array(new_parameters),
                                    columns=self.parameter_config.parameter_names)
         return new_parameter_collection
 
+    def update_steady_state(self, parameter_collection):
+        fitness, split_param_collection = self.split_parameter_collection(
+            parameter_collection)
+
+        if fitness.min() < self.best_fitness:
+            self.best_fitness = fitness.min()
+            self.x = split_param_collection.iloc[
+                np.nanargmin(fitness.values)].values
+
+        # shrink the search region once per number_of_samples results
+        # to mimic the generational schedule
+        self.steady_state_evaluations += len(parameter_collection)
+        while self.steady_state_evaluations >= self.n:
+            self.d *= 0.95
+            self.steady_state_evaluations -= self.n
+
+        new_parameter_collection = ParameterCollection(
+            np.array(self.sample_around_best(self.x, len(parameter_collection))),
+            columns=self.parameter_config.parameter_names)
+        new_parameter_collection['dalek.population_index'] = (
+            parameter_collection['dalek.population_index'].values)
+        return new_parameter_collection
+
+def reflect_into_bounds(x, lbounds, ubounds):
+    """
+    Reflect the components of x that lie outside of [lbounds, ubounds] at the
+    violated bound (repeatedly, so arbitrarily far outliers end up inside)
+
+    Parameters
+    ----------
+
+    x: ~np.ndarray
+        array of shape (..., dim)
+
+    lbounds, ubounds: ~np.ndarray
+        bounds of shape (dim,)
+
+    Returns
+    -------
+        : ~np.ndarray
+    """
+    width = ubounds - lbounds
+    offset = np.mod(x - lbounds, 2 * width)
+    return lbounds + np.where(offset > width, 2 * width - offset, offset)
+
+
+def bounce_back_into_bounds(x, parents, lbounds, ubounds, random_state=np.random):
+    """
+    Replace the components of x that lie outside of [lbounds, ubounds] by a
+    random point between the parent and the violated bound
+
+    Parameters
+    ----------
+
+    x, parents: ~np.ndarray
+        arrays of shape (n, dim)
+
+    lbounds, ubounds: ~np.ndarray
+        bounds of shape (dim,)
+
+    Returns
+    -------
+        : ~np.ndarray
+    """
+    lbounds = np.broadcast_to(lbounds, x.shape)
+    ubounds = np.broadcast_to(ubounds, x.shape)
+    u = random_state.random_sample(x.shape)
+    x = np.where(x < lbounds, parents + u * (lbounds - parents), x)
+    return np.where(x > ubounds, parents + u * (ubounds - parents), x)
+
+
 class DEOptimizer(BaseOptimizer):
-    def __init__(self, parameter_conf, number_of_samples, **kwargs):
+    """
+    Differential evolution working on the whole population as arrays
+
+    Parameters
+    ----------
+
+    parameter_conf: ~dalek.fitter.ParameterConfiguration
+
+    number_of_samples: ~int
+        population size
+
+    strategy: ~str
+        'rand1bin' - mutant a + f * (b - c) of three random members
+        'best1bin' - mutant best + f * (a - b)
+        'current_to_pbest1bin' - JADE mutant x + f * (pbest - x) + f * (a - b)
+            with a random member pbest of the best p fraction, b drawn from
+            the population and the archive of replaced parents, and f and cr
+            adapted from successful trials [default='rand1bin']
+
+    f: ~float
+        differential weight (initial mean for JADE) [default=0.5]
+
+    cr: ~float
+        crossover probability (initial mean for JADE) [default=0.9]
+
+    p: ~float
+        JADE: fraction of the best members to draw pbest from [default=0.05]
+
+    c: ~float
+        JADE: adaptation rate of the means of f and cr [default=0.1]
+
+    archive: ~bool
+        JADE: keep an archive of replaced parents [default=True]
+
+    bound_handling: ~str
+        'reflect' at the bounds or 'bounce_back' between parent and bound
+        [default='reflect']
+
+    seed: ~int
+        seed of the optimizer's random state [default=None]
+    """
+
+    strategies = ['rand1bin', 'best1bin', 'current_to_pbest1bin']
+
+    def __init__(self, parameter_conf, number_of_samples, strategy='rand1bin',
+                 f=0.5, cr=0.9, p=0.05, c=0.1, archive=True,
+                 bound_handling='reflect', seed=None, **kwargs):
+        if len(kwargs) > 0:
+            # accepted for configurations written for older versions
+            logger.warning('Ignoring unknown differential evolution options '
+                           '{0}'.format(', '.join(sorted(kwargs))))
+        if strategy not in self.strategies:
+            raise ValueError('Unknown differential evolution strategy {0} - '
+                             'allowed are {1}'.format(strategy,
+                                                      self.strategies))
+        if bound_handling not in ('reflect', 'bounce_back'):
+            raise ValueError('Unknown bound handling {0}'.format(
+                bound_handling))
         self.population = None
         self.fitness = None
         self.parameter_config = parameter_conf
         self.dim = len(self.parameter_config.parameter_names)
-        self.cr = kwargs.get('cr', 0.9)
-        self.f = kwargs.get('f', 0.5)
+        self.strategy = strategy
+        self.cr = cr
+        self.f = f
+        self.p = p
+        self.c = c
+        self.use_archive = archive and strategy == 'current_to_pbest1bin'
+        self.bound_handling = bound_handling
         if number_of_samples < 4:
             raise ValueError('Need at least 4 samples for differential evolution')
         self.n = number_of_samples
+        self.random_state = np.random.RandomState(seed)
+
+        self.lbounds = np.array(self.parameter_config.lbounds, dtype=np.float64)
+        self.ubounds = np.array(self.parameter_config.ubounds, dtype=np.float64)
+
+        self.archive = np.empty((0, self.dim))
+        self.trial_f = np.ones(self.n) * f
+        self.trial_cr = np.ones(self.n) * cr
+
+    @staticmethod
+    def clean_fitness(fitness):
+        fitness = np.array(fitness, dtype=np.float64)
+        fitness[np.isnan(fitness)] = np.inf
+        return fitness
+
+    def random_distinct_indices(self, pool, excluded, size=None):
+        """
+        Draw one index per row of excluded from pool (or from range(size) if
+        given) that differs from all indices in that row
+
+        Parameters
+        ----------
+
+        pool: ~np.ndarray
+            indices to draw from
 
-        self.lbounds = np.array(self.parameter_config.lbounds)
-        self.ubounds = np.array(self.parameter_config.ubounds)
+        excluded: ~np.ndarray
+            array (number_of_rows, k) of indices to avoid
+
+        Returns
+        -------
+            : ~np.ndarray
+        """
+        pool_size = len(pool) if size is None else size
+        positions = self.random_state.randint(0, pool_size, len(excluded))
+        indices = positions if size is not None else pool[positions]
+        collision = (indices[:, None] == excluded).any(axis=1)
+        while collision.any():
+            positions = self.random_state.randint(0, pool_size,
+                                                  collision.sum())
+            indices[collision] = (positions if size is not None
+                                  else pool[positions])
+            collision = (indices[:, None] == excluded).any(axis=1)
+        return indices
+
+    def sample_f_cr(self, number_of_trials):
+        if self.strategy != 'current_to_pbest1bin':
+            return (np.ones(number_of_trials) * self.f,
+                    np.ones(number_of_trials) * self.cr)
+        cr = np.clip(self.random_state.normal(self.cr, 0.1, number_of_trials),
+                     0, 1)
+        f = np.zeros(number_of_trials)
+        redraw = np.ones(number_of_trials, dtype=bool)
+        while redraw.any():
+            f[redraw] = self.f + 0.1 * self.random_state.standard_cauchy(
+                redraw.sum())
+            redraw = f <= 0
+        return np.minimum(f, 1.), cr
+
+    def generate_trials(self, indices):
+        """
+        Generate one trial vector for each of the population members indices
+        from the members that have already been evaluated. Members without an
+        evaluated vector (or if fewer than 4 are evaluated) get a uniformly
+        drawn vector instead.
+
+        Parameters
+        ----------
+
+        indices: ~np.ndarray
+
+        Returns
+        -------
+            : ~np.ndarray
+            trial vectors of shape (len(indices), dim)
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        trials = self.random_state.uniform(self.lbounds, self.ubounds,
+                                           (len(indices), self.dim))
+        pool = np.where(np.isfinite(self.fitness))[0]
+        if len(pool) < 4:
+            return trials
+        evolve = np.isfinite(self.fitness[indices])
+        targets = indices[evolve]
+        number_of_trials = len(targets)
+        if number_of_trials == 0:
+            return trials
+
+        population = self.population
+        f, cr = self.sample_f_cr(number_of_trials)
+        self.trial_f[targets] = f
+        self.trial_cr[targets] = cr
+
+        excluded = targets[:, None]
+        r1 = self.random_distinct_indices(pool, excluded)
+        excluded = np.hstack((excluded, r1[:, None]))
+        if self.strategy == 'current_to_pbest1bin':
+            number_of_pbest = max(1, int(round(self.p * len(pool))))
+            pbest_pool = pool[np.argsort(self.fitness[pool],
+                                         kind='mergesort')[:number_of_pbest]]
+            pbest = pbest_pool[self.random_state.randint(
+                0, number_of_pbest, number_of_trials)]
+            # the second difference vector may come from the archive
+            union = np.vstack((population, self.archive))
+            union_pool = np.hstack((pool, self.n + np.arange(
+                len(self.archive))))
+            r2 = self.random_distinct_indices(union_pool, excluded)
+            mutants = (population[targets] +
+                       f[:, None] * (population[pbest] - population[targets]) +
+                       f[:, None] * (population[r1] - union[r2]))
+        else:
+            r2 = self.random_distinct_indices(pool, excluded)
+            if self.strategy == 'rand1bin':
+                excluded = np.hstack((excluded, r2[:, None]))
+                r3 = self.random_distinct_indices(pool, excluded)
+                mutants = population[r1] + f[:, None] * (population[r2] -
+                                                         population[r3])
+            else:
+                best = pool[np.argmin(self.fitness[pool])]
+                mutants = population[best] + f[:, None] * (population[r1] -
+                                                           population[r2])
+
+        crossover = self.random_state.random_sample(
+            (number_of_trials, self.dim)) < cr[:, None]
+        crossover[np.arange(number_of_trials),
+                  self.random_state.randint(0, self.dim,
+                                            number_of_trials)] = True
+        evolved_trials = np.where(crossover, mutants, population[targets])
+
+        if self.bound_handling == 'reflect':
+            evolved_trials = reflect_into_bounds(evolved_trials, self.lbounds,
+                                                 self.ubounds)
+        else:
+            evolved_trials = bounce_back_into_bounds(
+                evolved_trials, population[targets], self.lbounds,
+                self.ubounds, self.random_state)
+
+        # a trial can still equal its parent if the crossed components of the
+        # difference vectors vanish - such a duplicate would waste a TARDIS
+        # run, use the full mutant instead (or a random vector if the
+        # population has collapsed onto the parent)
+        parents = population[targets]
+        duplicate = np.all(evolved_trials == parents, axis=1)
+        if duplicate.any():
+            evolved_trials[duplicate] = reflect_into_bounds(
+                mutants[duplicate], self.lbounds, self.ubounds)
+            duplicate = np.all(evolved_trials == parents, axis=1)
+            evolved_trials[duplicate] = trials[evolve][duplicate]
+        trials[evolve] = evolved_trials
+        return trials
+
+    def select(self, indices, vectors, fitness):
+        """
+        Replace the population members indices by vectors where they are at
+        least as good and adapt the JADE parameters from the successful trials
+        """
+        fitness = self.clean_fitness(fitness)
+        was_evaluated = np.isfinite(self.fitness[indices])
+        improved = fitness <= self.fitness[indices]
+        replaced = indices[improved & was_evaluated]
+
+        if self.use_archive and len(replaced) > 0:
+            self.archive = np.vstack((self.archive, self.population[replaced]))
+            if len(self.archive) > self.n:
+                keep = self.random_state.permutation(len(self.archive))[
+                    :self.n]
+                self.archive = self.archive[keep]
+
+        if self.strategy == 'current_to_pbest1bin':
+            successful = indices[improved & was_evaluated &
+                                 (fitness < self.fitness[indices])]
+            if len(successful) > 0:
+                successful_f = self.trial_f[successful]
+                self.cr = ((1 - self.c) * self.cr +
+                           self.c * np.mean(self.trial_cr[successful]))
+                self.f = ((1 - self.c) * self.f +
+                          self.c * np.sum(successful_f ** 2) /
+                          np.sum(successful_f))
+
+        self.population[indices[improved]] = vectors[improved]
+        self.fitness[indices[improved]] = fitness[improved]
+
+    def update_steady_state(self, parameter_collection):
+        fitness, split_param_collection = self.split_parameter_collection(
+            parameter_collection)
+        population_indices = parameter_collection[
+            'dalek.population_index'].values.astype(np.int64)
+        if self.population is None:
+            self.population = np.empty((self.n, self.dim)) * np.nan
+            self.fitness = np.ones(self.n) * np.inf
+
+        # only the last result of a member returned twice in one batch counts
+        _, last = np.unique(population_indices[::-1], return_index=True)
+        last = len(population_indices) - 1 - last
+        self.select(population_indices[last],
+                    split_param_collection.values[last], fitness.values[last])
+
+        params = ParameterCollection(self.generate_trials(population_indices),
+                                     columns=self.parameter_config.parameter_names)
+        params['dalek.population_index'] = population_indices
+        return params
 
-    def violates_bounds(self, x):
-        return any(x < self.lbounds) or any(x > self.ubounds)
-        
     def __call__(self, parameter_collection):
         fitness, split_param_collection = self.split_parameter_collection(
             parameter_collection)
         if self.population is None:
-            self.population = np.array(split_param_collection.values)
-            self.fitness = np.array(fitness.values)
+            self.population = np.array(split_param_collection.values,
+                                       dtype=np.float64)
+            self.fitness = self.clean_fitness(fitness.values)
         else:
-            new_population = np.array(split_param_collection.values)
-            for index, vector in enumerate(self.population):
-                if fitness[index] < self.fitness[index]:
-                    self.population[index] = np.array(new_population[index])
-                    self.fitness[index] = fitness[index]
-        candidates = self.population.copy()
-        for index, vector in enumerate(self.population):
-            indices = [i for i in range(self.n) if i != index]
-            random.shuffle(indices)
-            i1, i2, i3 = indices[:3]
-            a, b, c = self.population[i1], self.population[i2], self.population[i3]
-            r_ = np.random.randint(0, self.dim)
-            for j, x in enumerate(vector):
-                ri = np.random.random()
-                if ri < self.cr or j == r_:
-                    candidates[index][j] = a[j] + self.f * (b[j] - c[j])
-                else:
-                    candidates[index][j] = x
-            if self.violates_bounds(candidates[index]):
-                candidates[index] = np.array(vector)
-	params = ParameterCollection(np.array(candidates),
-                                 columns=self.parameter_config.parameter_names)
-	return params
-
-class PSOOptimizerGbest(BaseOptimizer):
-    def __init__(self, parameter_conf, number_of_samples, **kwargs):
+            self.select(np.arange(self.n), split_param_collection.values,
+                        fitness.values)
+
+        params = ParameterCollection(self.generate_trials(np.arange(self.n)),
+                                     columns=self.parameter_config.parameter_names)
+        return params
+
+class PSOOptimizer(BaseOptimizer):
+    """
+    Particle swarm optimizer with constriction coefficient working on the
+    whole swarm as arrays. Each particle is attracted by its personal best and
+    by the best personal best within its neighbourhood.
+
+    Parameters
+    ----------
+
+    parameter_conf: ~dalek.fitter.ParameterConfiguration
+
+    number_of_samples: ~int
+        number of particles
+
+    topology: ~str
+        neighbourhood of the particles:
+
+        'global' - the whole swarm
+        'ring' - the k particles on either side (lbest)
+        'von_neumann' - the four neighbours on a toroidal grid
+        'random_k' - k random informants, redrawn after every generation that
+            did not improve the best fitness
+
+    k: ~int
+        neighbourhood size for 'ring' (on each side) and 'random_k'
+        [default=1 for 'ring', 3 for 'random_k']
+
+    c1, c2: ~float
+        cognitive and social acceleration coefficients [default=2.05]
+
+    seed: ~int
+        seed of the optimizer's random state [default=None]
+    """
+
+    topologies = ['global', 'ring', 'von_neumann', 'random_k']
+
+    def __init__(self, parameter_conf, number_of_samples, topology='global',
+                 k=None, c1=2.05, c2=2.05, seed=None, **kwargs):
+        if topology not in self.topologies:
+            raise ValueError('Unknown PSO topology {0} - allowed are '
+                             '{1}'.format(topology, self.topologies))
         self.parameter_config = parameter_conf
         self.x = None
         self.px = None
+        self.py = None
         self.v = None
-        self.c1 = 2.05
-        self.c2 = 2.05
+        self.c1 = c1
+        self.c2 = c2
         self.chi = 2.0 / (self.c1 + self.c2 - 2.0 + np.sqrt((self.c1 + self.c2) ** 2 - 4.0 * (self.c1 + self.c2)))
         self.n = number_of_samples
-        self.lbounds = np.array(self.parameter_config.lbounds)
-        self.ubounds = np.array(self.parameter_config.ubounds)
+        self.dim = len(self.parameter_config.parameter_names)
+        self.lbounds = np.array(self.parameter_config.lbounds, dtype=np.float64)
+        self.ubounds = np.array(self.parameter_config.ubounds, dtype=np.float64)
+        self.random_state = np.random.RandomState(seed)
 
-    def neighbourhood(self, index):
-        return [i for i in range(self.n) if i != index]
+        self.topology = topology
+        if k is None:
+            k = 3 if topology == 'random_k' else 1
+        self.k = k
+        self.best_fitness = np.inf
+        # particles updated in the current generation (steady-state updates
+        # only cover a few particles)
+        self.generation_updates = 0
+        self.neighbours = self.build_neighbours()
+
+    def build_neighbours(self):
+        """
+        Index array (number_of_samples, neighbourhood size) of the
+        neighbourhood of every particle (including the particle itself) -
+        None for the global topology
+        """
+        indices = np.arange(self.n)
+        if self.topology == 'global':
+            return None
+        elif self.topology == 'ring':
+            offsets = np.arange(-self.k, self.k + 1)
+            return (indices[:, None] + offsets[None, :]) % self.n
+        elif self.topology == 'von_neumann':
+            rows = int(np.sqrt(self.n))
+            while self.n % rows != 0:
+                rows -= 1
+            columns = self.n // rows
+            row, column = indices // columns, indices % columns
+            return np.column_stack((
+                indices,
+                ((row - 1) % rows) * columns + column,
+                ((row + 1) % rows) * columns + column,
+                row * columns + (column - 1) % columns,
+                row * columns + (column + 1) % columns))
+        elif self.topology == 'random_k':
+            return np.column_stack((indices, self.random_state.randint(
+                0, self.n, (self.n, self.k))))
+
+    def best_neighbours(self, indices):
+        """
+        Index of the best personal best in the neighbourhood of the particles
+        indices (an index array or a slice)
+        """
+        if self.neighbours is None:
+            return np.argmin(self.py)
+        neighbours = self.neighbours[indices]
+        return neighbours[np.arange(len(neighbours)),
+                          np.argmin(self.py[neighbours], axis=1)]
+
+    def initialize_swarm(self):
+        self.x = np.empty((self.n, self.dim)) * np.nan
+        self.px = np.empty((self.n, self.dim)) * np.nan
+        self.py = np.ones(self.n) * np.inf
+        self.v = np.zeros((self.n, self.dim))
+
+    def update_personal_bests(self, indices, x, y):
+        y = np.array(y, dtype=np.float64)
+        y[np.isnan(y)] = np.inf
+        self.x[indices] = x
+        improved = y < self.py[indices]
+        self.px[indices[improved]] = x[improved]
+        self.py[indices[improved]] = y[improved]
+
+        if self.topology == 'random_k':
+            self.generation_updates += len(y)
+            if self.generation_updates < self.n:
+                return
+            self.generation_updates = 0
+            if self.py.min() < self.best_fitness:
+                self.best_fitness = self.py.min()
+            else:
+                self.neighbours = self.build_neighbours()
+
+    def move_particles(self, indices):
+        """
+        Update velocity and position of the particles indices (an index array
+        or a slice) and return their new positions (reflected into the
+        bounds)
+        """
+        x = self.x[indices]
+        px = self.px[indices]
+        gx = self.px[self.best_neighbours(indices)]
+        if not np.isfinite(self.py).all():
+            # particles without an evaluated personal best yet
+            px = np.where(np.isfinite(px), px, x)
+            gx = np.where(np.isfinite(gx), gx, x)
+
+        random_numbers = self.random_state.random_sample((2,) + x.shape)
+        v = self.v[indices]
+        v += self.c1 * random_numbers[0] * (px - x)
+        v += self.c2 * random_numbers[1] * (gx - x)
+        v *= self.chi
+        new_x = x + v
+        out_of_bounds = (new_x < self.lbounds) | (new_x > self.ubounds)
+        if out_of_bounds.any():
+            # bounce off the bounds
+            np.negative(v, out=v, where=out_of_bounds)
+            rows = np.where(out_of_bounds.any(axis=1))[0]
+            new_x[rows] = reflect_into_bounds(new_x[rows], self.lbounds,
+                                              self.ubounds)
+        self.v[indices] = v
+        return new_x
+
+    def update_steady_state(self, parameter_collection):
+        fitness, split_param_collection = self.split_parameter_collection(
+            parameter_collection)
+        population_indices = parameter_collection[
+            'dalek.population_index'].values.astype(np.int64)
+        if self.x is None:
+            self.initialize_swarm()
+
+        self.update_personal_bests(population_indices,
+                                   split_param_collection.values,
+                                   fitness.values)
+
+        params = ParameterCollection(
+            self.move_particles(population_indices),
+            columns=self.parameter_config.parameter_names)
+        params['dalek.population_index'] = population_indices
+        return params
 
-    def violates_bounds(self, x):
-        return any(x < self.lbounds) or any(x > self.ubounds)
-        
     def __call__(self, parameter_collection):
-        candidates = np.array([x[:-1] for x in parameter_collection.values])
+        fitness, split_param_collection = self.split_parameter_collection(
+            parameter_collection)
         if self.x is None:
-            self.x = np.array(candidates)
-            self.y = np.array([x[-1] for x in parameter_collection.values])
-            self.px = np.array(candidates)
-            self.py = np.array([x[-1] for x in parameter_collection.values])
-            self.v = np.zeros(self.x.shape)
+            self.initialize_swarm()
+        self.update_personal_bests(np.arange(self.n),
+                                   split_param_collection.values,
+                                   fitness.values)
+
+        return ParameterCollection(
+            self.move_particles(slice(None)),
+            columns=self.parameter_config.parameter_names)
+
+
+class PSOOptimizerGbest(PSOOptimizer):
+    """
+    Particle swarm optimizer with the global topology
+    """
+
+    def __init__(self, parameter_conf, number_of_samples, **kwargs):
+        kwargs['topology'] = 'global'
+        super(PSOOptimizerGbest, self).__init__(parameter_conf,
+                                                number_of_samples, **kwargs)
+
+
+class CMAESOptimizer(BaseOptimizer):
+    """
+    Covariance matrix adaptation evolution strategy (Hansen 2016, "The CMA
+    Evolution Strategy: A Tutorial"). Every call updates the distribution
+    with the evaluated batch and samples the next batch of
+    number_of_samples candidates.
+
+    The search runs on the parameters normalized to the unit cube and the
+    samples are reflected into the bounds, so every candidate is feasible
+    while the distribution itself stays unconstrained.
+
+    Parameters
+    ----------
+
+    parameter_conf: ~dalek.fitter.ParameterConfiguration
+
+    number_of_samples: ~int
+        population size lambda of the first run (= size of a batch)
+
+    sigma0: ~float
+        initial step size as a fraction of the parameter ranges
+        [default=0.3]
+
+    restarts: ~str
+        None, 'ipop' (restart with doubled population size) or 'bipop'
+        (alternate between doubling and small populations with smaller step
+        sizes) [default=None]
+
+    max_restarts: ~int
+        maximum number of restarts [default=9]
+
+    tolfun: ~float
+        restart if the best fitness of the recent generations changed less
+        than this [default=1e-11]
+
+    tolx: ~float
+        restart if the step size in normalized coordinates is below this
+        [default=1e-11]
+
+    seed: ~int
+        seed of the optimizer's random state [default=None]
+    """
+
+    accepts_migrants = False
+
+    def __init__(self, parameter_conf, number_of_samples, sigma0=0.3,
+                 restarts=None, max_restarts=9, tolfun=1e-11, tolx=1e-11,
+                 seed=None):
+        if restarts not in (None, 'ipop', 'bipop'):
+            raise ValueError('Unknown restart strategy {0} - allowed are '
+                             'None, ipop and bipop'.format(restarts))
+        if number_of_samples < 2:
+            raise ValueError('CMA-ES needs at least 2 samples')
+        self.parameter_config = parameter_conf
+        self.dim = len(self.parameter_config.parameter_names)
+        self.lbounds = np.array(self.parameter_config.lbounds, dtype=np.float64)
+        self.ubounds = np.array(self.parameter_config.ubounds, dtype=np.float64)
+        self.default_population_size = number_of_samples
+        self.sigma0 = sigma0
+        self.restarts = restarts
+        self.max_restarts = max_restarts
+        self.tolfun = tolfun
+        self.tolx = tolx
+        self.random_state = np.random.RandomState(seed)
+
+        self.mean = None
+        self.genotypes = None
+        self.number_of_restarts = 0
+        self.large_population_size = number_of_samples
+        self.evaluations = {'large': 0, 'small': 0}
+        self.regime = 'large'
+        self.best_fitness = np.inf
+        self.best_x = None
+
+    def to_phenotype(self, genotypes):
+        return self.lbounds + (self.ubounds - self.lbounds) * reflect_into_bounds(
+            genotypes, np.zeros(self.dim), np.ones(self.dim))
+
+    def start_run(self, mean, population_size, sigma):
+        """
+        Reset the strategy parameters and the state for a (re)start
+        """
+        n = self.dim
+        self.n = population_size
+        self.mu = population_size // 2
+        weights = np.log((population_size + 1) / 2.) - np.log(
+            np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = 1. / np.sum(self.weights ** 2)
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) /
+                       ((n + 2) ** 2 + self.mueff))
+        self.damps = (1 + 2 * max(0, np.sqrt((self.mueff - 1) / (n + 1)) - 1)
+                      + self.cs)
+        self.chi_n = np.sqrt(n) * (1 - 1. / (4 * n) + 1. / (21 * n ** 2))
+
+        self.mean = np.array(mean, dtype=np.float64)
+        self.sigma = sigma
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.C = np.eye(n)
+        self.generation = 0
+        self.fitness_history = []
+
+    def ask(self):
+        """
+        Sample population_size new genotypes from the distribution
+        """
+        z = self.random_state.standard_normal((self.n, self.dim))
+        self.genotypes = self.mean + self.sigma * np.dot(z * self.D, self.B.T)
+        return self.to_phenotype(self.genotypes)
+
+    def tell(self, fitness):
+        """
+        Update the distribution with the fitness of the last sampled genotypes
+        """
+        n = self.dim
+        order = np.argsort(fitness, kind='mergesort')
+        selected = self.genotypes[order[:self.mu]]
+        old_mean = self.mean
+        self.mean = np.dot(self.weights, selected)
+
+        step = (self.mean - old_mean) / self.sigma
+        inverse_sqrt_c = np.dot(self.B / self.D, self.B.T)
+        self.ps = ((1 - self.cs) * self.ps +
+                   np.sqrt(self.cs * (2 - self.cs) * self.mueff) *
+                   np.dot(inverse_sqrt_c, step))
+        self.generation += 1
+        hsig = (np.linalg.norm(self.ps) /
+                np.sqrt(1 - (1 - self.cs) ** (2 * self.generation)) /
+                self.chi_n < 1.4 + 2. / (n + 1))
+        self.pc = ((1 - self.cc) * self.pc + hsig *
+                   np.sqrt(self.cc * (2 - self.cc) * self.mueff) * step)
+
+        y = (selected - old_mean) / self.sigma
+        self.C = ((1 - self.c1 - self.cmu) * self.C +
+                  self.c1 * (np.outer(self.pc, self.pc) +
+                             (1 - hsig) * self.cc * (2 - self.cc) * self.C) +
+                  self.cmu * np.dot(y.T * self.weights, y))
+        self.sigma *= np.exp((self.cs / self.damps) *
+                             (np.linalg.norm(self.ps) / self.chi_n - 1))
+
+        self.C = np.triu(self.C) + np.triu(self.C, 1).T
+        eigenvalues, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigenvalues, 1e-300))
+
+        self.fitness_history.append(fitness[order[0]])
+
+    def should_restart(self):
+        history_length = 10 + int(np.ceil(30. * self.dim / self.n))
+        recent = np.array(self.fitness_history[-history_length:])
+        if (len(self.fitness_history) >= history_length and
+                np.all(np.isfinite(recent)) and
+                recent.max() - recent.min() < self.tolfun):
+            return True
+        if self.sigma * max(np.abs(self.pc).max(),
+                            np.sqrt(np.diag(self.C)).max()) < self.tolx:
+            return True
+        if self.D.max() > 1e7 * self.D.min():
+            return True
+        return False
+
+    def restart(self):
+        """
+        Start a new run from a random mean with the population size chosen by
+        the restart strategy
+        """
+        self.number_of_restarts += 1
+        mean = self.random_state.uniform(0, 1, self.dim)
+        if self.restarts == 'ipop':
+            self.large_population_size *= 2
+            population_size, sigma = self.large_population_size, self.sigma0
         else:
-            for index, candidate in enumerate(parameter_collection.values):
-                if candidate[-1] < self.py[index]:
-                    self.px[index] = np.array(candidate[:-1])
-                    self.py[index] = candidate[-1]
-        gx = np.zeros(self.x.shape)
-        for index, _ in enumerate(self.x):
-            neighbours = self.neighbourhood(index)
-            nx, ny = min(zip([self.px[i] for i in neighbours], 
-                             [self.py[i] for i in neighbours]), 
-                         key=lambda pair: pair[1])
-            gx[index] = np.array(nx)
-        self.v = self.chi * (self.v + 
-                             self.c1 * np.random.sample(self.x.shape) * (self.px - self.x) + 
-                             self.c2 * np.random.sample(self.x.shape) * (gx - self.x))
-        candidates = np.array(self.x + self.v)
-        for index, x in enumerate(candidates):
-            if not self.violates_bounds(x):
-                candidates[index] = np.array(x)
+            # BIPOP: run the regime that has used fewer evaluations
+            if (self.number_of_restarts == 1 or
+                    self.evaluations['small'] >= self.evaluations['large']):
+                self.regime = 'large'
+                self.large_population_size *= 2
+                population_size, sigma = (self.large_population_size,
+                                          self.sigma0)
             else:
-                candidates[index] = np.array(self.px[index])
-        self.x += self.v
-        params = ParameterCollection(
-            candidates, columns=self.parameter_config.parameter_names)
-        
-        return params
-        
+                self.regime = 'small'
+                u = self.random_state.uniform()
+                population_size = int(
+                    self.default_population_size *
+                    (0.5 * self.large_population_size /
+                     self.default_population_size) ** (u ** 2))
+                sigma = self.sigma0 * 10 ** (-2 * u)
+        logger.info('Restarting CMA-ES ({0} restart {1}) with population '
+                    'size {2}'.format(self.restarts, self.number_of_restarts,
+                                      population_size))
+        self.start_run(mean, max(population_size, 2), sigma)
+
+    def __call__(self, parameter_collection):
+        fitness, split_param_collection = self.split_parameter_collection(
+            parameter_collection)
+        fitness = np.array(fitness.values, dtype=np.float64)
+        fitness[np.isnan(fitness)] = np.inf
+        parameters = np.array(split_param_collection.values, dtype=np.float64)
+
+        if fitness.min() < self.best_fitness:
+            self.best_fitness = fitness.min()
+            self.best_x = parameters[np.argmin(fitness)]
+
+        if self.mean is None:
+            # first call - start from the best evaluated parameter set
+            self.start_run((self.best_x - self.lbounds) /
+                           (self.ubounds - self.lbounds),
+                           self.default_population_size, self.sigma0)
+        elif len(parameter_collection) != len(self.genotypes):
+            raise ValueError('CMAESOptimizer expects the {0} candidates it '
+                             'proposed - got {1}'.format(
+                                 len(self.genotypes),
+                                 len(parameter_collection)))
+        else:
+            self.tell(fitness)
+            self.evaluations[self.regime] += len(parameter_collection)
+            if (self.restarts is not None and
+                    self.number_of_restarts < self.max_restarts and
+                    self.should_restart()):
+                self.restart()
+
+        return ParameterCollection(
+            self.ask(), columns=self.parameter_config.parameter_names)
+
+
+class EnsembleSampler(BaseOptimizer):
+    """
+    Affine-invariant ensemble MCMC sampler with the stretch move (Goodman &
+    Weare 2010, Foreman-Mackey et al. 2013). The ensemble of
+    number_of_samples walkers is split into two halves; the walkers of one
+    half are moved using the positions of the other half, so every call
+    proposes (at most) number_of_samples / 2 parameter sets that are
+    evaluated as one batch.
+
+    The prior is uniform within the parameter bounds - proposals outside
+    are rejected without being evaluated. The log likelihood is derived
+    from the fitness with the fitness function's `log_likelihood` divided
+    by temperature. Proposals carry the columns 'dalek.walker', 'dalek.step'
+    and 'dalek.log_likelihood_threshold' (the log likelihood a proposal
+    needs to be accepted); evaluated rows are annotated with their
+    'dalek.log_likelihood' and whether they were 'dalek.accepted', so the
+    chains can be rebuilt from the fitter log alone with `ensemble_chains`.
+
+    Parameters
+    ----------
+
+    parameter_conf: ~dalek.fitter.ParameterConfiguration
+
+    number_of_samples: ~int
+        number of walkers (even)
+
+    a: ~float
+        scale parameter of the stretch move [default=2.]
+
+    fitness_function: ~dalek.fitter.BaseFitnessFunction
+        provides `log_likelihood` [default=None - log likelihood
+        -fitness / 2]
+
+    temperature: ~float
+        [default=1.]
+
+    seed: ~int
+        seed of the sampler's random state [default=None]
+    """
+
+    requires_fitness_function = True
+    accepts_migrants = False
+
+    def __init__(self, parameter_conf, number_of_samples, a=2.,
+                 fitness_function=None, temperature=1., seed=None):
+        if number_of_samples < 4 or number_of_samples % 2 != 0:
+            raise ValueError('The ensemble sampler needs an even number of at '
+                             'least 4 walkers - got {0}'.format(
+                number_of_samples))
+        self.parameter_config = parameter_conf
+        self.n = number_of_samples
+        self.dim = len(self.parameter_config.parameter_names)
+        self.lbounds = np.array(self.parameter_config.lbounds, dtype=np.float64)
+        self.ubounds = np.array(self.parameter_config.ubounds, dtype=np.float64)
+        self.a = a
+        self.fitness_function = fitness_function
+        self.temperature = temperature
+        self.random_state = np.random.RandomState(seed)
+
+        self.positions = None
+        self.log_probability = None
+        self.half = 0
+        self.step = 0
+        self.thresholds = np.empty(self.n) * np.nan
+        self.proposals = np.empty((self.n, self.dim)) * np.nan
+        self.accepted = np.zeros(self.n, dtype=np.int64)
+        self.proposed = np.zeros(self.n, dtype=np.int64)
+
+    def get_state(self):
+        state = super(EnsembleSampler, self).get_state()
+        state.pop('fitness_function')
+        return state
+
+    def log_likelihood(self, fitness):
+        fitness = np.array(fitness, dtype=np.float64)
+        if self.fitness_function is not None:
+            log_likelihood = self.fitness_function.log_likelihood(fitness)
+        else:
+            log_likelihood = -0.5 * fitness
+        log_likelihood = np.asarray(log_likelihood, dtype=np.float64) / \
+            self.temperature
+        log_likelihood[~np.isfinite(log_likelihood)] = -np.inf
+        return log_likelihood
+
+    @property
+    def acceptance_fraction(self):
+        return self.accepted / np.maximum(self.proposed, 1).astype(np.float64)
+
+    def propose(self):
+        """
+        Stretch move proposals for the walkers of the current half
+
+        Returns
+        -------
+            : ~np.ndarray, ~np.ndarray
+            indices of the walkers and their proposals
+        """
+        walkers = np.arange(self.half, self.n, 2)
+        complement = np.arange(1 - self.half, self.n, 2)
+        partners = complement[self.random_state.randint(len(complement),
+                                                        size=len(walkers))]
+        z = ((self.a - 1) * self.random_state.uniform(size=len(walkers)) +
+             1) ** 2 / self.a
+        proposals = (self.positions[partners] +
+                     z[:, None] * (self.positions[walkers] -
+                                   self.positions[partners]))
+        self.proposals[walkers] = proposals
+        self.thresholds[walkers] = (
+            np.log(self.random_state.uniform(size=len(walkers))) +
+            self.log_probability[walkers] - (self.dim - 1) * np.log(z))
+        self.proposed[walkers] += 1
+        return walkers, proposals
+
+    def finish_half_step(self):
+        self.half = 1 - self.half
+        if self.half == 0:
+            self.step += 1
+
+    def acceptance(self, parameter_collection):
+        """
+        Log likelihood of evaluated proposals and whether they are accepted
+
+        Returns
+        -------
+            : ~np.ndarray, ~np.ndarray, ~np.ndarray
+            walkers, log likelihood and accepted
+        """
+        walkers = parameter_collection['dalek.walker'].values.astype(np.int64)
+        log_likelihood = self.log_likelihood(
+            parameter_collection['dalek.fitness'].values)
+        return walkers, log_likelihood, (log_likelihood >
+                                         self.thresholds[walkers])
+
+    def annotate(self, parameter_collection):
+        parameter_collection = parameter_collection.copy()
+        if self.positions is None:
+            # the initial ensemble
+            parameter_collection['dalek.log_likelihood'] = self.log_likelihood(
+                parameter_collection['dalek.fitness'].values)
+            parameter_collection['dalek.accepted'] = True
+        else:
+            _, log_likelihood, accepted = self.acceptance(parameter_collection)
+            parameter_collection['dalek.log_likelihood'] = log_likelihood
+            parameter_collection['dalek.accepted'] = accepted
+        return parameter_collection
+
+    def update_walkers(self, parameter_collection):
+        walkers, log_likelihood, accepted = self.acceptance(
+            parameter_collection)
+        self.positions[walkers[accepted]] = self.proposals[walkers[accepted]]
+        self.log_probability[walkers[accepted]] = log_likelihood[accepted]
+        self.accepted[walkers[accepted]] += 1
+
+    def resume_from_log(self, resume_log):
+        """
+        Restore the walkers from the accepted rows of the log. The proposals
+        of the last logged iteration are handed to the sampler again by the
+        resumed fit, so they are restored as pending proposals (the chains
+        and acceptance counts only contain the proposals within the bounds)
+        """
+        if 'dalek.walker' not in resume_log.columns:
+            return
+        iteration = resume_log['dalek.current_iteration'].values
+        last_iteration = iteration == iteration.max()
+        walker, proposals = logged_walkers(resume_log)
+        if not proposals[last_iteration].any():
+            # only the initial ensemble was logged
+            return
+
+        parameters = resume_log[self.parameter_config.parameter_names].values
+        parameters = np.array(parameters, dtype=np.float64)
+        log_likelihood = self.log_likelihood(
+            resume_log['dalek.fitness'].values)
+        initial = (walker < 0) & (iteration == iteration.min())
+        self.positions = parameters[initial].copy()
+        self.log_probability = log_likelihood[initial].copy()
+
+        accepted = (resume_log['dalek.accepted'].values.astype(bool) &
+                    proposals & ~last_iteration)
+        # rows are in the order they were accepted
+        self.positions[walker[accepted]] = parameters[accepted]
+        self.log_probability[walker[accepted]] = log_likelihood[accepted]
+        self.accepted = np.bincount(walker[accepted],
+                                    minlength=self.n).astype(np.int64)
+        self.proposed = np.bincount(walker[proposals],
+                                    minlength=self.n).astype(np.int64)
+
+        pending = last_iteration & proposals
+        self.proposals[walker[pending]] = parameters[pending]
+        self.thresholds[walker[pending]] = resume_log[
+            'dalek.log_likelihood_threshold'].values[pending]
+        self.half = walker[pending][0] % 2
+        self.step = int(resume_log['dalek.step'].values[pending][0])
+
+    def __call__(self, parameter_collection):
+        fitness, split_param_collection = self.split_parameter_collection(
+            parameter_collection)
+        if self.positions is None:
+            if len(parameter_collection) != self.n:
+                raise ValueError('The initial ensemble needs {0} walkers - got '
+                                 '{1}'.format(self.n, len(parameter_collection)))
+            self.positions = np.array(split_param_collection.values,
+                                      dtype=np.float64)
+            self.log_probability = self.log_likelihood(fitness.values)
+        else:
+            self.update_walkers(parameter_collection)
+            self.finish_half_step()
+
+        while True:
+            walkers, proposals = self.propose()
+            in_bounds = np.all((proposals >= self.lbounds) &
+                               (proposals <= self.ubounds), axis=1)
+            if in_bounds.any():
+                break
+            self.finish_half_step()
+
+        new_parameter_collection = ParameterCollection(
+            proposals[in_bounds], columns=self.parameter_config.parameter_names)
+        new_parameter_collection['dalek.walker'] = walkers[in_bounds]
+        new_parameter_collection['dalek.step'] = self.step
+        new_parameter_collection['dalek.log_likelihood_threshold'] = \
+            self.thresholds[walkers[in_bounds]]
+        return new_parameter_collection
+
+
+class IslandModel(BaseOptimizer):
+    """
+    Island model: number_of_islands independent sub-populations, each run by
+    its own instance of a registered optimizer. Every
+    migration_interval iterations of an island its number_of_migrants best
+    parameter sets migrate to the next island ('ring') or to all other
+    islands ('all'), where they replace the worst evaluated rows before the
+    receiving island's optimizer sees them.
+
+    The rows of an island carry its id in the 'dalek.island' column. The
+    `~dalek.fitter.BaseFitter` runs every island on its own group of engines
+    (see `~dalek.parallel.backends.BaseBackend.engine_groups`) at its own
+    pace; called as a whole (`__call__`) all islands advance together.
+
+    Parameters
+    ----------
+
+    parameter_conf: ~dalek.fitter.ParameterConfiguration
+
+    number_of_samples: ~int
+        number of samples of all islands - split evenly between the islands
+
+    optimizer: ~dict
+        'name' of the island optimizer in `optimizer_dict` and its keyword
+        arguments
+
+    number_of_islands: ~int
+        [default=4]
+
+    migration_interval: ~int
+        [default=5]
+
+    number_of_migrants: ~int
+        [default=1]
+
+    topology: ~str
+        'ring' or 'all' [default='ring']
+
+    seed: ~int
+        island i gets the seed seed + i [default=None]
+    """
+
+    def __init__(self, parameter_conf, number_of_samples, optimizer,
+                 number_of_islands=4, migration_interval=5,
+                 number_of_migrants=1, topology='ring', seed=None):
+        if topology not in ('ring', 'all'):
+            raise ValueError('Unknown topology {0} - allowed are ring and '
+                             'all'.format(topology))
+        if number_of_samples < number_of_islands:
+            raise ValueError('{0} samples can not be split into {1} '
+                             'islands'.format(number_of_samples,
+                                              number_of_islands))
+        self.parameter_config = parameter_conf
+        self.number_of_islands = number_of_islands
+        self.migration_interval = migration_interval
+        self.number_of_migrants = number_of_migrants
+        self.topology = topology
+
+        optimizer_kwargs = dict(optimizer)
+        optimizer_class = optimizer_dict[optimizer_kwargs.pop('name')]
+        if not optimizer_class.accepts_migrants:
+            raise ValueError('{0} can not be used on islands'.format(
+                optimizer_class.__name__))
+        self.island_sizes = [len(island_indices) for island_indices in
+                             np.array_split(np.arange(number_of_samples),
+                                            number_of_islands)]
+        self.islands = []
+        for island_id, island_size in enumerate(self.island_sizes):
+            if seed is not None:
+                optimizer_kwargs['seed'] = seed + island_id
+            self.islands.append(optimizer_class(parameter_conf, island_size,
+                                                **optimizer_kwargs))
+
+        self.iterations = [0] * number_of_islands
+        self.best_fitness = [np.inf] * number_of_islands
+        # (parameters, fitness) waiting to be inserted into each island
+        self.migrants = [None] * number_of_islands
+
+    def get_state(self):
+        state = super(IslandModel, self).get_state()
+        state['islands'] = [island.get_state() for island in self.islands]
+        return state
+
+    def set_state(self, state):
+        state = dict(state)
+        for island, island_state in zip(self.islands, state.pop('islands')):
+            island.set_state(island_state)
+        super(IslandModel, self).set_state(state)
+
+    def split(self, parameter_collection):
+        """
+        Split a parameter collection into the islands - by the 'dalek.island'
+        column or, if it is missing, into consecutive blocks of the island
+        sizes
+
+        Returns
+        -------
+            : ~list of ~dalek.parallel.ParameterCollection
+        """
+        if 'dalek.island' in parameter_collection.columns:
+            island_ids = parameter_collection['dalek.island'].values
+        else:
+            island_ids = np.repeat(np.arange(self.number_of_islands),
+                                   self.island_sizes)[
+                         :len(parameter_collection)]
+        island_collections = []
+        for island_id in xrange(self.number_of_islands):
+            island_collection = parameter_collection[
+                island_ids == island_id].reset_index(drop=True)
+            island_collection['dalek.island'] = island_id
+            island_collections.append(island_collection)
+        return island_collections
+
+    def insert_migrants(self, island_id, parameter_collection):
+        """
+        Replace the worst rows of an evaluated island parameter collection by
+        the waiting migrants
+        """
+        if self.migrants[island_id] is None:
+            return parameter_collection
+        parameters, fitness = self.migrants[island_id]
+        self.migrants[island_id] = None
+        number_of_migrants = min(len(fitness), len(parameter_collection) - 1)
+        if number_of_migrants < 1:
+            return parameter_collection
+
+        island_fitness = np.array(parameter_collection['dalek.fitness'].values,
+                                  dtype=np.float64)
+        island_fitness[np.isnan(island_fitness)] = np.inf
+        worst = np.argsort(island_fitness, kind='mergesort')[::-1][
+                :number_of_migrants]
+        best_migrants = np.argsort(fitness, kind='mergesort')[
+                        :number_of_migrants]
+        parameter_collection = parameter_collection.copy()
+        parameter_names = self.parameter_config.parameter_names
+        for row, migrant in zip(worst, best_migrants):
+            parameter_collection.loc[row, parameter_names] = parameters[migrant]
+            parameter_collection.loc[row, 'dalek.fitness'] = fitness[migrant]
+        logger.debug('{0} migrants arrived on island {1}'.format(
+            number_of_migrants, island_id))
+        return parameter_collection
+
+    def emigrate(self, island_id, parameter_collection):
+        fitness = np.array(parameter_collection['dalek.fitness'].values,
+                           dtype=np.float64)
+        fitness[np.isnan(fitness)] = np.inf
+        best = np.argsort(fitness, kind='mergesort')[:self.number_of_migrants]
+        best = best[np.isfinite(fitness[best])]
+        if len(best) == 0:
+            return
+        emigrants = (parameter_collection[
+                         self.parameter_config.parameter_names].values[best],
+                     fitness[best])
+        if self.topology == 'ring':
+            targets = [(island_id + 1) % self.number_of_islands]
+        else:
+            targets = range(self.number_of_islands)
+        for target in targets:
+            if target == island_id:
+                continue
+            if self.migrants[target] is None:
+                self.migrants[target] = emigrants
+            else:
+                self.migrants[target] = (
+                    np.vstack((self.migrants[target][0], emigrants[0])),
+                    np.concatenate((self.migrants[target][1], emigrants[1])))
+
+    def update_island(self, island_id, parameter_collection):
+        """
+        Advance a single island by one iteration
+
+        Parameters
+        ----------
+
+        island_id: ~int
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+            the evaluated parameter sets of the island
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+            the next parameter sets of the island
+        """
+        parameter_collection = self.insert_migrants(
+            island_id, parameter_collection.reset_index(drop=True))
+        fitness = np.array(parameter_collection['dalek.fitness'].values,
+                           dtype=np.float64)
+        if np.isfinite(fitness).any():
+            self.best_fitness[island_id] = min(self.best_fitness[island_id],
+                                               np.nanmin(fitness))
+
+        self.iterations[island_id] += 1
+        if self.iterations[island_id] % self.migration_interval == 0:
+            self.emigrate(island_id, parameter_collection)
+
+        new_parameter_collection = self.islands[island_id](
+            parameter_collection)
+        new_parameter_collection['dalek.island'] = island_id
+        return new_parameter_collection
+
+    def __call__(self, parameter_collection):
+        return ParameterCollection(pd.concat(
+            [self.update_island(island_id, island_collection)
+             for island_id, island_collection in
+             enumerate(self.split(parameter_collection))], ignore_index=True))
+
+
+def logged_walkers(parameter_collection):
+    """
+    Walkers of the rows of an `EnsembleSampler` fitter log. A resumed fit
+    evaluates the proposals of its last logged iteration again - only the
+    last evaluation of a proposal counts.
+
+    Returns
+    -------
+        : ~np.ndarray, ~np.ndarray
+        walker of every row (-1 for the initial ensemble) and whether the row
+        is the last evaluation of a proposal
+    """
+    walker = parameter_collection['dalek.walker'].values
+    walker = np.where(np.isfinite(walker), walker, -1).astype(np.int64)
+    latest = ~pd.DataFrame(
+        {'step': parameter_collection['dalek.step'].values,
+         'walker': walker}).duplicated(keep='last').values
+    return walker, (walker >= 0) & latest
+
+
+def ensemble_chains(parameter_collection, parameter_names):
+    """
+    Rebuild the chains of an `EnsembleSampler` run from its fitter log - the
+    rows of the first iteration are the initial ensemble, the proposals
+    carry their walker, step and whether they were accepted
+
+    Parameters
+    ----------
+
+    parameter_collection: ~dalek.parallel.ParameterCollection
+        fitter log
+
+    parameter_names: ~list of ~str
+
+    Returns
+    -------
+        : ~np.ndarray
+        positions of the walkers after every step (step, walker, parameter)
+    """
+    walker, proposals = logged_walkers(parameter_collection)
+    parameters = parameter_collection[parameter_names].values.astype(
+        np.float64)
+
+    iteration = parameter_collection['dalek.current_iteration'].values
+    initial = (walker < 0) & (iteration == iteration.min())
+    positions = parameters[initial].copy()
+
+    step = parameter_collection['dalek.step'].values[proposals]
+    walker = walker[proposals]
+    parameters = parameters[proposals]
+    accepted = parameter_collection['dalek.accepted'].values[
+        proposals].astype(bool)
+
+    chains = []
+    for current_step in np.unique(step):
+        in_step = step == current_step
+        positions[walker[in_step & accepted]] = parameters[in_step & accepted]
+        chains.append(positions.copy())
+    return np.array(chains)
+
 
 optimizer_dict = {'random_sampling': RandomSampling,
                   'luus_jaakola': LuusJaakolaOptimizer,
                   'devolution': DEOptimizer,
-                  'pso': PSOOptimizerGbest}
+                  'pso': PSOOptimizer,
+                  'cmaes': CMAESOptimizer,
+                  'ensemble_sampler': EnsembleSampler,
+                  'noise_measurement': NoiseMeasurement,
+                  'island_model': IslandModel}
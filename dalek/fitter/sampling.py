@@ -0,0 +1,492 @@
+from abc import ABCMeta, abstractmethod
+import logging
+
+import numpy as np
+
+from dalek.parallel import ParameterCollection
+
+logger = logging.getLogger(__name__)
+
+# number of bits of the Sobol' points
+SOBOL_BITS = 32
+
+# primitive polynomial degree s, its coefficients a and the initial direction
+# numbers m of the Sobol' dimensions 2 - 50 (Joe & Kuo 2008, new-joe-kuo-6)
+sobol_initial_numbers = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+    (7, 7, [1, 1, 3, 13, 7, 35, 63]),
+    (7, 8, [1, 3, 5, 9, 1, 25, 53]),
+    (7, 14, [1, 3, 1, 13, 9, 35, 107]),
+    (7, 19, [1, 3, 1, 5, 27, 61, 31]),
+    (7, 21, [1, 1, 5, 11, 19, 41, 61]),
+    (7, 28, [1, 3, 5, 3, 3, 13, 69]),
+    (7, 31, [1, 1, 7, 13, 1, 19, 1]),
+    (7, 32, [1, 3, 7, 5, 13, 19, 59]),
+    (7, 37, [1, 1, 3, 9, 25, 29, 41]),
+    (7, 41, [1, 3, 5, 13, 23, 1, 55]),
+    (7, 42, [1, 3, 7, 3, 13, 59, 17]),
+    (7, 50, [1, 3, 1, 3, 5, 53, 69]),
+    (7, 55, [1, 1, 5, 5, 23, 33, 13]),
+    (7, 56, [1, 1, 7, 7, 1, 61, 123]),
+    (7, 59, [1, 1, 7, 9, 13, 61, 49]),
+    (7, 62, [1, 3, 3, 5, 3, 55, 33]),
+    (8, 14, [1, 3, 1, 15, 31, 13, 49, 245]),
+    (8, 21, [1, 3, 5, 15, 31, 59, 63, 97]),
+    (8, 22, [1, 3, 1, 11, 11, 11, 77, 249]),
+    (8, 38, [1, 3, 1, 11, 27, 43, 71, 9]),
+    (8, 47, [1, 1, 7, 15, 21, 11, 81, 45]),
+    (8, 49, [1, 3, 7, 3, 25, 31, 65, 79]),
+    (8, 50, [1, 3, 1, 1, 19, 11, 3, 205]),
+    (8, 52, [1, 1, 5, 9, 19, 21, 29, 157]),
+    (8, 56, [1, 3, 7, 11, 1, 33, 89, 185]),
+    (8, 67, [1, 3, 3, 3, 15, 9, 79, 71]),
+    (8, 70, [1, 3, 7, 11, 15, 39, 119, 27]),
+    (8, 84, [1, 1, 3, 1, 11, 31, 97, 225]),
+    (8, 97, [1, 1, 1, 3, 23, 43, 57, 177])]
+
+
+def splitmix64(x):
+    """
+    Counter based pseudo-random 64 bit integers (the SplitMix64 finalizer)
+    - the same input always gives the same output, which makes designs
+    reproducible point by point
+
+    Parameters
+    ----------
+
+    x: ~np.ndarray of ~np.uint64
+
+    Returns
+    -------
+        : ~np.ndarray of ~np.uint64
+    """
+    with np.errstate(over='ignore'):
+        z = np.asarray(x, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def counter_uniform(key, counter):
+    """
+    Uniform random numbers in [0, 1) for an array of counters
+    """
+    bits = splitmix64(splitmix64(np.uint64(key)) ^
+                      np.asarray(counter, dtype=np.uint64))
+    return (bits >> np.uint64(11)).astype(np.float64) / 2. ** 53
+
+
+def random_permutation(indices, size, key, rounds=4):
+    """
+    Image of indices under a pseudo-random permutation of range(size) - a
+    Feistel network with cycle walking, so single elements of permutations
+    with billions of elements can be computed without storing them
+
+    Parameters
+    ----------
+
+    indices: ~np.ndarray
+
+    size: ~int
+
+    key: ~int
+
+    Returns
+    -------
+        : ~np.ndarray of ~np.int64
+    """
+    half_bits = max(1, int(np.ceil(np.log2(max(size, 2)) / 2.)))
+    mask = np.uint64((1 << half_bits) - 1)
+    round_keys = splitmix64(np.arange(rounds, dtype=np.uint64) +
+                            np.uint64(key * rounds))
+
+    def feistel(values):
+        left = values >> np.uint64(half_bits)
+        right = values & mask
+        for round_key in round_keys:
+            left, right = right, left ^ (splitmix64(right ^ round_key) & mask)
+        return (left << np.uint64(half_bits)) | right
+
+    values = feistel(np.asarray(indices, dtype=np.uint64))
+    outside = values >= np.uint64(size)
+    while outside.any():
+        values[outside] = feistel(values[outside])
+        outside = values >= np.uint64(size)
+    return values.astype(np.int64)
+
+
+def is_primitive_polynomial(polynomial, degree):
+    """
+    Test if the polynomial over GF(2) (bit i is the coefficient of x^i) is
+    primitive, i.e. x has order 2^degree - 1 modulo the polynomial
+    """
+    order = 2 ** degree - 1
+
+    def multiply_mod(a, b):
+        result = 0
+        while b:
+            if b & 1:
+                result ^= a
+            b >>= 1
+            a <<= 1
+            if a >> degree & 1:
+                a ^= polynomial
+        return result
+
+    def power_of_x(exponent):
+        result, base = 1, 2 % polynomial if degree > 1 else 1
+        while exponent:
+            if exponent & 1:
+                result = multiply_mod(result, base)
+            base = multiply_mod(base, base)
+            exponent >>= 1
+        return result
+
+    if power_of_x(order) != 1:
+        return False
+    prime_factors = [p for p in xrange(2, order + 1)
+                     if order % p == 0 and
+                     all([p % q for q in xrange(2, int(p ** 0.5) + 1)])]
+    return all([power_of_x(order // p) != 1 for p in prime_factors])
+
+
+def sobol_direction_numbers(dimensions):
+    """
+    Direction numbers (dimensions, SOBOL_BITS) of the Sobol' sequence.
+    Beyond the tabulated dimensions the primitive polynomials are generated
+    in order of degree with pseudo-random odd initial direction numbers.
+    """
+    parameters = list(sobol_initial_numbers)
+    random_state = np.random.RandomState(1)
+    degree = parameters[-1][0]
+    a = parameters[-1][1] + 1
+    while len(parameters) < dimensions - 1:
+        if a >= 2 ** (degree - 1):
+            degree += 1
+            a = 0
+        if is_primitive_polynomial((1 << degree) | (a << 1) | 1, degree):
+            parameters.append((degree, a, [2 * random_state.randint(2 ** k) + 1
+                                           for k in xrange(degree)]))
+        a += 1
+
+    directions = np.empty((dimensions, SOBOL_BITS), dtype=np.uint64)
+    directions[0] = [1 << (SOBOL_BITS - 1 - k) for k in xrange(SOBOL_BITS)]
+    for dimension in xrange(1, dimensions):
+        degree, a, m = parameters[dimension - 1]
+        v = [m[k] << (SOBOL_BITS - 1 - k) for k in xrange(min(degree,
+                                                               SOBOL_BITS))]
+        for k in xrange(degree, SOBOL_BITS):
+            value = v[k - degree] ^ (v[k - degree] >> degree)
+            for i in xrange(1, degree):
+                if (a >> (degree - 1 - i)) & 1:
+                    value ^= v[k - i]
+            v.append(value)
+        directions[dimension] = v
+    return directions
+
+
+class BaseSampler(object):
+    """
+    Design of points within the bounds of a `ParameterConfiguration`. Every
+    point of the design is computed from its index alone, so the design can
+    be streamed in chunks of any size and split into shards - contiguous
+    blocks of the design - for separate runs.
+
+    Parameters
+    ----------
+
+    parameter_config: ~dalek.fitter.ParameterConfiguration
+
+    number_of_points: ~int
+        size of the whole design [default=None - unlimited, not possible for
+        all designs]
+
+    seed: ~int
+        seed of the randomization - runs with the same seed produce the same
+        design [default=0]
+
+    shard_index: ~int
+        which shard of the design this sampler generates [default=0]
+
+    number_of_shards: ~int
+        [default=1]
+    """
+    __metaclass__ = ABCMeta
+
+    requires_number_of_points = False
+
+    def __init__(self, parameter_config, number_of_points=None, seed=0,
+                 shard_index=0, number_of_shards=1):
+        self.parameter_config = parameter_config
+        self.dim = len(parameter_config.parameter_names)
+        self.lbounds = np.array(parameter_config.lbounds, dtype=np.float64)
+        self.ubounds = np.array(parameter_config.ubounds, dtype=np.float64)
+        self.number_of_points = number_of_points
+        self.seed = seed if seed is not None else 0
+
+        if number_of_points is None:
+            if self.requires_number_of_points:
+                raise ValueError('{0} needs number_of_points'.format(
+                    self.__class__.__name__))
+            if number_of_shards != 1:
+                raise ValueError('Sharding a design needs number_of_points')
+            self.start, self.stop = 0, None
+        else:
+            if not 0 <= shard_index < number_of_shards:
+                raise ValueError('shard_index has to be in [0, {0})'.format(
+                    number_of_shards))
+            self.start = shard_index * number_of_points // number_of_shards
+            self.stop = ((shard_index + 1) * number_of_points //
+                         number_of_shards)
+        self.position = self.start
+
+    def __len__(self):
+        if self.stop is None:
+            raise TypeError('Unlimited design')
+        return self.stop - self.start
+
+    @abstractmethod
+    def unit_points(self, indices):
+        """
+        Points of the design in the unit cube
+
+        Parameters
+        ----------
+
+        indices: ~np.ndarray
+            indices of the points in the whole design
+
+        Returns
+        -------
+            : ~np.ndarray (len(indices), number of parameters)
+        """
+        raise NotImplementedError
+
+    def points(self, start, stop):
+        """
+        Points with design indices start to stop within the parameter bounds
+        """
+        unit_points = self.unit_points(np.arange(start, stop, dtype=np.int64))
+        return self.lbounds + unit_points * (self.ubounds - self.lbounds)
+
+    def generate(self, number_of_samples):
+        """
+        The next number_of_samples points of the shard - fewer (or none) at
+        the end of the design
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+        """
+        stop = self.position + number_of_samples
+        if self.stop is not None:
+            stop = min(stop, self.stop)
+        points = self.points(self.position, max(stop, self.position))
+        self.position = max(stop, self.position)
+        return ParameterCollection(
+            points, columns=self.parameter_config.parameter_names)
+
+    def chunks(self, chunk_size):
+        """
+        Iterate over the remaining points of the shard in chunks
+        """
+        while self.stop is None or self.position < self.stop:
+            yield self.generate(chunk_size)
+
+
+class UniformSampler(BaseSampler):
+    """
+    Independent uniformly distributed points
+    """
+
+    def unit_points(self, indices):
+        counters = (np.asarray(indices, dtype=np.uint64)[:, None] *
+                    np.uint64(self.dim) +
+                    np.arange(self.dim, dtype=np.uint64)[None, :])
+        return counter_uniform(self.seed, counters)
+
+
+class SobolSampler(BaseSampler):
+    """
+    Scrambled Sobol' sequence (random linear matrix scrambling and a digital
+    shift). Blocks of 2^k consecutive points starting at a multiple of 2^k
+    are evenly spread, so chunk and shard sizes that are powers of two are
+    best.
+
+    Parameters
+    ----------
+
+    scramble: ~bool
+        [default=True]
+    """
+
+    def __init__(self, parameter_config, number_of_points=None, seed=0,
+                 shard_index=0, number_of_shards=1, scramble=True):
+        super(SobolSampler, self).__init__(
+            parameter_config, number_of_points=number_of_points, seed=seed,
+            shard_index=shard_index, number_of_shards=number_of_shards)
+        self.directions = sobol_direction_numbers(self.dim)
+        self.shift = np.zeros(self.dim, dtype=np.uint64)
+        if scramble:
+            self.scramble()
+
+    def scramble(self):
+        random_state = np.random.RandomState(self.seed)
+        for dimension in xrange(self.dim):
+            # lower triangular matrix with unit diagonal acting on the bits
+            # (most significant first)
+            matrix = np.tril(random_state.randint(
+                2, size=(SOBOL_BITS, SOBOL_BITS)), -1) + np.eye(
+                SOBOL_BITS, dtype=np.int64)
+            bits = (self.directions[dimension][:, None] >>
+                    np.arange(SOBOL_BITS - 1, -1, -1,
+                              dtype=np.uint64)[None, :]) & np.uint64(1)
+            scrambled_bits = np.dot(bits.astype(np.int64), matrix.T) % 2
+            self.directions[dimension] = np.dot(
+                scrambled_bits, 2 ** np.arange(SOBOL_BITS - 1, -1, -1,
+                                               dtype=np.int64)).astype(
+                np.uint64)
+        self.shift = random_state.randint(
+            0, 2 ** SOBOL_BITS, size=self.dim).astype(np.uint64)
+
+    def unit_points(self, indices):
+        indices = np.asarray(indices, dtype=np.uint64)
+        if len(indices) > 1 and np.all(np.diff(indices.astype(np.int64)) == 1):
+            return self.contiguous_unit_points(indices)
+        return self.gray_code_unit_points(indices)
+
+    def contiguous_unit_points(self, indices):
+        """
+        Consecutive points - each point differs from the previous one by the
+        direction number of the lowest set bit of its index
+        """
+        values = np.empty((len(indices), self.dim), dtype=np.uint64)
+        values[0] = (self.gray_code_unit_points(indices[:1])[0] *
+                     2. ** SOBOL_BITS).astype(np.uint64)
+        following = indices[1:].astype(np.int64)
+        lowest_bit = np.log2(following & -following).astype(np.int64)
+        values[1:] = self.directions.T[lowest_bit]
+        np.bitwise_xor.accumulate(values, axis=0, out=values)
+        return values.astype(np.float64) / 2. ** SOBOL_BITS
+
+    def gray_code_unit_points(self, indices):
+        gray_code = indices ^ (indices >> np.uint64(1))
+        values = np.tile(self.shift, (len(indices), 1))
+        for bit in xrange(SOBOL_BITS):
+            if not (gray_code >> np.uint64(bit)).any():
+                break
+            # all ones where the bit of the gray code is set
+            mask = np.uint64(0) - ((gray_code >> np.uint64(bit)) &
+                                   np.uint64(1))
+            values ^= mask[:, None] & self.directions[:, bit][None, :]
+        return values.astype(np.float64) / 2. ** SOBOL_BITS
+
+
+class LatinHypercubeSampler(BaseSampler):
+    """
+    Latin hypercube design - every parameter range is split into
+    number_of_points strata and every stratum holds exactly one point. The
+    strata are assigned by pseudo-random permutations that are computed per
+    point, so the design never has to be held in memory.
+    """
+
+    requires_number_of_points = True
+
+    def unit_points(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        unit_points = np.empty((len(indices), self.dim))
+        for dimension in xrange(self.dim):
+            key = self.seed * 1000003 + dimension
+            strata = random_permutation(indices, self.number_of_points, key)
+            jitter = counter_uniform(key, indices)
+            unit_points[:, dimension] = ((strata + jitter) /
+                                         float(self.number_of_points))
+        return unit_points
+
+
+class MaximinSampler(LatinHypercubeSampler):
+    """
+    Latin hypercube design optimized for the largest minimal distance
+    between points: starting from a random Latin hypercube, one point of the
+    closest pair swaps a coordinate with a random other point whenever that
+    increases their minimal distance (this keeps the Latin hypercube
+    property). The whole design is built at once - it is meant for initial
+    populations rather than huge designs.
+
+    Parameters
+    ----------
+
+    iterations: ~int
+        number of attempted swaps [default=1000]
+
+    max_points: ~int
+        largest allowed design [default=10000]
+    """
+
+    def __init__(self, parameter_config, number_of_points=None, seed=0,
+                 shard_index=0, number_of_shards=1, iterations=1000,
+                 max_points=10000):
+        super(MaximinSampler, self).__init__(
+            parameter_config, number_of_points=number_of_points, seed=seed,
+            shard_index=shard_index, number_of_shards=number_of_shards)
+        if number_of_points > max_points:
+            raise ValueError('Maximin designs are limited to {0} points - use '
+                             'a Sobol\' or Latin hypercube design'.format(
+                max_points))
+        self.design = self.optimize(
+            super(MaximinSampler, self).unit_points(
+                np.arange(number_of_points)), iterations)
+
+    def optimize(self, design, iterations):
+        random_state = np.random.RandomState(self.seed)
+        squared_distances = np.sum((design[:, None, :] -
+                                    design[None, :, :]) ** 2, axis=-1)
+        np.fill_diagonal(squared_distances, np.inf)
+        for _ in xrange(iterations):
+            closest = np.argmin(squared_distances)
+            point = closest // len(design)
+            other = random_state.randint(len(design))
+            if other == point:
+                continue
+            dimension = random_state.randint(self.dim)
+            new_points = design[[point, other]].copy()
+            new_points[:, dimension] = new_points[::-1, dimension]
+            new_distances = np.sum((new_points[:, None, :] -
+                                    design[None, :, :]) ** 2, axis=-1)
+            new_distances[0, [point, other]] = [
+                np.inf, np.sum((new_points[0] - new_points[1]) ** 2)]
+            new_distances[1, [point, other]] = [
+                new_distances[0, other], np.inf]
+            if new_distances.min() > squared_distances[point].min():
+                design[[point, other]] = new_points
+                squared_distances[[point, other]] = new_distances
+                squared_distances[:, [point, other]] = new_distances.T
+        return design
+
+    def unit_points(self, indices):
+        return self.design[np.asarray(indices, dtype=np.int64)]
+
+
+sampler_dict = {'uniform': UniformSampler,
+                'sobol': SobolSampler,
+                'lhs': LatinHypercubeSampler,
+                'maximin': MaximinSampler}
@@ -0,0 +1,369 @@
+import logging
+import os
+
+import h5py
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SpectralStore(object):
+    """
+    Spectral store to store the generated spectra in an HDF5 file
+
+    All spectra are kept in one extendable, chunked and compressed
+    (n_spectra, n_wavelength) dataset 'flux'. The common wavelength grid is
+    stored once in 'wavelength', 'log_index' holds for every row of 'flux'
+    the index of the corresponding row in the fitter log and 'fitness' its
+    fitness.
+
+    Parameters
+    ----------
+
+    h5_fname: ~str
+        path to HDF5 file to store it in
+
+    spectral_store_name: ~str
+        string for path in h5py [default='spectral_store']
+
+    mode: ~str
+        which spectra to keep:
+
+        'all' - every spectrum
+        'best_k' - the k spectra with the lowest fitness of the whole fit;
+            spectra that drop out of the top k are overwritten
+        'best_per_iteration' - the spectrum with the lowest fitness of each
+            iteration
+        'thin' - every `thin_every`-th spectrum (by fitter log index)
+
+    k: ~int
+        number of spectra to keep in mode 'best_k'
+
+    thin_every: ~int
+        thinning factor for mode 'thin'
+
+    float32: ~bool
+        store the fluxes in single precision [default=False]
+
+    compression: ~str
+        HDF5 compression filter for the fluxes [default='gzip']
+
+    read_only: ~bool
+        open an existing store for reading only [default=False]
+
+    """
+
+    def __init__(self, h5_fname, spectral_store_name='spectral_store',
+                 mode='all', clobber=False, resume=False, float32=False,
+                 compression='gzip', read_only=False, k=None,
+                 thin_every=None):
+        self.h5_fname = h5_fname
+        self.spectral_store_name = spectral_store_name
+        self.mode = mode.strip().lower()
+        if self.mode not in retention_modes:
+            raise ValueError('Unknown spectral store mode {0} - allowed are '
+                             '{1}'.format(self.mode, retention_modes))
+        if self.mode == 'best_k' and k is None:
+            raise ValueError('Spectral store mode best_k requires k')
+        if self.mode == 'thin' and thin_every is None:
+            raise ValueError('Spectral store mode thin requires thin_every')
+        self.k = k
+        self.thin_every = thin_every
+        self.last_iteration = None
+        self.dtype = np.float32 if float32 else np.float64
+        self.compression = compression
+
+        if read_only:
+            self.h5_file_handle = h5py.File(h5_fname, mode='r')
+            return
+
+        if os.path.exists(h5_fname) and not (clobber or resume):
+            raise IOError('HDF5 spectral store {0} exists - '
+                          'will not overwrite'.format(h5_fname))
+        if resume:
+            self.h5_file_handle = h5py.File(h5_fname, mode='a')
+            # the best spectrum of the iteration that was running when the
+            # fit stopped may still be beaten
+            self.last_iteration = self.group.attrs.get('last_iteration')
+        else:
+            self.h5_file_handle = h5py.File(h5_fname, mode='w')
+
+    @property
+    def group(self):
+        return self.h5_file_handle.require_group(self.spectral_store_name)
+
+    @property
+    def wavelength(self):
+        if 'wavelength' not in self.group:
+            return None
+        return self.group['wavelength'][()]
+
+    @property
+    def log_index(self):
+        if 'log_index' not in self.group:
+            return np.array([], dtype=np.int64)
+        return self.group['log_index'][()]
+
+    @property
+    def fitness(self):
+        if 'fitness' not in self.group:
+            return np.array([], dtype=np.float64)
+        return self.group['fitness'][()]
+
+    def __len__(self):
+        return len(self.log_index)
+
+    def _create_datasets(self, wavelength):
+        group = self.group
+        group['wavelength'] = wavelength
+        # aim for ~1 MB per chunk
+        chunk_rows = max(1, 2 ** 20 // (len(wavelength) *
+                                        np.dtype(self.dtype).itemsize))
+        group.create_dataset('flux', shape=(0, len(wavelength)),
+                             maxshape=(None, len(wavelength)),
+                             chunks=(chunk_rows, len(wavelength)),
+                             dtype=self.dtype, shuffle=True,
+                             compression=self.compression)
+        for name, dtype in [('log_index', np.int64), ('fitness', np.float64)]:
+            group.create_dataset(name, shape=(0,), maxshape=(None,),
+                                 chunks=(max(chunk_rows, 1024),), dtype=dtype)
+
+    def spectra_to_array(self, spectra, wavelength=None):
+        """
+        Convert a list of spectrum objects or flux arrays (on the given
+        wavelength grid or the grid of the store) to a wavelength grid and a
+        2-D array of fluxes
+        """
+        if wavelength is None:
+            wavelength = self.wavelength
+        for spectrum in spectra:
+            if hasattr(spectrum, 'wavelength'):
+                wavelength = spectrum.wavelength.value
+                break
+        fluxes = np.array([spectrum.flux_lambda.value
+                           if hasattr(spectrum, 'flux_lambda') else spectrum
+                           for spectrum in spectra])
+        return wavelength, fluxes
+
+    def store_spectrum(self, id, spectrum):
+        self.store_spectra([spectrum], [id])
+
+    def store_spectra(self, spectra, indices, parameter_collection=None,
+                      wavelength=None):
+        """
+        Append a batch of spectra to the store with a single write
+
+        Parameters
+        ----------
+
+        spectra: ~list of spectra or ~np.ndarray
+            list of spectrum objects or flux arrays or a 2-D array of fluxes.
+            Entries of the list that are None (no spectrum available) are
+            skipped.
+
+        indices: ~list of ~int
+            indices of the spectra in the fitter log
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+            evaluated parameter collection belonging to the spectra
+
+        wavelength: ~np.ndarray
+            wavelength grid of flux arrays (defaults to the grid of the store)
+        """
+        if len(indices) == 0:
+            return
+
+        indices = np.asarray(indices, dtype=np.int64)
+        available = np.array([spectrum is not None for spectrum in spectra],
+                             dtype=bool)
+        if not available.any():
+            return
+        if not available.all():
+            spectra = [spectrum for spectrum in spectra
+                       if spectrum is not None]
+            indices = indices[available]
+            if parameter_collection is not None:
+                parameter_collection = parameter_collection[available]
+        wavelength, fluxes = self.spectra_to_array(spectra, wavelength)
+        if wavelength is None:
+            raise ValueError('The wavelength grid of the flux arrays is '
+                             'unknown')
+
+        if parameter_collection is not None:
+            fitness = np.asarray(parameter_collection['dalek.fitness'].values,
+                                 dtype=np.float64)
+        elif self.mode in ('best_k', 'best_per_iteration'):
+            raise ValueError('Spectral store mode {0} needs the evaluated '
+                             'parameter collection'.format(self.mode))
+        else:
+            fitness = np.ones(len(indices)) * np.nan
+
+        if 'flux' not in self.group:
+            self._create_datasets(wavelength)
+
+        if self.mode == 'all':
+            selection = np.arange(len(indices))
+            rows = len(self) + selection
+        elif self.mode == 'thin':
+            selection = np.where(indices % self.thin_every == 0)[0]
+            rows = len(self) + np.arange(len(selection))
+        elif self.mode == 'best_k':
+            selection, rows = self.select_best_k(fitness)
+        elif self.mode == 'best_per_iteration':
+            selection, rows = self.select_best_per_iteration(
+                fitness, parameter_collection['dalek.current_iteration'].values)
+
+        self.write_rows(rows, fluxes[selection], indices[selection],
+                        fitness[selection])
+        if self.last_iteration is not None:
+            self.group.attrs['last_iteration'] = self.last_iteration
+
+        self.h5_file_handle.flush()
+
+    def select_best_k(self, fitness):
+        """
+        Select which of the new spectra enter the top k and the rows they
+        are written to (rows of evicted spectra are reused)
+        """
+        stored_fitness = self.fitness
+        stored_fitness[np.isnan(stored_fitness)] = np.inf
+        fitness = np.where(np.isnan(fitness), np.inf, fitness)
+
+        best = np.argsort(np.hstack((stored_fitness, fitness)),
+                          kind='mergesort')[:self.k]
+        selection = best[best >= len(stored_fitness)] - len(stored_fitness)
+
+        free_rows = np.hstack((
+            np.setdiff1d(np.arange(len(stored_fitness)), best),
+            np.arange(len(stored_fitness), self.k)))
+        return selection, free_rows[:len(selection)]
+
+    def select_best_per_iteration(self, fitness, iterations):
+        """
+        Select the best new spectrum of each iteration. If the last stored
+        spectrum belongs to the same iteration it is overwritten when beaten.
+        """
+        selection = []
+        rows = []
+        next_row = len(self)
+        for iteration in np.unique(iterations):
+            candidates = np.where(iterations == iteration)[0]
+            best = candidates[np.argmin(fitness[candidates])]
+            if iteration == self.last_iteration:
+                if fitness[best] < self.fitness[-1]:
+                    selection.append(best)
+                    rows.append(next_row - 1)
+            else:
+                selection.append(best)
+                rows.append(next_row)
+                next_row += 1
+            self.last_iteration = iteration
+        return (np.array(selection, dtype=np.int64),
+                np.array(rows, dtype=np.int64))
+
+    def write_rows(self, rows, fluxes, indices, fitness):
+        """
+        Write spectra into the given rows of the store (growing it if needed)
+        """
+        if len(rows) == 0:
+            return
+        group = self.group
+        new_length = max(len(self), rows.max() + 1)
+        if new_length > len(self):
+            group['flux'].resize((new_length, group['flux'].shape[1]))
+            group['log_index'].resize((new_length,))
+            group['fitness'].resize((new_length,))
+
+        order = np.argsort(rows)
+        rows = rows[order]
+        if rows[-1] - rows[0] + 1 == len(rows):
+            rows = slice(rows[0], rows[-1] + 1)
+        else:
+            rows = rows.tolist()
+        group['flux'][rows] = fluxes[order]
+        group['log_index'][rows] = indices[order]
+        group['fitness'][rows] = fitness[order]
+
+    def get_spectra(self, indices):
+        """
+        Read the fluxes for the given fitter log indices with a single read
+
+        Parameters
+        ----------
+
+        indices: ~list of ~int
+            indices of the spectra in the fitter log
+
+        Returns
+        -------
+            : ~np.ndarray
+            2-D array of fluxes (one row per requested index)
+        """
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        group = self.group
+
+        if 'flux' not in group:
+            # per-spectrum layout of older spectral stores
+            return np.array([group['spectrum{0:d}'.format(index)][()]
+                             for index in indices])
+
+        log_index = self.log_index
+        if len(log_index) == 0:
+            raise KeyError('The spectral store is empty')
+        sorter = np.argsort(log_index, kind='mergesort')
+        positions = np.searchsorted(log_index, indices, sorter=sorter)
+        positions = np.clip(positions, 0, len(log_index) - 1)
+        rows = sorter[positions]
+        if np.any(log_index[rows] != indices):
+            raise KeyError('Spectra for log indices {0} are not in the '
+                           'spectral store'.format(
+                               indices[log_index[rows] != indices]))
+
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        if unique_rows[-1] - unique_rows[0] + 1 == len(unique_rows):
+            fluxes = group['flux'][unique_rows[0]:unique_rows[-1] + 1]
+        else:
+            fluxes = group['flux'][unique_rows.tolist()]
+        return fluxes[inverse]
+
+    def rescore(self, fitness_function, indices=None, chunk_size=1024):
+        """
+        Fitness of stored spectra under another fitness function (e.g. a
+        different observed spectrum or flux uncertainty) with one vectorized
+        `~dalek.fitter.BaseFitnessFunction.evaluate_fluxes` call per chunk
+
+        Parameters
+        ----------
+
+        fitness_function: ~dalek.fitter.BaseFitnessFunction
+
+        indices: ~list of ~int
+            fitter log indices of the spectra [default=None - all spectra in
+            the order of `log_index`]
+
+        chunk_size: ~int
+            number of spectra read at once [default=1024]
+
+        Returns
+        -------
+            : ~np.ndarray
+            fitness of every requested spectrum
+        """
+        wavelength = self.wavelength
+        if wavelength is None:
+            raise KeyError('The spectral store is empty')
+        if indices is None:
+            indices = self.log_index
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        fitness = np.empty(len(indices))
+        for start in xrange(0, len(indices), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            fitness[chunk] = fitness_function.evaluate_fluxes(
+                wavelength, self.get_spectra(indices[chunk]))
+        return fitness
+
+    def close(self):
+        self.h5_file_handle.close()
+
+
+retention_modes = ['all', 'best_k', 'best_per_iteration', 'thin']
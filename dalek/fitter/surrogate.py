@@ -0,0 +1,322 @@
+import logging
+
+import numpy as np
+
+from dalek.fitter.optimizers import BaseOptimizer
+from dalek.parallel import ParameterCollection
+
+logger = logging.getLogger(__name__)
+
+
+class GaussianProcessSurrogate(object):
+    """
+    Gaussian-process regression of the fitness on the parameters with an
+    isotropic squared-exponential kernel in the unit cube spanned by the
+    parameter bounds.
+
+    Points are added incrementally. To keep fitting cheap for very long logs
+    the model is only trained on at most max_training_points points - half of
+    them the best points, the other half the most recently added ones - so
+    fitting costs O(max_training_points^3) independent of the log length.
+    The length scale is chosen from length_scales by the marginal likelihood.
+
+    Parameters
+    ----------
+
+    parameter_config: ~dalek.fitter.ParameterConfiguration
+
+    max_training_points: ~int
+        maximum number of points the model is trained on [default=500]
+
+    noise: ~float
+        variance of the noise relative to the variance of the fitness (the
+        Monte Carlo noise of TARDIS) [default=1e-4]
+
+    length_scales: ~list of ~float
+        candidate length scales in units of the diagonal of the unit cube
+        [default=(0.05, 0.1, 0.2, 0.4, 0.8)]
+    """
+
+    def __init__(self, parameter_config, max_training_points=500, noise=1e-4,
+                 length_scales=(0.05, 0.1, 0.2, 0.4, 0.8)):
+        self.parameter_config = parameter_config
+        self.lbounds = np.array(parameter_config.lbounds, dtype=np.float64)
+        self.ubounds = np.array(parameter_config.ubounds, dtype=np.float64)
+        self.max_training_points = max_training_points
+        self.noise = noise
+        self.length_scales = (np.array(length_scales, dtype=np.float64) *
+                              np.sqrt(len(self.lbounds)))
+
+        self._parameter_chunks = []
+        self._fitness_chunks = []
+        self.parameters = np.empty((0, len(self.lbounds)))
+        self.fitness = np.empty(0)
+        self.fitted = False
+
+    def __len__(self):
+        self._concatenate()
+        return len(self.fitness)
+
+    def normalize(self, parameters):
+        return ((np.asarray(parameters, dtype=np.float64) - self.lbounds) /
+                (self.ubounds - self.lbounds))
+
+    def add(self, parameters, fitness):
+        """
+        Add evaluated points - points with non-finite fitness are ignored
+
+        Parameters
+        ----------
+
+        parameters: ~np.ndarray
+            (number of points, number of parameters)
+
+        fitness: ~np.ndarray
+        """
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=np.float64))
+        fitness = np.asarray(fitness, dtype=np.float64)
+        finite = np.isfinite(fitness) & np.all(np.isfinite(parameters), axis=1)
+        if finite.any():
+            self._parameter_chunks.append(self.normalize(parameters[finite]))
+            self._fitness_chunks.append(fitness[finite])
+            self.fitted = False
+
+    def add_parameter_collection(self, parameter_collection):
+        """
+        Add the evaluated rows of a parameter collection (e.g. the
+        `parameter_collection_log`) - failed rows are ignored
+        """
+        use = np.ones(len(parameter_collection), dtype=bool)
+        if 'dalek.failed' in parameter_collection.columns:
+            use &= ~parameter_collection['dalek.failed'].values.astype(bool)
+        self.add(
+            parameter_collection[self.parameter_config.parameter_names].values[
+                use],
+            parameter_collection['dalek.fitness'].values[use])
+
+    def _concatenate(self):
+        if len(self._parameter_chunks) > 0:
+            self.parameters = np.vstack([self.parameters] +
+                                        self._parameter_chunks)
+            self.fitness = np.concatenate([self.fitness] +
+                                          self._fitness_chunks)
+            self._parameter_chunks = []
+            self._fitness_chunks = []
+
+    def training_indices(self):
+        self._concatenate()
+        number_of_points = len(self.fitness)
+        if number_of_points <= self.max_training_points:
+            return np.arange(number_of_points)
+        half = self.max_training_points // 2
+        best = np.argpartition(self.fitness, half)[:half]
+        recent = np.arange(number_of_points - (self.max_training_points - half),
+                           number_of_points)
+        return np.union1d(best, recent)
+
+    def kernel(self, x1, x2, length_scale):
+        squared_distance = (np.sum(x1 ** 2, axis=1)[:, None] +
+                            np.sum(x2 ** 2, axis=1)[None, :] -
+                            2 * np.dot(x1, x2.T))
+        return np.exp(-0.5 * np.maximum(squared_distance, 0) /
+                      length_scale ** 2)
+
+    def fit(self):
+        """
+        Train the model on the current training points
+        """
+        self._concatenate()
+        if len(self.fitness) < 2:
+            raise ValueError('The surrogate needs at least two evaluated '
+                             'points with finite fitness')
+
+        indices = self.training_indices()
+        x = self.parameters[indices]
+        y = self.fitness[indices]
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.
+        y = (y - self.y_mean) / self.y_std
+        identity = np.eye(len(y))
+
+        best_log_likelihood = -np.inf
+        for length_scale in self.length_scales:
+            k = self.kernel(x, x, length_scale) + (self.noise + 1e-10) * identity
+            try:
+                cholesky = np.linalg.cholesky(k)
+            except np.linalg.LinAlgError:
+                continue
+            alpha_1 = np.linalg.solve(cholesky, y)
+            log_likelihood = (-0.5 * np.dot(alpha_1, alpha_1) -
+                              np.sum(np.log(np.diag(cholesky))))
+            if log_likelihood > best_log_likelihood:
+                best_log_likelihood = log_likelihood
+                self.length_scale = length_scale
+                self.cholesky = cholesky
+                self.alpha = np.linalg.solve(cholesky.T, alpha_1)
+
+        if best_log_likelihood == -np.inf:
+            raise np.linalg.LinAlgError('Could not factorize the kernel matrix '
+                                        'for any length scale')
+        self.training_parameters = x
+        self.fitted = True
+
+    def predict(self, parameters):
+        """
+        Predicted fitness and its standard deviation
+
+        Parameters
+        ----------
+
+        parameters: ~np.ndarray
+            (number of points, number of parameters)
+
+        Returns
+        -------
+            : ~np.ndarray, ~np.ndarray
+            mean and standard deviation
+        """
+        if not self.fitted:
+            self.fit()
+        x = self.normalize(np.atleast_2d(parameters))
+        k_star = self.kernel(x, self.training_parameters, self.length_scale)
+        mean = np.dot(k_star, self.alpha)
+        v = np.linalg.solve(self.cholesky, k_star.T)
+        variance = np.maximum(1 - np.sum(v ** 2, axis=0), 0)
+        return (mean * self.y_std + self.y_mean,
+                np.sqrt(variance) * self.y_std)
+
+
+class SurrogateOptimizer(BaseOptimizer):
+    """
+    Pre-screens the candidates of another optimizer with a surrogate model.
+    The wrapped optimizer proposes number_of_samples * oversampling
+    candidates, only the number_of_samples with the lowest lower confidence
+    bound (predicted fitness - kappa * predicted standard deviation) are
+    sent to the engines - so both promising and uncertain candidates are
+    chosen.
+
+    The wrapped optimizer is told the true fitness of the evaluated
+    candidates and the predicted fitness (never better than the best true
+    fitness so far) of the screened out ones. The predictions are stored in
+    the 'dalek.predicted_fitness' and 'dalek.predicted_std' columns.
+
+    Parameters
+    ----------
+
+    parameter_conf: ~dalek.fitter.ParameterConfiguration
+
+    number_of_samples: ~int
+        number of candidates evaluated per iteration
+
+    optimizer: ~dalek.fitter.optimizers.BaseOptimizer
+        wrapped optimizer generating number_of_samples * oversampling
+        candidates per call
+
+    oversampling: ~int
+        [default=4]
+
+    kappa: ~float
+        weight of the predicted standard deviation [default=1.]
+
+    seed: ~int
+        seed of the random state filling up the first batch [default=None]
+
+    surrogate_kwargs:
+        passed to `GaussianProcessSurrogate`
+    """
+
+    def __init__(self, parameter_conf, number_of_samples, optimizer,
+                 oversampling=4, kappa=1., seed=None, **surrogate_kwargs):
+        self.parameter_config = parameter_conf
+        self.number_of_samples = number_of_samples
+        self.optimizer = optimizer
+        self.oversampling = oversampling
+        self.kappa = kappa
+        self.random_state = np.random.RandomState(seed)
+        self.surrogate = GaussianProcessSurrogate(parameter_conf,
+                                                  **surrogate_kwargs)
+        self.candidates = None
+        self.selected = None
+
+    def get_state(self):
+        state = super(SurrogateOptimizer, self).get_state()
+        state['optimizer'] = self.optimizer.get_state()
+        return state
+
+    def set_state(self, state):
+        state = dict(state)
+        self.optimizer.set_state(state.pop('optimizer'))
+        super(SurrogateOptimizer, self).set_state(state)
+
+    def normalize_parameter_collection(self, parameter_collection):
+        return self.optimizer.normalize_parameter_collection(
+            parameter_collection)
+
+    def predict(self, parameters):
+        """
+        Surrogate prediction - without at least two finite evaluations
+        nothing can be predicted (infinite fitness, no uncertainty)
+        """
+        if len(self.surrogate) < 2:
+            return np.ones(len(parameters)) * np.inf, np.zeros(len(parameters))
+        return self.surrogate.predict(parameters)
+
+    def inner_fitness(self, fitness, evaluated_parameters):
+        """
+        Fitness of the last full candidate batch for the wrapped optimizer
+        """
+        number_of_candidates = self.number_of_samples * self.oversampling
+        if self.candidates is None:
+            # first call - fill the batch up with random candidates
+            candidates = self.random_state.uniform(
+                self.parameter_config.lbounds, self.parameter_config.ubounds,
+                size=(max(number_of_candidates - len(fitness), 0),
+                      len(self.parameter_config.parameter_names)))
+            parameters = np.vstack((evaluated_parameters, candidates))
+            selected = np.arange(len(fitness))
+        else:
+            parameters = self.candidates
+            selected = self.selected
+
+        full_fitness, _ = self.predict(parameters)
+        if len(self.surrogate) > 0:
+            full_fitness = np.maximum(full_fitness,
+                                      self.surrogate.fitness.min())
+        full_fitness[selected] = fitness
+        return parameters, full_fitness
+
+    def __call__(self, parameter_collection):
+        fitness, split_param_collection = self.split_parameter_collection(
+            parameter_collection)
+        self.surrogate.add_parameter_collection(parameter_collection)
+        if (self.candidates is not None and
+                len(parameter_collection) != len(self.selected)):
+            raise ValueError('SurrogateOptimizer expects the {0} candidates it '
+                             'proposed - got {1}'.format(len(self.selected),
+                                                         len(parameter_collection)))
+
+        parameters, full_fitness = self.inner_fitness(
+            fitness.values.astype(np.float64), split_param_collection.values)
+        full_collection = ParameterCollection(
+            parameters, columns=self.parameter_config.parameter_names)
+        full_collection['dalek.fitness'] = full_fitness
+
+        candidates = self.optimizer(full_collection)
+        self.candidates = candidates[
+            self.parameter_config.parameter_names].values.astype(np.float64)
+
+        predicted_fitness, predicted_std = self.predict(self.candidates)
+        lower_confidence_bound = predicted_fitness - self.kappa * predicted_std
+        self.selected = np.argsort(lower_confidence_bound,
+                                   kind='mergesort')[:self.number_of_samples]
+        logger.debug('Surrogate pre-screening selected {0} of {1} '
+                     'candidates'.format(len(self.selected),
+                                         len(self.candidates)))
+
+        new_parameter_collection = candidates.iloc[self.selected].reset_index(
+            drop=True)
+        new_parameter_collection['dalek.predicted_fitness'] = \
+            predicted_fitness[self.selected]
+        new_parameter_collection['dalek.predicted_std'] = \
+            predicted_std[self.selected]
+        return new_parameter_collection
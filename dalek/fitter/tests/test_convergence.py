@@ -0,0 +1,63 @@
+from dalek.fitter.base import ParameterConfiguration
+from dalek.fitter.convergence import ConvergenceMonitor
+from dalek.parallel.parameter_collection import ParameterCollection
+import numpy as np
+
+
+parameter_config = ParameterConfiguration(['param.x', 'param.y'],
+                                          [[0., 10.], [0., 1.]])
+
+
+def iteration(parameters, fitness, time_elapsed=1.):
+    parameter_collection = ParameterCollection(
+        np.array(parameters, dtype=np.float64),
+        columns=parameter_config.parameter_names)
+    parameter_collection['dalek.fitness'] = fitness
+    parameter_collection['dalek.time_elapsed'] = time_elapsed
+    return parameter_collection
+
+
+def test_fitness_plateau():
+    monitor = ConvergenceMonitor.from_config_dict(
+        parameter_config, {'plateau': {'window': 3, 'tolerance': 0.05}})
+    parameters = [[0., 0.], [10., 1.]]
+    for fitness in [10., 5., 4.95, 4.9, 4.9]:
+        assert monitor.check(iteration(parameters, [fitness, 20.])) is None
+    # a worse iteration does not change the best fitness
+    assert monitor.check(iteration(parameters, [30., 20.])) is not None
+    np.testing.assert_array_equal(monitor.best_fitness,
+                                  [10., 5., 4.95, 4.9, 4.9, 4.9])
+
+
+def test_relative_improvement():
+    monitor = ConvergenceMonitor.from_config_dict(
+        parameter_config, {'relative_improvement': {'window': 2,
+                                                    'threshold': 0.01}})
+    parameters = [[0., 0.], [10., 1.]]
+    for fitness in [100., 50., 25., 24.9]:
+        assert monitor.check(iteration(parameters, [fitness, 200.])) is None
+    assert monitor.check(iteration(parameters, [24.8, 200.])) is not None
+
+
+def test_population_diversity():
+    monitor = ConvergenceMonitor.from_config_dict(
+        parameter_config, {'diversity': {'threshold': 1e-3}})
+    assert monitor.check(iteration([[0., 0.5], [10., 0.5]], [1., 1.])) is None
+    # the spread is measured in units of the bounds of each parameter
+    assert monitor.check(iteration([[5., 0.], [5.001, 1.]], [1., 1.])) is None
+    np.testing.assert_almost_equal(monitor.diversity, [0.5, 0.5])
+    assert monitor.check(iteration([[5., 0.5], [5.001, 0.5001]],
+                                   [1., 1.])) is not None
+
+
+def test_budget():
+    monitor = ConvergenceMonitor.from_config_dict(
+        parameter_config, {'budget': {'core_hours': 1.}})
+    parameters = [[0., 0.], [10., 1.]]
+    assert monitor.check(iteration(parameters, [1., 1.], 1200.)) is None
+    # cached rows did not use any core time
+    cached = iteration(parameters, [1., 1.], 1200.)
+    cached['dalek.cached'] = [True, True]
+    assert monitor.check(cached) is None
+    assert monitor.check(iteration(parameters, [1., 1.], 600.)) is not None
+    np.testing.assert_almost_equal(monitor.core_hours, 1.)
@@ -0,0 +1,88 @@
+import numpy as np
+
+from dalek.fitter.base import ParameterConfiguration
+from dalek.fitter.evaluation_cache import EvaluationCache, config_hash
+from dalek.parallel.parameter_collection import ParameterCollection
+
+
+parameter_config = ParameterConfiguration(['param.x', 'param.y'],
+                                          [[-5., 5.], [0., 1.]])
+
+
+def evaluated_parameter_collection(parameters):
+    parameter_collection = ParameterCollection(
+        np.array(parameters, dtype=np.float64),
+        columns=parameter_config.parameter_names)
+    parameter_collection['dalek.fitness'] = np.sum(
+        parameter_collection.values ** 2, axis=1)
+    return parameter_collection
+
+
+def test_lookup():
+    cache = EvaluationCache(parameter_config, 'hash', tolerance=1e-6)
+    parameter_collection = evaluated_parameter_collection([[1., 0.5],
+                                                           [2., np.nan],
+                                                           [3., 0.2]])
+    parameter_collection['dalek.fitness'].values[1] = np.nan
+    cache.add(parameter_collection, [10, 11, 12])
+    assert len(cache) == 2
+
+    query = evaluated_parameter_collection([[3., 0.2 + 1e-9],
+                                            [1., 0.5 + 1e-3],
+                                            [2., np.nan],
+                                            [1., 0.5]])
+    hits, fitness, log_index = cache.lookup(query)
+    np.testing.assert_array_equal(hits, [True, False, False, True])
+    np.testing.assert_allclose(fitness[hits], [9.04, 1.25])
+    np.testing.assert_array_equal(log_index, [12, -1, -1, 10])
+
+
+def test_extra_columns_and_context():
+    cache = EvaluationCache(parameter_config, 'hash')
+    parameter_collection = evaluated_parameter_collection([[1., 0.5]])
+    parameter_collection['montecarlo.seed'] = 23111963
+    cache.add(parameter_collection, [0], context=1)
+
+    assert cache.lookup(parameter_collection, context=1)[0][0]
+    assert not cache.lookup(parameter_collection, context=0)[0][0]
+    parameter_collection['montecarlo.seed'] = 250819801
+    assert not cache.lookup(parameter_collection, context=1)[0][0]
+
+
+def test_lru_eviction():
+    cache = EvaluationCache(parameter_config, 'hash', max_size=2)
+    cache.add(evaluated_parameter_collection([[1., 0.1], [2., 0.2]]), [0, 1])
+    # touching the first entry makes the second one the least recently used
+    cache.lookup(evaluated_parameter_collection([[1., 0.1]]))
+    cache.add(evaluated_parameter_collection([[3., 0.3]]), [2])
+
+    hits = cache.lookup(evaluated_parameter_collection([[1., 0.1], [2., 0.2],
+                                                        [3., 0.3]]))[0]
+    np.testing.assert_array_equal(hits, [True, False, True])
+
+
+def test_add_log():
+    log = evaluated_parameter_collection([[1., 0.1], [2., 0.2], [3., 0.3],
+                                          [4., 0.4], [5., 0.5]])
+    log['dalek.cached'] = [False, True, False, False, False]
+    log['dalek.failed'] = [False, False, True, False, False]
+    log['dalek.seed'] = [-1, -1, -1, 7, -1]
+    log['dalek.fidelity'] = [1, 1, 1, 1, 0]
+    cache = EvaluationCache(parameter_config, 'hash')
+    cache.add_log(log, np.arange(5), fidelity=1)
+
+    hits, fitness, log_index = cache.lookup(log)
+    np.testing.assert_array_equal(hits, [True, False, False, False, False])
+    assert log_index[0] == 0
+
+
+def test_config_hash():
+    config = {'supernova': {'luminosity_requested': '1 solLum',
+                            'time_explosion': '10 day'},
+              'model': {'abundances': {'O': 0.5, 'Si': 0.5}}}
+    reordered_config = {'model': {'abundances': {'Si': 0.5, 'O': 0.5}},
+                        'supernova': {'time_explosion': '10 day',
+                                      'luminosity_requested': '1 solLum'}}
+    assert config_hash(config) == config_hash(reordered_config)
+    reordered_config['model']['abundances']['O'] = 0.6
+    assert config_hash(config) != config_hash(reordered_config)
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pytest
+
+from dalek.fitter.fitness_function import (BaseFitnessFunction,
+                                           SimpleRMSFitnessFunction)
+from dalek.util import rebin_matrix, rebin_flux
+
+data_path = os.path.join(os.path.dirname(__file__))
+
+
+@pytest.fixture
+def fitness_function():
+    return SimpleRMSFitnessFunction(os.path.join(data_path, 'myspec.dat'))
+
+
+def test_rebin_matrix_conserves_flux():
+    source_wavelength = np.linspace(3000., 9000., 601)
+    target_wavelength = np.linspace(3500., 8500., 51)
+    flux = np.random.RandomState(1).uniform(0.5, 1.5, len(source_wavelength))
+    matrix = rebin_matrix(source_wavelength, target_wavelength)
+    assert matrix.shape == (51, 601)
+
+    # the target bins (3450 - 8550) end halfway in the source bins 45 and 555
+    np.testing.assert_allclose(matrix.sum(axis=1), 1.)
+    rebinned = matrix.dot(flux)
+    np.testing.assert_allclose(
+        np.sum(rebinned * 100.),
+        np.sum(flux[46:555] * 10.) + 5. * (flux[45] + flux[555]))
+
+    # descending source grids (as in TARDIS spectra) give the same result
+    np.testing.assert_allclose(
+        rebin_flux(source_wavelength[::-1], flux[::-1], target_wavelength),
+        rebinned)
+
+
+def test_rebin_matrix_outside_source():
+    matrix = rebin_matrix(np.array([5000., 5010., 5020.]),
+                          np.array([4000., 5010., 6000.]))
+    np.testing.assert_allclose(matrix.dot([1., 2., 3.]), [1., 2., 3.])
+
+
+def test_rebin_operator_cache(fitness_function):
+    wavelength = np.linspace(9500., 2500., 2000)
+    operator = fitness_function.rebin_operator(wavelength)
+    assert fitness_function.rebin_operator(wavelength.copy()) is operator
+    assert fitness_function.rebin_operator(wavelength[1:]) is not operator
+    assert len(fitness_function.rebin_operators) == 2
+
+    fluxes = np.random.RandomState(2).uniform(size=(5, len(wavelength)))
+    batch = fitness_function.rebin(wavelength, fluxes)
+    assert batch.shape == (5, len(fitness_function.observed_spectrum_flux))
+    for flux, rebinned in zip(fluxes, batch):
+        np.testing.assert_allclose(fitness_function.rebin(wavelength, flux),
+                                   rebinned)
+    np.testing.assert_allclose(
+        fitness_function.rebin(wavelength, np.ones(len(wavelength))), 1.)
+
+
+class Quantity(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class Spectrum(object):
+    def __init__(self, wavelength, flux):
+        self.wavelength = Quantity(wavelength)
+        self.flux_lambda = Quantity(flux)
+        self.flux_nu = flux
+
+
+class Model(object):
+    def __init__(self, wavelength, flux):
+        self.spectrum = Spectrum(wavelength, flux)
+        self.spectrum_virtual = Spectrum(wavelength, np.zeros_like(flux))
+
+
+def test_evaluate_fluxes(fitness_function):
+    wavelength = np.linspace(9500., 2500., 2000)
+    fluxes = np.random.RandomState(3).uniform(size=(4, len(wavelength)))
+    fitness = fitness_function.evaluate_fluxes(wavelength, fluxes)
+    assert fitness.shape == (4,)
+    for flux, flux_fitness in zip(fluxes, fitness):
+        single_fitness, spectrum = fitness_function(Model(wavelength, flux))
+        assert spectrum.flux_lambda.value is flux
+        np.testing.assert_allclose(single_fitness, flux_fitness)
+        np.testing.assert_allclose(
+            flux_fitness,
+            np.sum((fitness_function.rebin(wavelength, flux) -
+                    fitness_function.observed_spectrum_flux) ** 2))
+
+
+def test_evaluate_fluxes_required():
+    class IncompleteFitnessFunction(BaseFitnessFunction):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteFitnessFunction()
@@ -0,0 +1,140 @@
+from dalek.fitter.fitter_log import (open_fitter_log, read_fitter_log,
+                                     convert_fitter_log_to_csv,
+                                     convert_csv_fitter_log, CSVFitterLog,
+                                     ParameterCollectionLog, write_checkpoint,
+                                     read_checkpoint)
+from dalek.parallel.parameter_collection import ParameterCollection
+from dalek.fitter.base import ParameterConfiguration, FitterConfiguration
+from dalek.fitter.optimizers import DEOptimizer
+import numpy as np
+import pandas as pd
+import pytest
+
+from numpy.testing import assert_allclose
+
+
+def make_iteration(iteration, number_of_samples=5):
+    parameter_collection = ParameterCollection(
+        np.random.uniform(0, 1, size=(number_of_samples, 2)),
+        columns=['param.a', 'param.b'])
+    parameter_collection['dalek.fitness'] = np.random.uniform(
+        size=number_of_samples)
+    parameter_collection['dalek.current_iteration'] = iteration
+    return parameter_collection
+
+
+def test_append_and_read(tmpdir):
+    fname = str(tmpdir.join('fitter_log.h5'))
+    fitter_log = open_fitter_log(fname)
+    iterations = [make_iteration(i) for i in xrange(3)]
+    for iteration in iterations:
+        fitter_log.append(iteration)
+
+    assert len(fitter_log) == 15
+    log = read_fitter_log(fname)
+    expected = pd.concat(iterations, ignore_index=True)
+    assert list(log.columns) == list(expected.columns)
+    assert_allclose(log.values, expected.values)
+    np.testing.assert_array_equal(log.index, np.arange(15))
+
+    assert len(open_fitter_log(fname)) == 15
+    assert len(open_fitter_log(fname, clobber=True)) == 0
+
+
+def test_hdf5_new_columns(tmpdir):
+    fname = str(tmpdir.join('fitter_log.h5'))
+    fitter_log = open_fitter_log(fname)
+    fitter_log.append(make_iteration(0))
+    second_iteration = make_iteration(1)
+    second_iteration['dalek.engine_id'] = 3
+    del second_iteration['dalek.fitness']
+    fitter_log.append(second_iteration)
+
+    log = read_fitter_log(fname)
+    assert log.columns[-1] == 'dalek.engine_id'
+    assert np.all(log['dalek.engine_id'].values[:5] == -1)
+    assert np.all(log['dalek.engine_id'].values[5:] == 3)
+    assert np.all(np.isnan(log['dalek.fitness'].values[5:]))
+
+
+def test_csv_conversion(tmpdir):
+    fname = str(tmpdir.join('fitter_log.h5'))
+    csv_fname = str(tmpdir.join('fitter_log.csv'))
+    fitter_log = open_fitter_log(fname)
+    fitter_log.append(make_iteration(0))
+    convert_fitter_log_to_csv(fname, csv_fname)
+    assert_allclose(read_fitter_log(csv_fname).values,
+                    read_fitter_log(fname).values)
+    assert len(CSVFitterLog(csv_fname)) == 5
+    assert not hasattr(CSVFitterLog(csv_fname), 'append')
+    with pytest.raises(ValueError):
+        open_fitter_log(csv_fname)
+
+    binary_fname = str(tmpdir.join('converted_fitter_log.h5'))
+    convert_csv_fitter_log(csv_fname, binary_fname)
+    fitter_log = open_fitter_log(binary_fname)
+    fitter_log.append(make_iteration(1))
+    assert len(fitter_log) == 10
+    assert_allclose(read_fitter_log(binary_fname).values[:5],
+                    read_fitter_log(fname).values)
+
+
+def test_resume_from_csv_fitter_log(tmpdir):
+    parameter_config = ParameterConfiguration(['param.a', 'param.b'],
+                                              [[0., 1.], [0., 1.]])
+    csv_fname = str(tmpdir.join('fitter_log.csv'))
+    iterations = [make_iteration(i) for i in xrange(2)]
+    pd.concat(iterations, ignore_index=True).to_csv(csv_fname)
+
+    configuration = FitterConfiguration(
+        DEOptimizer(parameter_config, 5), None, parameter_config, None, None,
+        5, fitter_log=csv_fname)
+    assert configuration.fitter_log == str(tmpdir.join('fitter_log.h5'))
+    assert configuration.checkpoint == configuration.fitter_log + '.checkpoint'
+    assert configuration.resume
+    assert configuration.current_iteration == 2
+    assert_allclose(read_fitter_log(configuration.fitter_log).values,
+                    read_fitter_log(csv_fname).values)
+
+
+def test_parameter_collection_log_growth():
+    parameter_collection_log = ParameterCollectionLog(initial_capacity=4)
+    iterations = [make_iteration(i) for i in xrange(10)]
+    for iteration in iterations:
+        parameter_collection_log.append(iteration)
+
+    assert len(parameter_collection_log) == 50
+    assert parameter_collection_log.capacity >= 50
+    expected = pd.concat(iterations, ignore_index=True)
+    assert_allclose(parameter_collection_log['dalek.fitness'],
+                    expected['dalek.fitness'])
+    assert_allclose(parameter_collection_log.to_parameter_collection().values,
+                    expected.values)
+    last_iteration = parameter_collection_log.to_parameter_collection(start=45)
+    np.testing.assert_array_equal(last_iteration.index, np.arange(45, 50))
+    assert_allclose(last_iteration.values, iterations[-1].values)
+
+
+def test_upcast(tmpdir):
+    parameter_collection_log = ParameterCollectionLog()
+    fitter_log = open_fitter_log(str(tmpdir.join('fitter_log.h5')))
+    for fitness in [[3], [2.7]]:
+        parameter_collection = ParameterCollection({'dalek.fitness': fitness})
+        parameter_collection_log.append(parameter_collection)
+        fitter_log.append(parameter_collection)
+    assert_allclose(parameter_collection_log['dalek.fitness'], [3., 2.7])
+    assert_allclose(fitter_log.read()['dalek.fitness'], [3., 2.7])
+
+
+def test_checkpoint(tmpdir):
+    fname = str(tmpdir.join('fitter_log.h5.checkpoint'))
+    parameter_collection = make_iteration(0)
+    write_checkpoint(fname, {'current_iteration': 1,
+                             'parameter_collection': parameter_collection})
+    write_checkpoint(fname, {'current_iteration': 2,
+                             'parameter_collection': parameter_collection})
+    checkpoint = read_checkpoint(fname)
+    assert checkpoint['current_iteration'] == 2
+    assert_allclose(checkpoint['parameter_collection'].values,
+                    parameter_collection.values)
+    assert tmpdir.listdir() == [tmpdir.join('fitter_log.h5.checkpoint')]
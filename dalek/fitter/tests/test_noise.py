@@ -0,0 +1,113 @@
+from dalek.fitter.base import ParameterConfiguration, FitterConfiguration
+from dalek.fitter.fitter_log import ParameterCollectionLog, open_fitter_log
+from dalek.fitter.noise import (AdaptiveReevaluation, pooled_noise_level,
+                                measured_noise_level)
+from dalek.fitter.optimizers import NoiseMeasurement, DEOptimizer
+import numpy as np
+import pytest
+
+
+parameter_config = ParameterConfiguration(['param.x', 'param.y'],
+                                          [[-1., 1.], [-1., 1.]])
+
+
+def test_pooled_noise_level():
+    fitness = np.array([1., 3., 10., 12., 5., np.nan])
+    groups = np.array([0, 0, 1, 1, 2, 2])
+    np.testing.assert_almost_equal(pooled_noise_level(fitness, groups),
+                                   np.sqrt(2.))
+    assert pooled_noise_level(fitness[[0, 2, 4]], groups[[0, 2, 4]]) is None
+
+
+def test_noise_measurement():
+    optimizer = NoiseMeasurement(parameter_config, 20,
+                                 parameter_sets=[{'param.x': 0.5,
+                                                  'param.y': 0.},
+                                                 {'param.x': -0.5,
+                                                  'param.y': 0.}],
+                                 seed=1)
+    random_state = np.random.RandomState(2)
+    parameter_collection = optimizer.generate_initial_parameter_collection()
+    log = ParameterCollectionLog()
+    for _ in xrange(50):
+        assert len(set(parameter_collection['dalek.seed'])) == 20
+        np.testing.assert_array_equal(
+            parameter_collection['param.x'].values,
+            np.where(parameter_collection['dalek.noise_set'] == 0, 0.5, -0.5))
+        parameter_collection['dalek.fitness'] = (
+            parameter_collection['param.x'] * 10 +
+            random_state.normal(0, 0.1, size=20))
+        log.append(parameter_collection)
+        parameter_collection = optimizer(parameter_collection)
+    np.testing.assert_allclose(optimizer.noise_level, 0.1, rtol=0.05)
+    np.testing.assert_allclose(optimizer.fitness_variance, 0.01, rtol=0.1)
+    # the re-evaluation of later fits measures the same from the log
+    np.testing.assert_allclose(
+        measured_noise_level(log.to_parameter_collection()),
+        optimizer.noise_level)
+
+    # resumed without a checkpoint the measurement continues with new seeds
+    resumed_optimizer = NoiseMeasurement(
+        parameter_config, 20, parameter_sets=[{'param.x': 0.5, 'param.y': 0.},
+                                              {'param.x': -0.5,
+                                               'param.y': 0.}],
+        seed=1)
+    resumed_optimizer.resume_from_log(log.to_parameter_collection())
+    np.testing.assert_allclose(resumed_optimizer.noise_level,
+                               optimizer.noise_level)
+    np.testing.assert_array_equal(
+        resumed_optimizer.generate_initial_parameter_collection()[
+            'dalek.seed'].values, parameter_collection['dalek.seed'].values)
+
+
+def test_adaptive_reevaluation():
+    policy = AdaptiveReevaluation(noise_level=1., threshold=1.,
+                                  max_replicates=3, seed=1)
+    parameters = np.array([[0., 0.], [0.1, 0.], [0.2, 0.], [0.3, 0.]])
+    policy.add(parameters, [10., 10.5, 13., np.nan])
+    np.testing.assert_array_equal(policy.select(parameters),
+                                  [True, True, False, False])
+
+    # a lucky first run loses the incumbent status to its mean
+    policy.add(parameters[:2], [12., 10.5])
+    assert policy.incumbent == (0.1, 0.)
+    means, runs = policy.statistics(parameters)
+    np.testing.assert_array_equal(means[:3], [11., 10.5, 13.])
+    np.testing.assert_array_equal(runs, [2, 2, 1, 0])
+
+    # no more runs than max_replicates
+    policy.add(parameters[:2], [11., 10.5])
+    assert not policy.select(parameters)[:2].any()
+
+    # without a noise level the best candidate is repeated to estimate it
+    policy = AdaptiveReevaluation(seed=1)
+    policy.add(parameters, [10., 10.5, 13., 20.])
+    assert policy.noise_level is None
+    np.testing.assert_array_equal(policy.select(parameters),
+                                  [True, False, False, False])
+    policy.add(parameters[:1], [12.])
+    np.testing.assert_almost_equal(policy.noise_level, np.sqrt(2.))
+
+
+def test_reevaluation_configuration(tmpdir):
+    def make_configuration(reevaluation, **kwargs):
+        return FitterConfiguration(DEOptimizer(parameter_config, 4), None,
+                                   parameter_config, None, None, 4,
+                                   reevaluation=reevaluation, **kwargs)
+
+    with pytest.raises(ValueError):
+        make_configuration({}, asynchronous=True)
+    with pytest.raises(ValueError):
+        make_configuration({}, multi_fidelity={'levels': [{}, {}]})
+
+    noise_log = str(tmpdir.join('noise_measurement.h5'))
+    parameter_collection = NoiseMeasurement(
+        parameter_config, 10, seed=1).generate_initial_parameter_collection()
+    parameter_collection['dalek.fitness'] = np.random.RandomState(3).normal(
+        size=10)
+    open_fitter_log(noise_log).append(parameter_collection)
+    configuration = make_configuration({'noise_log': noise_log,
+                                        'threshold': 2.})
+    assert configuration.reevaluation == {
+        'threshold': 2., 'noise_level': pooled_noise_level(
+            parameter_collection['dalek.fitness'].values, np.zeros(10))}
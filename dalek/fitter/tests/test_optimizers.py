@@ -0,0 +1,311 @@
+import pickle
+
+from dalek.fitter.base import ParameterConfiguration
+from dalek.fitter.optimizers import (DEOptimizer, PSOOptimizer,
+                                     PSOOptimizerGbest, LuusJaakolaOptimizer,
+                                     CMAESOptimizer, EnsembleSampler,
+                                     IslandModel, ensemble_chains,
+                                     reflect_into_bounds)
+from dalek.fitter.fitter_log import ParameterCollectionLog
+from dalek.parallel.parameter_collection import ParameterCollection
+import numpy as np
+import pytest
+
+
+parameter_config = ParameterConfiguration(['param.x', 'param.y'],
+                                          [[-5., 5.], [-5., 5.]])
+
+
+def sphere(parameters):
+    return np.sum(parameters ** 2, axis=1)
+
+
+def evaluate(parameter_collection):
+    parameter_collection['dalek.fitness'] = sphere(
+        parameter_collection[parameter_config.parameter_names].values)
+    return parameter_collection
+
+
+def initial_parameter_collection(number_of_samples):
+    return ParameterCollection(
+        np.random.uniform(-5, 5, size=(number_of_samples, 2)),
+        columns=parameter_config.parameter_names)
+
+
+@pytest.mark.parametrize('optimizer_class', [DEOptimizer, PSOOptimizerGbest,
+                                             LuusJaakolaOptimizer])
+def test_steady_state_update(optimizer_class):
+    np.random.seed(250880)
+    optimizer = optimizer_class(parameter_config, 10)
+    parameter_collection = initial_parameter_collection(10)
+    parameter_collection['dalek.population_index'] = np.arange(10)
+    initial_best = evaluate(parameter_collection)['dalek.fitness'].min()
+    best = initial_best
+
+    for _ in xrange(300):
+        # results come back in an arbitrary order and a few at a time
+        result_idx = np.random.permutation(10)[:3]
+        partial_collection = parameter_collection.iloc[result_idx].reset_index(
+            drop=True)
+        new_candidates = optimizer.update_steady_state(partial_collection)
+        assert len(new_candidates) == len(partial_collection)
+        np.testing.assert_array_equal(
+            new_candidates['dalek.population_index'].values,
+            partial_collection['dalek.population_index'].values)
+        evaluate(new_candidates)
+        best = min(best, new_candidates['dalek.fitness'].min())
+        parameter_collection.iloc[result_idx] = new_candidates[
+            parameter_collection.columns].values
+
+    assert best < initial_best
+
+
+@pytest.mark.parametrize('strategy', DEOptimizer.strategies)
+@pytest.mark.parametrize('bound_handling', ['reflect', 'bounce_back'])
+def test_de_strategies(strategy, bound_handling):
+    np.random.seed(250880)
+    optimizer = DEOptimizer(parameter_config, 20, strategy=strategy,
+                            bound_handling=bound_handling, seed=250880)
+    parameter_collection = initial_parameter_collection(20)
+    for _ in xrange(60):
+        parameter_collection = optimizer(evaluate(parameter_collection))
+        new_parameters = parameter_collection[
+            parameter_config.parameter_names].values
+        assert np.all(new_parameters >= parameter_config.lbounds)
+        assert np.all(new_parameters <= parameter_config.ubounds)
+        # no trial is a copy of its parent
+        assert not np.any(np.all(new_parameters == optimizer.population,
+                                 axis=1))
+
+    assert optimizer.fitness.min() < 1e-3
+
+
+def test_luus_jaakola_best_of_batch():
+    optimizer = LuusJaakolaOptimizer(parameter_config, 3)
+    parameter_collection = ParameterCollection(
+        [[1., 1.], [0.5, 0.5], [0., 0.]],
+        columns=parameter_config.parameter_names, index=[5, 7, 9])
+    parameter_collection['dalek.fitness'] = [2., 0.5, np.nan]
+    parameter_collection['dalek.population_index'] = [0, 1, 2]
+    optimizer.update_steady_state(parameter_collection)
+    np.testing.assert_array_equal(optimizer.x, [0.5, 0.5])
+    assert optimizer.best_fitness == 0.5
+
+
+def test_de_ignores_unknown_options():
+    optimizer = DEOptimizer(parameter_config, 20, cr=0.5, max_iterations=10)
+    assert optimizer.cr == 0.5
+
+
+def test_reflect_into_bounds():
+    lbounds = np.array([0., -1.])
+    ubounds = np.array([1., 1.])
+    x = np.array([[1.25, -1.5], [-0.25, 4.5], [0.5, 0.]])
+    np.testing.assert_allclose(reflect_into_bounds(x, lbounds, ubounds),
+                               [[0.75, -0.5], [0.25, 0.5], [0.5, 0.]])
+
+
+@pytest.mark.parametrize('topology', PSOOptimizer.topologies)
+def test_pso_topologies(topology):
+    np.random.seed(250880)
+    optimizer = PSOOptimizer(parameter_config, 20, topology=topology,
+                             seed=250880)
+    parameter_collection = initial_parameter_collection(20)
+    # the fitness column does not have to be the last one
+    parameter_collection['dalek.population_index'] = np.arange(20)
+    for _ in xrange(100):
+        evaluate(parameter_collection)
+        parameter_collection['montecarlo.seed'] = 1
+        parameter_collection = optimizer(parameter_collection)
+        parameters = parameter_collection[
+            parameter_config.parameter_names].values
+        assert np.all(parameters >= parameter_config.lbounds)
+        assert np.all(parameters <= parameter_config.ubounds)
+
+    assert optimizer.py.min() < 1e-3
+
+
+def test_pso_random_k_steady_state():
+    np.random.seed(250880)
+    optimizer = PSOOptimizer(parameter_config, 10, topology='random_k',
+                             seed=1)
+    parameter_collection = evaluate(initial_parameter_collection(10))
+    parameter_collection['dalek.population_index'] = np.arange(10)
+    optimizer.update_steady_state(parameter_collection)
+    optimizer.best_fitness = -np.inf
+    neighbours = optimizer.neighbours
+
+    # the neighbourhoods are only redrawn after a whole generation
+    for i in xrange(4):
+        optimizer.update_steady_state(parameter_collection.iloc[
+            2 * i:2 * i + 2].reset_index(drop=True))
+        assert optimizer.neighbours is neighbours
+    optimizer.update_steady_state(parameter_collection.iloc[
+        8:].reset_index(drop=True))
+    assert optimizer.neighbours is not neighbours
+
+
+def test_pso_von_neumann_neighbours():
+    optimizer = PSOOptimizer(parameter_config, 12, topology='von_neumann')
+    # 3 x 4 grid
+    np.testing.assert_array_equal(optimizer.neighbours[0], [0, 8, 4, 3, 1])
+    np.testing.assert_array_equal(optimizer.neighbours[6], [6, 2, 10, 5, 7])
+    ring_optimizer = PSOOptimizer(parameter_config, 12, topology='ring', k=2)
+    np.testing.assert_array_equal(ring_optimizer.neighbours[0],
+                                  [10, 11, 0, 1, 2])
+
+
+def test_cmaes_convergence():
+    np.random.seed(250880)
+    optimizer = CMAESOptimizer(parameter_config, 10, seed=250880)
+    parameter_collection = evaluate(initial_parameter_collection(10))
+    for _ in xrange(100):
+        parameter_collection = optimizer(parameter_collection)
+        assert len(parameter_collection) == 10
+        values = parameter_collection[parameter_config.parameter_names].values
+        assert np.all((values >= -5) & (values <= 5))
+        evaluate(parameter_collection)
+    assert parameter_collection['dalek.fitness'].min() < 1e-8
+
+    with pytest.raises(ValueError):
+        optimizer(parameter_collection.iloc[:5])
+
+
+@pytest.mark.parametrize('restarts', ['ipop', 'bipop'])
+def test_cmaes_restarts(restarts):
+    np.random.seed(250880)
+    optimizer = CMAESOptimizer(parameter_config, 6, restarts=restarts,
+                               tolfun=1e-6, max_restarts=3, seed=250880)
+    parameter_collection = evaluate(initial_parameter_collection(6))
+    population_sizes = set()
+    for _ in xrange(500):
+        parameter_collection = optimizer(parameter_collection)
+        population_sizes.add(len(parameter_collection))
+        evaluate(parameter_collection)
+    assert optimizer.number_of_restarts == 3
+    assert max(population_sizes) > 6
+    assert optimizer.best_fitness < 1e-6
+
+
+@pytest.mark.parametrize('optimizer_class', [DEOptimizer, PSOOptimizer,
+                                             LuusJaakolaOptimizer,
+                                             CMAESOptimizer])
+def test_optimizer_state(optimizer_class):
+    np.random.seed(250880)
+    optimizer = optimizer_class(parameter_config, 10, seed=250880)
+    parameter_collection = evaluate(initial_parameter_collection(10))
+    for _ in xrange(5):
+        parameter_collection = evaluate(optimizer(parameter_collection))
+
+    state = pickle.loads(pickle.dumps(optimizer.get_state()))
+    numpy_random_state = np.random.get_state()
+    expected = optimizer(parameter_collection.copy())
+
+    restored_optimizer = optimizer_class(parameter_config, 10)
+    restored_optimizer.set_state(state)
+    np.random.set_state(numpy_random_state)
+    np.testing.assert_array_equal(
+        restored_optimizer(parameter_collection.copy()).values, expected.values)
+
+
+def test_ensemble_sampler():
+    # -fitness / 2 of the sphere is the log density of a standard normal
+    np.random.seed(250880)
+    sampler = EnsembleSampler(parameter_config, 40, seed=250880)
+    parameter_collection = evaluate(initial_parameter_collection(40))
+    parameter_collection['dalek.current_iteration'] = 0
+    log = ParameterCollectionLog()
+    log.append(sampler.annotate(parameter_collection))
+    for i in xrange(1, 602):
+        parameter_collection = sampler(parameter_collection)
+        assert len(parameter_collection) <= 20
+        evaluate(parameter_collection)
+        parameter_collection['dalek.current_iteration'] = i
+        parameter_collection = sampler.annotate(parameter_collection)
+        log.append(parameter_collection)
+
+    chain = ensemble_chains(log.to_parameter_collection(),
+                            parameter_config.parameter_names)
+    # the last logged half step was not yet seen by the sampler
+    assert chain.shape == (301, 40, 2)
+    np.testing.assert_array_equal(chain[299], sampler.positions)
+    samples = chain[100:300].reshape(-1, 2)
+    np.testing.assert_allclose(samples.mean(axis=0), 0, atol=0.2)
+    np.testing.assert_allclose(samples.std(axis=0), 1, atol=0.2)
+    assert 0.2 < sampler.acceptance_fraction.mean() < 0.9
+
+
+def test_ensemble_sampler_resume():
+    np.random.seed(250880)
+    sampler = EnsembleSampler(parameter_config, 8, seed=1)
+    parameter_collection = evaluate(initial_parameter_collection(8))
+    parameter_collection['dalek.current_iteration'] = 0
+    log = ParameterCollectionLog()
+    log.append(sampler.annotate(parameter_collection))
+    for i in xrange(1, 12):
+        parameter_collection = evaluate(sampler(parameter_collection))
+        parameter_collection['dalek.current_iteration'] = i
+        parameter_collection = sampler.annotate(parameter_collection)
+        log.append(parameter_collection)
+
+    resumed_sampler = EnsembleSampler(parameter_config, 8, seed=2)
+    resumed_sampler.resume_from_log(log.to_parameter_collection())
+    walkers = parameter_collection['dalek.walker'].values.astype(np.int64)
+    np.testing.assert_array_equal(resumed_sampler.thresholds[walkers],
+                                  sampler.thresholds[walkers])
+
+    # the resumed fit hands the last logged iteration to the sampler again
+    sampler(parameter_collection)
+    resumed_sampler(parameter_collection)
+    for attribute in ['positions', 'log_probability', 'half', 'step']:
+        np.testing.assert_array_equal(getattr(resumed_sampler, attribute),
+                                      getattr(sampler, attribute))
+
+
+def test_ensemble_chains_temperature():
+    # the chains in the log do not depend on the likelihood used to read them
+    np.random.seed(250880)
+    sampler = EnsembleSampler(parameter_config, 8, temperature=10., seed=1)
+    parameter_collection = evaluate(initial_parameter_collection(8))
+    parameter_collection['dalek.current_iteration'] = 0
+    log = ParameterCollectionLog()
+    log.append(sampler.annotate(parameter_collection))
+    for i in xrange(1, 42):
+        parameter_collection = evaluate(sampler(parameter_collection))
+        parameter_collection['dalek.current_iteration'] = i
+        parameter_collection = sampler.annotate(parameter_collection)
+        log.append(parameter_collection)
+    log = log.to_parameter_collection()
+    np.testing.assert_allclose(
+        log['dalek.log_likelihood'].values,
+        -0.05 * log['dalek.fitness'].values)
+    chain = ensemble_chains(log, parameter_config.parameter_names)
+    assert chain.shape == (21, 8, 2)
+    np.testing.assert_array_equal(chain[19], sampler.positions)
+
+
+def test_island_model():
+    np.random.seed(250880)
+    optimizer = IslandModel(parameter_config, 30, {'name': 'devolution'},
+                            number_of_islands=3, migration_interval=2,
+                            seed=1)
+    parameter_collection = initial_parameter_collection(30)
+    for _ in xrange(30):
+        parameter_collection = optimizer(evaluate(parameter_collection))
+        assert len(parameter_collection) == 30
+        np.testing.assert_array_equal(
+            parameter_collection['dalek.island'].values, np.repeat(range(3),
+                                                                   10))
+    assert optimizer.iterations == [30, 30, 30]
+    assert max(optimizer.best_fitness) < 1e-3
+
+    # migrants replace the worst rows of the receiving island
+    island_collection = evaluate(initial_parameter_collection(10))
+    optimizer.migrants[1] = (np.zeros((1, 2)), np.zeros(1))
+    worst = island_collection['dalek.fitness'].values.argmax()
+    migrated = optimizer.insert_migrants(1, island_collection)
+    assert migrated['dalek.fitness'].values[worst] == 0.
+    assert optimizer.migrants[1] is None
+
+    with pytest.raises(ValueError):
+        IslandModel(parameter_config, 30, {'name': 'cmaes'})
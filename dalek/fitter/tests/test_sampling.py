@@ -0,0 +1,122 @@
+from dalek.fitter.base import ParameterConfiguration
+from dalek.fitter.optimizers import RandomSampling
+from dalek.fitter.sampling import (SobolSampler, LatinHypercubeSampler,
+                                   MaximinSampler, UniformSampler,
+                                   random_permutation, sampler_dict)
+import numpy as np
+import pytest
+
+
+parameter_config = ParameterConfiguration(
+    ['param.{0}'.format(i) for i in xrange(5)], [[0., 1.]] * 5)
+
+
+def minimal_distance(points):
+    squared_distances = np.sum((points[:, None] - points[None]) ** 2, axis=-1)
+    np.fill_diagonal(squared_distances, np.inf)
+    return np.sqrt(squared_distances.min())
+
+
+def test_sobol_points():
+    # first points of the unscrambled sequence (Joe & Kuo direction numbers)
+    sampler = SobolSampler(parameter_config, scramble=False)
+    np.testing.assert_array_equal(
+        sampler.unit_points(np.arange(8)),
+        [[0., 0., 0., 0., 0.],
+         [0.5, 0.5, 0.5, 0.5, 0.5],
+         [0.75, 0.25, 0.25, 0.25, 0.75],
+         [0.25, 0.75, 0.75, 0.75, 0.25],
+         [0.375, 0.375, 0.625, 0.875, 0.375],
+         [0.875, 0.875, 0.125, 0.375, 0.875],
+         [0.625, 0.125, 0.875, 0.625, 0.625],
+         [0.125, 0.625, 0.375, 0.125, 0.125]])
+    # single points and blocks agree
+    np.testing.assert_array_equal(sampler.unit_points(np.arange(3, 100)),
+                                  sampler.unit_points(np.arange(100))[3:])
+    np.testing.assert_array_equal(sampler.unit_points([77]),
+                                  sampler.unit_points(np.arange(100))[77:78])
+
+
+@pytest.mark.parametrize('dimensions', [5, 60])
+def test_scrambled_sobol_stratification(dimensions):
+    config = ParameterConfiguration(
+        ['param.{0}'.format(i) for i in xrange(dimensions)],
+        [[-5., 5.]] * dimensions)
+    points = SobolSampler(config, seed=3).unit_points(np.arange(256))
+    assert np.all((points >= 0) & (points < 1))
+    for i in xrange(dimensions):
+        assert len(np.unique(np.floor(points[:, i] * 256))) == 256
+
+
+def test_latin_hypercube():
+    sampler = LatinHypercubeSampler(parameter_config, number_of_points=1000,
+                                    seed=2)
+    points = sampler.generate(2000).values
+    assert points.shape == (1000, 5)
+    for i in xrange(5):
+        assert len(np.unique(np.floor(points[:, i] * 1000))) == 1000
+
+
+def test_random_permutation():
+    permuted = random_permutation(np.arange(1000), 1000, 7)
+    np.testing.assert_array_equal(np.sort(permuted), np.arange(1000))
+    assert not np.all(permuted == np.arange(1000))
+
+
+def test_maximin():
+    sampler = MaximinSampler(parameter_config, number_of_points=50, seed=1)
+    lhs_points = LatinHypercubeSampler(
+        parameter_config, number_of_points=50, seed=1).unit_points(
+        np.arange(50))
+    points = sampler.unit_points(np.arange(50))
+    assert minimal_distance(points) > minimal_distance(lhs_points)
+    for i in xrange(5):
+        assert len(np.unique(np.floor(points[:, i] * 50))) == 50
+
+
+@pytest.mark.parametrize('sampler_name', sorted(sampler_dict.keys()))
+def test_shards_and_chunks(sampler_name):
+    sampler_class = sampler_dict[sampler_name]
+    design = sampler_class(parameter_config, number_of_points=100,
+                           seed=5).generate(100).values
+    shards = [np.vstack([chunk.values for chunk in sampler_class(
+        parameter_config, number_of_points=100, seed=5, shard_index=i,
+        number_of_shards=3).chunks(7)]) for i in xrange(3)]
+    np.testing.assert_allclose(np.vstack(shards), design)
+
+
+def test_unlimited_design():
+    sampler = UniformSampler(parameter_config, seed=1)
+    assert len(sampler.generate(10)) == 10
+    with pytest.raises(ValueError):
+        LatinHypercubeSampler(parameter_config)
+    with pytest.raises(ValueError):
+        SobolSampler(parameter_config, number_of_shards=2)
+
+
+def test_random_sampling():
+    optimizer = RandomSampling(parameter_config, 16, sampler='sobol',
+                               number_of_points=40, seed=1)
+    initial = optimizer.generate_initial_parameter_collection()
+    parameter_collection = initial.copy()
+    parameter_collection['dalek.fitness'] = 1.
+    second = optimizer(parameter_collection)
+    third = optimizer(second)
+    assert [len(initial), len(second), len(third)] == [16, 16, 8]
+    assert len(optimizer(third)) == 0
+    np.testing.assert_array_equal(
+        np.vstack((initial.values, second.values, third.values)),
+        SobolSampler(parameter_config, seed=1).unit_points(np.arange(40)))
+
+
+def test_random_sampling_resume():
+    resume_log = RandomSampling(parameter_config, 16, number_of_points=40,
+                                seed=1).generate_initial_parameter_collection()
+    optimizer = RandomSampling(parameter_config, 16, number_of_points=40,
+                               seed=1)
+    optimizer.resume_from_log(resume_log)
+    np.testing.assert_array_equal(
+        optimizer.generate_initial_parameter_collection().values,
+        SobolSampler(parameter_config, seed=1).unit_points(np.arange(16, 32)))
+    optimizer.resume_from_log(resume_log)
+    assert len(optimizer.generate_initial_parameter_collection()) == 0
@@ -0,0 +1,145 @@
+from dalek.fitter.spectral_store import SpectralStore
+from dalek.parallel.parameter_collection import ParameterCollection
+import numpy as np
+import pytest
+
+from numpy.testing import assert_allclose
+
+
+wavelength = np.linspace(3000, 9000, 50)
+
+
+def store_iterations(spectral_store, number_of_iterations=3,
+                     number_of_samples=4):
+    fluxes = np.random.uniform(size=(number_of_iterations * number_of_samples,
+                                     len(wavelength)))
+    for i in xrange(number_of_iterations):
+        indices = np.arange(i * number_of_samples, (i + 1) * number_of_samples)
+        spectral_store.store_spectra(fluxes[indices], indices,
+                                     wavelength=wavelength)
+    return fluxes
+
+
+@pytest.mark.parametrize('float32', [False, True])
+def test_store_and_read(tmpdir, float32):
+    fname = str(tmpdir.join('spectral_store.h5'))
+    spectral_store = SpectralStore(fname, float32=float32)
+    fluxes = store_iterations(spectral_store)
+    spectral_store.close()
+
+    spectral_store = SpectralStore(fname, read_only=True)
+    assert len(spectral_store) == 12
+    assert_allclose(spectral_store.wavelength, wavelength)
+    rtol = 1e-6 if float32 else 1e-12
+    assert_allclose(spectral_store.get_spectra(np.arange(12)), fluxes,
+                    rtol=rtol)
+    assert_allclose(spectral_store.get_spectra([11, 2, 7, 2]),
+                    fluxes[[11, 2, 7, 2]], rtol=rtol)
+    with pytest.raises(KeyError):
+        spectral_store.get_spectra([12])
+    spectral_store.close()
+
+
+def test_resume(tmpdir):
+    fname = str(tmpdir.join('spectral_store.h5'))
+    spectral_store = SpectralStore(fname)
+    store_iterations(spectral_store, number_of_iterations=1)
+    spectral_store.close()
+
+    with pytest.raises(IOError):
+        SpectralStore(fname)
+
+    spectral_store = SpectralStore(fname, resume=True)
+    spectral_store.store_spectra(np.ones((2, len(wavelength))), [4, 5],
+                                 wavelength=wavelength)
+    np.testing.assert_array_equal(spectral_store.log_index, np.arange(6))
+    spectral_store.close()
+
+
+def make_parameter_collection(fitness, iteration):
+    return ParameterCollection({'dalek.fitness': fitness,
+                                'dalek.current_iteration': iteration})
+
+
+def test_best_k(tmpdir):
+    spectral_store = SpectralStore(str(tmpdir.join('spectral_store.h5')),
+                                   mode='best_k', k=3)
+    all_fitness = np.random.permutation(20).astype(np.float64)
+    fluxes = np.random.uniform(size=(20, len(wavelength)))
+    for i in xrange(5):
+        indices = np.arange(4 * i, 4 * (i + 1))
+        spectral_store.store_spectra(
+            fluxes[indices], indices,
+            parameter_collection=make_parameter_collection(
+                all_fitness[indices], i),
+            wavelength=wavelength)
+        assert len(spectral_store) == 3
+
+    best_indices = np.argsort(all_fitness)[:3]
+    assert set(spectral_store.log_index) == set(best_indices)
+    assert_allclose(spectral_store.get_spectra(best_indices),
+                    fluxes[best_indices])
+
+
+def test_best_per_iteration(tmpdir):
+    spectral_store = SpectralStore(str(tmpdir.join('spectral_store.h5')),
+                                   mode='best_per_iteration')
+    fitness = np.array([3., 1., 2., 0.5, 4., 5.])
+    iterations = np.array([0, 0, 0, 1, 1, 1])
+    fluxes = np.random.uniform(size=(6, len(wavelength)))
+    # results of an iteration can arrive in several batches
+    for batch in [[0, 1], [2, 3], [4, 5]]:
+        spectral_store.store_spectra(
+            fluxes[batch], batch,
+            parameter_collection=make_parameter_collection(
+                fitness[batch], iterations[batch]),
+            wavelength=wavelength)
+
+    np.testing.assert_array_equal(spectral_store.log_index, [1, 3])
+    assert_allclose(spectral_store.fitness, [1., 0.5])
+
+    # a resumed fit continues the last iteration
+    spectral_store.h5_file_handle.close()
+    spectral_store = SpectralStore(str(tmpdir.join('spectral_store.h5')),
+                                   mode='best_per_iteration', resume=True)
+    spectral_store.store_spectra(
+        fluxes[:2], [6, 7], parameter_collection=make_parameter_collection(
+            np.array([0.2, 0.1]), np.array([1, 2])),
+        wavelength=wavelength)
+    np.testing.assert_array_equal(spectral_store.log_index, [1, 6, 7])
+    assert_allclose(spectral_store.fitness, [1., 0.2, 0.1])
+
+
+def test_thin(tmpdir):
+    spectral_store = SpectralStore(str(tmpdir.join('spectral_store.h5')),
+                                   mode='thin', thin_every=5)
+    store_iterations(spectral_store, number_of_iterations=5)
+    np.testing.assert_array_equal(spectral_store.log_index, [0, 5, 10, 15])
+
+
+def test_missing_spectra(tmpdir):
+    spectral_store = SpectralStore(str(tmpdir.join('spectral_store.h5')))
+    fluxes = np.random.uniform(size=(3, len(wavelength))).astype(np.float32)
+    spectral_store.store_spectra([fluxes[0], None, fluxes[2]], [0, 1, 2],
+                                 wavelength=wavelength)
+    spectral_store.store_spectra([None], [3])
+    assert len(spectral_store) == 2
+    assert_allclose(spectral_store.get_spectra([0, 2]), fluxes[[0, 2]])
+    with pytest.raises(KeyError):
+        spectral_store.get_spectra([1])
+    spectral_store.close()
+
+
+def test_rescore(tmpdir):
+    class MeanFluxFitnessFunction(object):
+        def evaluate_fluxes(self, wavelength, fluxes):
+            assert len(wavelength) == fluxes.shape[1]
+            return fluxes.mean(axis=1)
+
+    spectral_store = SpectralStore(str(tmpdir.join('spectral_store.h5')))
+    fluxes = store_iterations(spectral_store)
+    fitness_function = MeanFluxFitnessFunction()
+    assert_allclose(spectral_store.rescore(fitness_function, chunk_size=5),
+                    fluxes.mean(axis=1))
+    assert_allclose(spectral_store.rescore(fitness_function, [7, 3]),
+                    fluxes[[7, 3]].mean(axis=1))
@@ -0,0 +1,71 @@
+from dalek.fitter.base import ParameterConfiguration
+from dalek.fitter.optimizers import DEOptimizer
+from dalek.fitter.surrogate import GaussianProcessSurrogate, SurrogateOptimizer
+from dalek.parallel.parameter_collection import ParameterCollection
+import numpy as np
+import pytest
+
+
+parameter_config = ParameterConfiguration(['param.x', 'param.y'],
+                                          [[-5., 5.], [-5., 5.]])
+
+
+def sphere(parameters):
+    return np.sum(parameters ** 2, axis=1)
+
+
+def test_surrogate_prediction():
+    np.random.seed(250880)
+    surrogate = GaussianProcessSurrogate(parameter_config)
+    parameters = np.random.uniform(-5, 5, size=(200, 2))
+    fitness = sphere(parameters)
+    fitness[:10] = np.nan
+    surrogate.add(parameters, fitness)
+    assert len(surrogate) == 190
+
+    test_parameters = np.random.uniform(-4, 4, size=(50, 2))
+    mean, std = surrogate.predict(test_parameters)
+    np.testing.assert_allclose(mean, sphere(test_parameters), atol=0.5)
+    # far less certain outside of the sampled region
+    assert std.max() < surrogate.predict([[50., 50.]])[1][0]
+
+
+def test_surrogate_training_subset():
+    np.random.seed(250880)
+    surrogate = GaussianProcessSurrogate(parameter_config,
+                                         max_training_points=100)
+    parameters = np.random.uniform(-5, 5, size=(10000, 2))
+    fitness = sphere(parameters)
+    for i in xrange(0, 10000, 1000):
+        surrogate.add(parameters[i:i + 1000], fitness[i:i + 1000])
+    indices = surrogate.training_indices()
+    assert len(indices) <= 100
+    assert np.argmin(fitness) in indices
+    assert 9999 in indices
+
+
+def test_failed_rows_are_ignored():
+    surrogate = GaussianProcessSurrogate(parameter_config)
+    parameter_collection = ParameterCollection(
+        [[0., 0., 1., False], [1., 1., 1e10, True], [2., 2., 8., False]],
+        columns=['param.x', 'param.y', 'dalek.fitness', 'dalek.failed'])
+    surrogate.add_parameter_collection(parameter_collection)
+    assert len(surrogate) == 2
+
+
+def test_surrogate_optimizer():
+    np.random.seed(250880)
+    optimizer = SurrogateOptimizer(
+        parameter_config, 5, DEOptimizer(parameter_config, 20, seed=250880),
+        oversampling=4, seed=250880)
+    parameter_collection = ParameterCollection(
+        np.random.uniform(-5, 5, size=(5, 2)),
+        columns=parameter_config.parameter_names)
+    for _ in xrange(30):
+        parameter_collection['dalek.fitness'] = sphere(
+            parameter_collection[parameter_config.parameter_names].values)
+        parameter_collection = optimizer(parameter_collection)
+        assert len(parameter_collection) == 5
+        assert 'dalek.predicted_fitness' in parameter_collection.columns
+
+    assert optimizer.surrogate.fitness.min() < 1e-2
@@ -0,0 +1,72 @@
+from dalek.fitter.base import ParameterConfiguration
+from dalek.fitter.transforms import (AbundanceTransform, LogRatioTransform,
+                                     helmert_basis)
+from dalek.parallel.parameter_collection import ParameterCollection
+import numpy as np
+import pytest
+
+
+abundance_names = ['model.abundances.{0}'.format(element)
+                   for element in ['O', 'C', 'Si', 'Ca']]
+parameter_config = ParameterConfiguration(
+    ['model.v_inner'] + abundance_names,
+    [[1e4, 2e4], [0.2, 0.9], [0., 0.5], [0.01, 0.5], [0., 0.1]])
+
+
+def test_helmert_basis():
+    basis = helmert_basis(5)
+    np.testing.assert_almost_equal(np.dot(basis.T, basis), np.eye(4))
+    np.testing.assert_almost_equal(basis.sum(axis=0), 0.)
+
+
+@pytest.mark.parametrize('method', ['ilr', 'alr'])
+def test_log_ratio_round_trip(method):
+    transform = LogRatioTransform(abundance_names, [0.] * 4, [1.] * 4,
+                                  method=method)
+    abundances = np.random.RandomState(1).dirichlet(np.ones(4), size=20)
+    coordinates = transform.forward(abundances)
+    assert coordinates.shape == (20, 3)
+    np.testing.assert_almost_equal(transform.inverse(coordinates), abundances)
+    # unnormalized abundances have the same coordinates
+    np.testing.assert_almost_equal(transform.forward(abundances * 3.),
+                                   coordinates)
+    bounds = transform.coordinate_bounds
+    assert np.all((coordinates >= bounds[:, 0]) & (coordinates <= bounds[:, 1]))
+
+
+def test_projection():
+    transform = LogRatioTransform(abundance_names, parameter_config.lbounds[1:],
+                                  parameter_config.ubounds[1:])
+    abundances = np.random.RandomState(2).dirichlet(np.ones(4) * 0.3,
+                                                     size=100)
+    projected = transform.project(abundances)
+    np.testing.assert_almost_equal(projected.sum(axis=1), 1.)
+    assert np.all(projected >= transform.lbounds * (1 - 1e-12))
+    assert np.all(projected <= transform.ubounds * (1 + 1e-12))
+    # abundances within the bounds stay unchanged
+    inside = np.array([[0.5, 0.2, 0.25, 0.05]])
+    np.testing.assert_almost_equal(transform.project(inside), inside)
+
+
+def test_abundance_transform():
+    abundance_transform = AbundanceTransform(parameter_config)
+    assert abundance_transform.search_config.parameter_names == [
+        'model.v_inner', 'dalek.ilr.0.0', 'dalek.ilr.0.1', 'dalek.ilr.0.2']
+
+    # initial collection in the physical space gets the coordinates
+    parameter_collection = ParameterCollection(
+        [[1.5e4, 1., 0.4, 0.5, 0.1]], columns=parameter_config.parameter_names)
+    completed = abundance_transform.complete(parameter_collection)
+    np.testing.assert_almost_equal(completed[abundance_names].values,
+                                   [[0.5, 0.2, 0.25, 0.05]])
+
+    # a proposal of the optimizer gets the abundances
+    proposal = completed[abundance_transform.search_config.parameter_names]
+    proposal['dalek.ilr.0.0'] += 0.1
+    completed_proposal = abundance_transform.complete(proposal)
+    # the first coordinate is the log ratio of O and C
+    assert completed_proposal['model.abundances.O'].values[0] > 0.5
+    assert completed_proposal['model.abundances.C'].values[0] < 0.2
+    np.testing.assert_almost_equal(
+        completed_proposal[abundance_names].values.sum(axis=1), 1.)
+    assert completed_proposal['model.v_inner'].values[0] == 1.5e4
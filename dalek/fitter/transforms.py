@@ -0,0 +1,244 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def helmert_basis(number_of_components):
+    """
+    Orthonormal basis of the subspace of vectors summing to zero (the
+    contrasts of the isometric log-ratio transform)
+
+    Returns
+    -------
+        : ~np.ndarray
+        (number_of_components, number_of_components - 1)
+    """
+    basis = np.zeros((number_of_components, number_of_components - 1))
+    for j in xrange(1, number_of_components):
+        basis[:j, j - 1] = 1. / j
+        basis[j, j - 1] = -1.
+        basis[:, j - 1] *= np.sqrt(j / (j + 1.))
+    return basis
+
+
+class LogRatioTransform(object):
+    """
+    Log-ratio transform of one group of abundances summing to one to an
+    unconstrained space with one dimension less - additive ('alr', the
+    logarithms of the ratios to the last abundance) or isometric ('ilr',
+    the centred logarithms projected onto an orthonormal basis)
+
+    Parameters
+    ----------
+
+    abundance_names: ~list of ~str
+
+    lbounds: ~np.ndarray
+        lower bounds of the normalized abundances
+
+    ubounds: ~np.ndarray
+        upper bounds of the normalized abundances
+
+    method: ~str
+        'ilr' or 'alr' [default='ilr']
+
+    min_abundance: ~float
+        lower bounds below this (e.g. 0) are raised to it, as the logarithm
+        of 0 is not defined [default=1e-10]
+    """
+
+    def __init__(self, abundance_names, lbounds, ubounds, method='ilr',
+                 min_abundance=1e-10):
+        if method not in ('ilr', 'alr'):
+            raise ValueError('Unknown log-ratio transform {0} - allowed are '
+                             'ilr and alr'.format(method))
+        if len(abundance_names) < 2:
+            raise ValueError('A log-ratio transform needs at least two '
+                             'abundances')
+        self.abundance_names = list(abundance_names)
+        self.method = method
+        self.lbounds = np.maximum(np.array(lbounds, dtype=np.float64),
+                                  min_abundance)
+        self.ubounds = np.minimum(np.array(ubounds, dtype=np.float64), 1.)
+        if self.lbounds.sum() > 1 or self.ubounds.sum() < 1:
+            raise ValueError('No abundances of {0} within their bounds sum '
+                             'to one'.format(', '.join(abundance_names)))
+
+        number_of_components = len(self.abundance_names)
+        if method == 'ilr':
+            self.basis = helmert_basis(number_of_components)
+        else:
+            self.basis = np.vstack((np.eye(number_of_components - 1),
+                                    -np.ones(number_of_components - 1)))
+
+    def __len__(self):
+        return len(self.abundance_names) - 1
+
+    def forward(self, abundances):
+        """
+        Coordinates of abundances (normalized before the transform)
+
+        Parameters
+        ----------
+
+        abundances: ~np.ndarray
+            (number of rows, number of abundances)
+
+        Returns
+        -------
+            : ~np.ndarray
+            (number of rows, number of abundances - 1)
+        """
+        log_abundances = np.log(np.maximum(
+            np.asarray(abundances, dtype=np.float64), self.lbounds))
+        # the basis vectors sum to zero - the normalization drops out
+        return np.dot(log_abundances, self.basis)
+
+    def inverse(self, coordinates):
+        """
+        Normalized abundances of coordinates
+        """
+        if self.method == 'ilr':
+            log_abundances = np.dot(coordinates, self.basis.T)
+        else:
+            log_abundances = np.hstack((coordinates,
+                                        np.zeros((len(coordinates), 1))))
+        log_abundances -= log_abundances.max(axis=1)[:, None]
+        abundances = np.exp(log_abundances)
+        return abundances / abundances.sum(axis=1)[:, None]
+
+    def project(self, abundances, iterations=60):
+        """
+        Closest abundances within the bounds that sum to one in the sense
+        of clip(scale * abundances, lbounds, ubounds) - the scale is found
+        by bisection for every row
+        """
+        abundances = np.asarray(abundances, dtype=np.float64)
+        log_scale_low = np.ones(len(abundances)) * -50.
+        log_scale_high = np.ones(len(abundances)) * 50.
+        for _ in xrange(iterations):
+            log_scale = 0.5 * (log_scale_low + log_scale_high)
+            total = np.clip(abundances * np.exp(log_scale)[:, None],
+                            self.lbounds, self.ubounds).sum(axis=1)
+            too_large = total > 1
+            log_scale_high[too_large] = log_scale[too_large]
+            log_scale_low[~too_large] = log_scale[~too_large]
+        projected = np.clip(
+            abundances * np.exp(0.5 * (log_scale_low + log_scale_high))[:, None],
+            self.lbounds, self.ubounds)
+        return projected / projected.sum(axis=1)[:, None]
+
+    @property
+    def coordinate_bounds(self):
+        """
+        Box in the coordinate space containing all abundances within their
+        bounds
+
+        Returns
+        -------
+            : ~np.ndarray
+            (number of coordinates, 2)
+        """
+        log_lbounds = np.log(self.lbounds)[:, None] * self.basis
+        log_ubounds = np.log(self.ubounds)[:, None] * self.basis
+        return np.vstack((np.minimum(log_lbounds, log_ubounds).sum(axis=0),
+                          np.maximum(log_lbounds, log_ubounds).sum(axis=0))).T
+
+
+class AbundanceTransform(object):
+    """
+    Search space of the optimizer in which every group of abundances is
+    replaced by its log-ratio coordinates (columns 'dalek.<method>.<group
+    index>.<coordinate index>'), so the optimizer does not waste moves on the
+    redundant normalization direction. The fitter completes every parameter
+    collection with `complete` before it is evaluated: the abundances are
+    computed from the coordinates, projected into their bounds and the
+    coordinates are updated to the projected abundances.
+
+    Parameters
+    ----------
+
+    parameter_config: ~dalek.fitter.ParameterConfiguration
+        the parameters of the TARDIS configuration
+
+    method: ~str
+        'ilr' or 'alr' [default='ilr']
+
+    groups: ~list of ~list of ~str
+        groups of abundance parameters that sum to one [default=None - all
+        parameters starting with 'model.abundances' form one group]
+
+    min_abundance: ~float
+        [default=1e-10]
+    """
+
+    def __init__(self, parameter_config, method='ilr', groups=None,
+                 min_abundance=1e-10):
+        self.parameter_config = parameter_config
+        parameter_names = list(parameter_config.parameter_names)
+        if groups is None:
+            groups = [[name for name in parameter_names
+                       if name.startswith('model.abundances')]]
+
+        self.transforms = []
+        self.coordinate_names = []
+        for group_index, group in enumerate(groups):
+            indices = [parameter_names.index(name) for name in group]
+            self.transforms.append(LogRatioTransform(
+                group, parameter_config.lbounds[indices],
+                parameter_config.ubounds[indices], method=method,
+                min_abundance=min_abundance))
+            self.coordinate_names.append(
+                ['dalek.{0}.{1:d}.{2:d}'.format(method, group_index, i)
+                 for i in xrange(len(group) - 1)])
+
+        abundance_names = set(name for group in groups for name in group)
+        search_names = [name for name in parameter_names
+                        if name not in abundance_names]
+        search_bounds = [parameter_config.parameter_bounds[
+                             parameter_names.index(name)]
+                         for name in search_names]
+        for transform, coordinate_names in zip(self.transforms,
+                                               self.coordinate_names):
+            search_names += coordinate_names
+            search_bounds += list(transform.coordinate_bounds)
+        # the same ParameterConfiguration class as the physical parameters
+        self.search_config = type(parameter_config)(search_names,
+                                                    search_bounds)
+
+    def complete(self, parameter_collection):
+        """
+        Add the missing side of the transform: with coordinate columns the
+        abundances (projected into their bounds) are computed from them,
+        otherwise the coordinates of the (normalized) abundances
+
+        Parameters
+        ----------
+
+        parameter_collection: ~dalek.parallel.ParameterCollection
+
+        Returns
+        -------
+            : ~dalek.parallel.ParameterCollection
+        """
+        parameter_collection = parameter_collection.copy()
+        for transform, coordinate_names in zip(self.transforms,
+                                               self.coordinate_names):
+            if all(name in parameter_collection.columns
+                   for name in coordinate_names):
+                abundances = transform.inverse(
+                    parameter_collection[coordinate_names].values.astype(
+                        np.float64))
+            else:
+                abundances = parameter_collection[
+                    transform.abundance_names].values.astype(np.float64)
+                abundances /= abundances.sum(axis=1)[:, None]
+            abundances = transform.project(abundances)
+            coordinates = transform.forward(abundances)
+            for i, name in enumerate(transform.abundance_names):
+                parameter_collection[name] = abundances[:, i]
+            for i, name in enumerate(coordinate_names):
+                parameter_collection[name] = coordinates[:, i]
+        return parameter_collection
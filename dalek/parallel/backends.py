@@ -0,0 +1,518 @@
+import logging
+import marshal
+import multiprocessing
+import os
+import types
+from abc import ABCMeta, abstractmethod
+from datetime import datetime, timedelta
+from time import time
+
+from dalek.parallel.util import set_engines_cpu_affinity
+
+logger = logging.getLogger(__name__)
+
+
+def get_hostname():
+    import socket
+    return socket.gethostname()
+
+
+def group_engines(engine_hosts, number_of_groups=None):
+    """
+    Split engines into groups that follow the node boundaries: the engines
+    are ordered by host and split into contiguous groups of (nearly) equal
+    size, so with one group per node (or a number of groups dividing the
+    number of nodes) no group spans two nodes
+
+    Parameters
+    ----------
+
+    engine_hosts: ~dict
+        {engine id: host name}
+
+    number_of_groups: ~int
+        [default=None - one group per host]
+
+    Returns
+    -------
+        : ~list of ~list of engine ids
+    """
+    hosts = sorted(set(engine_hosts.values()))
+    if number_of_groups is None:
+        return [sorted([engine_id for engine_id, host in engine_hosts.items()
+                        if host == current_host]) for current_host in hosts]
+    if number_of_groups > len(engine_hosts):
+        raise ValueError('Can not split {0} engines into {1} groups'.format(
+            len(engine_hosts), number_of_groups))
+    engine_ids = sorted(engine_hosts,
+                        key=lambda engine_id: (engine_hosts[engine_id],
+                                               engine_id))
+    boundaries = [int(round(i * len(engine_ids) / float(number_of_groups)))
+                  for i in xrange(number_of_groups + 1)]
+    return [engine_ids[start:stop]
+            for start, stop in zip(boundaries[:-1], boundaries[1:])]
+
+
+class BaseBackend(object):
+    """
+    Base class for the execution backends of the launchers. A backend knows
+    how to make objects resident on its workers and how to run a worker
+    function on them.
+
+    The result objects returned by `apply` and `map` follow the interface of
+    IPython's `AsyncResult` and `AsyncMapResult` as far as it is used by dalek
+    (`ready`, `wait`, `get`, `progress`, `result`, `metadata` and `msg_ids`).
+    """
+    __metaclass__ = ABCMeta
+
+    # whether `apply_excluding` can avoid workers and the results of
+    # abandoned tasks can be aborted - needed for timeouts and retries
+    supports_fault_tolerance = False
+
+    @abstractmethod
+    def push(self, namespace):
+        """
+        Make the objects in namespace available as global variables on all
+        workers
+
+        Parameters
+        ----------
+
+        namespace: ~dict
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def execute(self, statement):
+        """
+        Execute statement (e.g. an import) in the namespace of all workers
+
+        Parameters
+        ----------
+
+        statement: ~str
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def apply(self, worker, *args, **kwargs):
+        """
+        Run worker(*args, **kwargs) on the next free worker
+
+        Returns
+        -------
+            : result object with an `AsyncResult` interface
+        """
+        raise NotImplementedError
+
+    def apply_excluding(self, excluded_engine_ids, worker, *args, **kwargs):
+        """
+        Run worker(*args, **kwargs) on a free worker that is not in
+        excluded_engine_ids (if the backend can choose its workers)
+
+        Returns
+        -------
+            : result object with an `AsyncResult` interface
+        """
+        return self.apply(worker, *args, **kwargs)
+
+    def map(self, worker, sequence, **kwargs):
+        """
+        Run worker on every item of sequence
+
+        Returns
+        -------
+            : result object with an `AsyncMapResult` interface
+        """
+        return AsyncMapResultList([self.apply(worker, item, **kwargs)
+                                   for item in sequence])
+
+    def set_cpu_affinity(self):
+        """
+        Make sure the workers can run on all CPUs of their node
+        """
+        pass
+
+    def clean(self, result):
+        """
+        Remove all bookkeeping the backend holds for result
+        """
+        pass
+
+    def engine_groups(self, number_of_groups=None):
+        """
+        Groups of workers (e.g. one per node) - backends that can not choose
+        the worker of a task return groups of None, which `restrict` maps to
+        the whole backend
+
+        Parameters
+        ----------
+
+        number_of_groups: ~int
+            [default=None - one group per node]
+
+        Returns
+        -------
+            : ~list
+        """
+        return [None] * (number_of_groups or 1)
+
+    def restrict(self, engine_ids):
+        """
+        Backend that only runs tasks on the workers engine_ids
+
+        Parameters
+        ----------
+
+        engine_ids: ~list or None
+            an entry of `engine_groups`, None for all workers
+        """
+        return self
+
+    @abstractmethod
+    def __len__(self):
+        raise NotImplementedError
+
+
+class IPythonBackend(BaseBackend):
+    """
+    Backend running the workers on the engines of an IPython cluster through
+    a load balanced view
+
+    Parameters
+    ----------
+
+    remote_clients: ~IPython.parallel.Client
+        IPython remote clients
+
+    targets: ~list of ~int
+        engine ids the tasks are balanced over [default=None - all engines]
+    """
+
+    supports_fault_tolerance = True
+
+    def __init__(self, remote_clients, targets=None):
+        self.remote_clients = remote_clients
+        self.targets = targets
+        self.lbv = remote_clients.load_balanced_view(targets)
+
+    def push(self, namespace):
+        self.remote_clients.block = True
+        for client in self.remote_clients:
+            for key, value in namespace.items():
+                client[key] = value
+        self.remote_clients.block = False
+
+    def execute(self, statement):
+        self.remote_clients.block = True
+        for client in self.remote_clients:
+            client.execute(statement)
+        self.remote_clients.block = False
+
+    def apply(self, worker, *args, **kwargs):
+        return self.lbv.apply(worker, *args, **kwargs)
+
+    def apply_excluding(self, excluded_engine_ids, worker, *args, **kwargs):
+        targets = [engine_id for engine_id in
+                   (self.targets or self.remote_clients.ids)
+                   if engine_id not in excluded_engine_ids]
+        if len(targets) == 0:
+            targets = None
+        with self.lbv.temp_flags(targets=targets):
+            return self.lbv.apply(worker, *args, **kwargs)
+
+    def map(self, worker, sequence, **kwargs):
+        return self.lbv.map(worker, sequence, **kwargs)
+
+    def set_cpu_affinity(self):
+        for client in self.remote_clients:
+            client.apply(set_engines_cpu_affinity)
+
+    def clean(self, result):
+        for msg_id in result.msg_ids:
+            if msg_id in self.lbv.results:
+                del self.lbv.results[msg_id]
+
+            if msg_id in self.remote_clients.results:
+                del self.remote_clients.results[msg_id]
+
+            if msg_id in self.remote_clients.metadata:
+                del self.remote_clients.metadata[msg_id]
+
+    def engine_groups(self, number_of_groups=None):
+        engine_ids = self.targets or self.remote_clients.ids
+        hostnames = self.remote_clients[engine_ids].apply_sync(get_hostname)
+        return group_engines(dict(zip(engine_ids, hostnames)),
+                             number_of_groups)
+
+    def restrict(self, engine_ids):
+        if engine_ids is None:
+            return self
+        return IPythonBackend(self.remote_clients, targets=list(engine_ids))
+
+    def __len__(self):
+        if self.targets is not None:
+            return len(self.targets)
+        return len(self.remote_clients)
+
+
+# namespace of a local worker process - this takes the role of the user
+# namespace of an IPython engine
+_local_namespace = {'__builtins__': __builtins__}
+_local_functions = {}
+
+
+def _initialize_local_worker(namespace, statements):
+    for key, value in namespace.items():
+        if isinstance(value, types.FunctionType):
+            # pushed functions run in the worker namespace (like interactive
+            # functions pushed to an IPython engine)
+            value = types.FunctionType(value.__code__, _local_namespace,
+                                       value.__name__, value.__defaults__)
+        _local_namespace[key] = value
+    for statement in statements:
+        exec(statement, _local_namespace)
+
+
+def _dump_function(function):
+    return (function.__name__, marshal.dumps(function.__code__),
+            function.__defaults__)
+
+
+def _load_function(function_dump):
+    if function_dump not in _local_functions:
+        name, code, defaults = function_dump
+        _local_functions[function_dump] = types.FunctionType(
+            marshal.loads(code), _local_namespace, name, defaults)
+    return _local_functions[function_dump]
+
+
+def _run_local_task(function_dump, args, kwargs):
+    worker = _load_function(function_dump)
+    started = datetime.now()
+    result = worker(*args, **kwargs)
+    metadata = {'started': started, 'completed': datetime.now(),
+                'engine_id': os.getpid()}
+    return result, metadata
+
+
+class LocalAsyncResult(object):
+    """
+    Wrapper around a `multiprocessing` result with the interface of IPython's
+    `AsyncResult` for a single task
+    """
+
+    msg_ids = []
+
+    def __init__(self, async_result):
+        self.async_result = async_result
+        self._metadata = None
+
+    def ready(self):
+        return self.async_result.ready()
+
+    def successful(self):
+        return self.async_result.successful()
+
+    def wait(self, timeout=None):
+        self.async_result.wait(timeout)
+
+    def get(self, timeout=None):
+        result, self._metadata = self.async_result.get(timeout)
+        return result
+
+    @property
+    def progress(self):
+        return int(self.ready())
+
+    @property
+    def result(self):
+        return self.get()
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self.get()
+        return self._metadata
+
+    def __len__(self):
+        return 1
+
+
+class AsyncMapResultList(object):
+    """
+    Combines a list of single task results into an object with the interface
+    of IPython's `AsyncMapResult`
+    """
+
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def msg_ids(self):
+        return [msg_id for result in self.results
+                for msg_id in result.msg_ids]
+
+    @property
+    def progress(self):
+        return sum([result.ready() for result in self.results])
+
+    def ready(self):
+        return self.progress == len(self)
+
+    def wait(self, timeout=None):
+        start_time = time()
+        for result in self.results:
+            if timeout is None:
+                result.wait()
+            else:
+                remaining_time = timeout - (time() - start_time)
+                if remaining_time <= 0:
+                    break
+                result.wait(remaining_time)
+
+    def get(self, timeout=None):
+        self.wait(timeout)
+        return self.result
+
+    @property
+    def result(self):
+        return [result.get() for result in self.results]
+
+    @property
+    def metadata(self):
+        return [result.metadata for result in self.results]
+
+    def __len__(self):
+        return len(self.results)
+
+
+class ChunkedMapResult(object):
+    """
+    Presents the result of mapping `chunked_worker` over chunks of tasks as
+    an `AsyncMapResult` of the individual tasks. The worker returns a list of
+    (result, seconds) tuples per chunk from which the start and end time of
+    every task is reconstructed.
+
+    Parameters
+    ----------
+
+    chunk_result:
+        `AsyncMapResult` like result of the chunks
+
+    chunk_sizes: ~list of ~int
+        number of tasks in each chunk
+    """
+
+    def __init__(self, chunk_result, chunk_sizes):
+        self.chunk_result = chunk_result
+        self.chunk_sizes = chunk_sizes
+
+    @property
+    def msg_ids(self):
+        return self.chunk_result.msg_ids
+
+    @property
+    def progress(self):
+        finished_chunks = self.chunk_result.progress
+        return sum(self.chunk_sizes[:finished_chunks])
+
+    def ready(self):
+        return self.chunk_result.ready()
+
+    def wait(self, timeout=None):
+        self.chunk_result.wait(timeout)
+
+    def get(self, timeout=None):
+        self.wait(timeout)
+        return self.result
+
+    @property
+    def result(self):
+        return [result for chunk in self.chunk_result.result
+                for result, _ in chunk]
+
+    @property
+    def metadata(self):
+        metadata = []
+        for chunk, chunk_metadata in zip(self.chunk_result.result,
+                                         self.chunk_result.metadata):
+            started = chunk_metadata['started']
+            for _, seconds in chunk:
+                completed = started + timedelta(seconds=seconds)
+                item_metadata = dict(chunk_metadata)
+                item_metadata.update({'started': started,
+                                      'completed': completed})
+                metadata.append(item_metadata)
+                started = completed
+        return metadata
+
+    def __len__(self):
+        return sum(self.chunk_sizes)
+
+
+class LocalBackend(BaseBackend):
+    """
+    Backend running the workers in a pool of local processes. Objects pushed
+    to the backend stay resident in every worker process (they are inherited
+    when the pool is forked) and the worker functions are executed in that
+    namespace, just like functions decorated with `interactive` are on an
+    IPython engine.
+
+    Parameters
+    ----------
+
+    n_processes: ~int
+        number of worker processes [default: number of CPUs]
+
+    Notes
+    -----
+
+    A task that hangs can not be aborted without terminating the whole pool,
+    so the fault tolerance of the `~dalek.parallel.launcher.FitterLauncher`
+    (timeouts, retries and speculation) is not available.
+    """
+
+    def __init__(self, n_processes=None):
+        if n_processes is None:
+            n_processes = multiprocessing.cpu_count()
+        self.n_processes = n_processes
+        self.namespace = {}
+        self.statements = []
+        self.pool = None
+
+    def start_pool(self):
+        self.stop_pool()
+        logger.info('Starting {0} local worker processes'.format(
+            self.n_processes))
+        self.pool = multiprocessing.Pool(
+            self.n_processes, initializer=_initialize_local_worker,
+            initargs=(self.namespace, self.statements))
+
+    def stop_pool(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def push(self, namespace):
+        self.namespace.update(namespace)
+        if self.pool is not None:
+            self.start_pool()
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        if self.pool is not None:
+            self.start_pool()
+
+    def apply(self, worker, *args, **kwargs):
+        if self.pool is None:
+            self.start_pool()
+        return LocalAsyncResult(self.pool.apply_async(
+            _run_local_task, (_dump_function(worker), args, kwargs)))
+
+    def __len__(self):
+        return self.n_processes
+
+    def __del__(self):
+        self.stop_pool()
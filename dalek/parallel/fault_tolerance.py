@@ -0,0 +1,301 @@
+import logging
+from datetime import datetime
+from time import time, sleep
+
+logger = logging.getLogger(__name__)
+
+
+class ResilientTask(object):
+    """
+    A task that survives failing and hanging engines. It has the interface of
+    IPython's `AsyncResult` - every call to `ready` (or `poll`) checks the
+    running attempts:
+
+    - an attempt that raised is resubmitted (excluding the engine it failed
+      on) until max_retries is exhausted
+    - an attempt running longer than timeout is abandoned and resubmitted in
+      the same way (excluding the engine it hangs on)
+    - once an attempt finished, the other (speculative) attempts are aborted
+    - if all attempts failed the task finishes with failure_result and the
+      metadata entry 'failed' set to True
+
+    The msg_ids of all attempts are kept until the task is cleaned.
+
+    Parameters
+    ----------
+
+    submit: func
+        submit(task, excluded_engine_ids) submits task and returns an
+        `AsyncResult` like object
+
+    task:
+        argument passed to submit (e.g. a configuration dict)
+
+    timeout: ~float
+        seconds an attempt may run before it is abandoned [default=None - no
+        timeout]
+
+    max_retries: ~int
+        number of resubmissions after failures or timeouts [default=0]
+
+    failure_result:
+        result of the task if all attempts failed [default=None]
+
+    queued: ~bool
+        if True the timeout clock of an attempt only starts with
+        `mark_started` (used by `ResilientMapResult` for tasks waiting for a
+        free engine) [default=False]
+    """
+
+    def __init__(self, submit, task, timeout=None, max_retries=0,
+                 failure_result=None, queued=False):
+        self.submit = submit
+        self.task = task
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.failure_result = failure_result
+        self.queued = queued
+
+        self.attempts = []
+        self.abandoned_attempts = []
+        self.excluded_engine_ids = []
+        self.retries = 0
+        self.speculated = False
+        self.done = False
+        self.failed = False
+        self._result = None
+        self._metadata = None
+        self.submitted = datetime.now()
+        self.launch()
+
+    def launch(self):
+        """
+        Submit a new attempt of the task
+        """
+        started = None if self.queued else time()
+        self.attempts.append([self.submit(self.task, self.excluded_engine_ids),
+                              started])
+
+    def mark_started(self):
+        """
+        Start the timeout clock of attempts that are now assumed to run
+        """
+        for attempt in self.attempts:
+            if attempt[1] is None:
+                attempt[1] = time()
+
+    @property
+    def running(self):
+        return not self.done and len(self.attempts) > 0
+
+    def speculate(self):
+        """
+        Submit a duplicate of a running task (only once) - whichever attempt
+        finishes first provides the result
+        """
+        if self.running and not self.speculated:
+            logger.info('Speculatively resubmitting a straggling task')
+            self.speculated = True
+            self.queued = False
+            self.launch()
+
+    def poll(self):
+        if self.done:
+            return
+
+        for attempt in list(self.attempts):
+            async_result, started = attempt
+            if not async_result.ready():
+                continue
+            try:
+                result = async_result.get(0)
+            except Exception as e:
+                engine_id = self._engine_id(async_result)
+                logger.warning('Task failed on engine {0}: {1}'.format(
+                    engine_id, e))
+                self.abandon(attempt)
+                continue
+            for other_attempt in list(self.attempts):
+                if other_attempt is not attempt:
+                    # the losing attempt of a speculative pair
+                    self.abandon(other_attempt, exclude_engine=False)
+            self._finish(result, dict(async_result.metadata))
+            return
+
+        if self.timeout is not None:
+            for attempt in list(self.attempts):
+                async_result, started = attempt
+                if started is not None and time() - started > self.timeout:
+                    logger.warning('Task timed out after {0} s on engine '
+                                   '{1}'.format(self.timeout,
+                                                self._engine_id(async_result)))
+                    self.abandon(attempt)
+
+        if len(self.attempts) == 0:
+            if self.retries < self.max_retries:
+                self.retries += 1
+                logger.info('Retrying task (retry {0} of {1})'.format(
+                    self.retries, self.max_retries))
+                self.queued = False
+                self.launch()
+            else:
+                logger.warning('Task failed {0} times - giving up'.format(
+                    self.retries + 1))
+                self.failed = True
+                self._finish(self.failure_result,
+                             {'started': self.submitted,
+                              'completed': datetime.now(),
+                              'engine_id': -1})
+
+    def abandon(self, attempt, exclude_engine=True):
+        """
+        Give up on an attempt: it is aborted if it did not finish, its engine
+        is excluded from the retries and its msg_ids are kept so the backend
+        can clean its results together with the task
+        """
+        async_result, _ = attempt
+        self.attempts.remove(attempt)
+        self.abandoned_attempts.append(async_result)
+        engine_id = self._engine_id(async_result)
+        if exclude_engine and engine_id is not None:
+            self.excluded_engine_ids.append(engine_id)
+        if not async_result.ready():
+            try:
+                async_result.abort()
+            except Exception:
+                # running tasks (or results without abort) can not be aborted
+                pass
+
+    @staticmethod
+    def _engine_id(async_result):
+        try:
+            return async_result.metadata['engine_id']
+        except Exception:
+            return None
+
+    def _finish(self, result, metadata):
+        self.done = True
+        self._result = result
+        metadata['failed'] = self.failed
+        metadata['attempts'] = self.retries + 1
+        self._metadata = metadata
+
+    def ready(self):
+        self.poll()
+        return self.done
+
+    def wait(self, timeout=None):
+        start_time = time()
+        while not self.ready():
+            if timeout is not None and time() - start_time > timeout:
+                break
+            sleep(0.05)
+
+    def get(self, timeout=None):
+        self.wait(timeout)
+        if not self.done:
+            raise RuntimeError('Task not finished within {0} s'.format(
+                timeout))
+        return self._result
+
+    @property
+    def progress(self):
+        return int(self.ready())
+
+    @property
+    def result(self):
+        return self.get()
+
+    @property
+    def metadata(self):
+        self.wait()
+        return self._metadata
+
+    @property
+    def msg_ids(self):
+        return [msg_id for async_result, _ in self.attempts
+                for msg_id in async_result.msg_ids] + [
+            msg_id for async_result in self.abandoned_attempts
+            for msg_id in async_result.msg_ids]
+
+    def __len__(self):
+        return 1
+
+
+class ResilientMapResult(object):
+    """
+    Batch of `ResilientTask` with the interface of IPython's
+    `AsyncMapResult`. The engines are assumed to work through the batch in
+    order, so the timeout clock of a task starts when it is among the first
+    number_of_workers unfinished tasks. Once the fraction
+    speculation_threshold of the batch is done, duplicates of the tasks still
+    running are submitted.
+
+    Parameters
+    ----------
+
+    tasks: ~list of ~ResilientTask
+        tasks created with queued=True
+
+    number_of_workers: ~int
+        number of engines working on the batch
+
+    speculation_threshold: ~float
+        fraction of finished tasks after which stragglers are duplicated
+        [default=None - no speculative execution]
+    """
+
+    def __init__(self, tasks, number_of_workers, speculation_threshold=None):
+        self.tasks = tasks
+        self.number_of_workers = number_of_workers
+        self.speculation_threshold = speculation_threshold
+
+    def poll(self):
+        unfinished_tasks = [task for task in self.tasks if not task.done]
+        for task in unfinished_tasks[:self.number_of_workers]:
+            task.mark_started()
+        for task in unfinished_tasks:
+            task.poll()
+
+        if (self.speculation_threshold is not None and
+                self.progress_fraction >= self.speculation_threshold):
+            for task in self.tasks:
+                task.speculate()
+
+    @property
+    def progress_fraction(self):
+        return sum([task.done for task in self.tasks]) / float(len(self))
+
+    @property
+    def progress(self):
+        self.poll()
+        return sum([task.done for task in self.tasks])
+
+    def ready(self):
+        return self.progress == len(self)
+
+    def wait(self, timeout=None):
+        start_time = time()
+        while not self.ready():
+            if timeout is not None and time() - start_time > timeout:
+                break
+            sleep(0.05)
+
+    def get(self, timeout=None):
+        self.wait(timeout)
+        return self.result
+
+    @property
+    def result(self):
+        return [task.result for task in self.tasks]
+
+    @property
+    def metadata(self):
+        return [task.metadata for task in self.tasks]
+
+    @property
+    def msg_ids(self):
+        return [msg_id for task in self.tasks for msg_id in task.msg_ids]
+
+    def __len__(self):
+        return len(self.tasks)
@@ -1,8 +1,20 @@
+import copy
 import logging
 
-from IPython.parallel import interactive, RemoteError
+import numpy as np
+
 logger = logging.getLogger(__name__)
-from dalek.parallel.util import set_engines_cpu_affinity
+from dalek.parallel.backends import (BaseBackend, IPythonBackend,
+                                     ChunkedMapResult)
+from dalek.parallel.fault_tolerance import ResilientTask, ResilientMapResult
+
+try:
+    from IPython.parallel import interactive
+except ImportError:
+    # IPython is only needed for the IPythonBackend
+    def interactive(f):
+        f.__module__ = '__main__'
+        return f
 
 try:
     from tardis.core import run_tardis
@@ -63,7 +75,99 @@ def fitter_worker(config_dict, atom_data=None):
 
     fitness, spectrum = fitness_function(radial1d_mdl)
 
-    return fitness, spectrum
+    return compact_worker_result(fitness, spectrum)
+
+
+@interactive
+def fitter_delta_worker(config_delta, atom_data=None):
+    """
+    Same as `fitter_worker` but only receives the changes to the default
+    configuration that was pushed to the engines with
+    `BaseLauncher.push_default_config`
+
+    Parameters
+    ----------
+
+    config_delta: ~dict
+        flat dictionary of dotted configuration keys and values
+
+    """
+
+    if atom_data is None:
+        if default_atom_data is None:
+            raise ValueError('AtomData not available - please specify')
+        else:
+            atom_data = default_atom_data
+
+    config_dict = apply_config_delta(default_config.deepcopy(), config_delta)
+    tardis_config = config_reader.Configuration.from_config_dict(
+        config_dict, atom_data=atom_data, validate=False)
+    radial1d_mdl = model.Radial1DModel(tardis_config)
+    simulation.run_radial1d(radial1d_mdl)
+
+    fitness, spectrum = fitness_function(radial1d_mdl)
+
+    return compact_worker_result(fitness, spectrum)
+
+
+@interactive
+def compact_worker_result(fitness, spectrum):
+    """
+    Reduce the output of the fitness function to the result format requested
+    through the engine variable `result_format`:
+
+    'spectrum' - (fitness, spectrum object)
+    'fitness' - (fitness, None)
+    'flux' - (fitness, float32 flux array); the first result of every engine
+        additionally carries the wavelength grid as third item
+    'features' - (fitness, float32 array of `fitness_function.features`)
+
+    Plain contiguous arrays are sent by IPython as zero-copy buffers.
+    """
+    global wavelength_sent
+    import numpy as np
+
+    if result_format == 'spectrum':
+        return fitness, spectrum
+    elif result_format == 'fitness':
+        return fitness, None
+    elif result_format == 'flux':
+        flux = np.ascontiguousarray(spectrum.flux_lambda.value,
+                                    dtype=np.float32)
+        if wavelength_sent:
+            return fitness, flux
+        wavelength_sent = True
+        return fitness, flux, np.asarray(spectrum.wavelength.value)
+    elif result_format == 'features':
+        return fitness, np.asarray(fitness_function.features(spectrum),
+                                   dtype=np.float32)
+    else:
+        raise ValueError('Unknown result format {0}'.format(result_format))
+
+@interactive
+def chunked_worker(task_list, atom_data=None):
+    """
+    Runs the pushed `chunk_item_worker` on every task of a chunk
+
+    Parameters
+    ----------
+
+    task_list: ~list
+        list of arguments for `chunk_item_worker` (e.g. config dicts)
+
+    Returns
+    -------
+        : ~list of (result, seconds) tuples
+
+    """
+    import time
+
+    results = []
+    for task in task_list:
+        start_time = time.time()
+        result = chunk_item_worker(task, atom_data=atom_data)
+        results.append((result, time.time() - start_time))
+    return results
 
 class BaseLauncher(object):
     """
@@ -73,8 +177,9 @@ class BaseLauncher(object):
     Parameters
     ----------
 
-    remote_clients: ~IPython.parallel.Client
-        IPython remote clients
+    remote_clients: ~IPython.parallel.Client or ~dalek.parallel.backends.BaseBackend
+        IPython remote clients or an execution backend (e.g.
+        `~dalek.parallel.backends.LocalBackend`)
 
     worker: func
         a function pointer to the worker function [default=simple_worker]
@@ -89,14 +194,17 @@ class BaseLauncher(object):
 
     def __init__(self, remote_clients, worker=simple_worker,
                  atom_data=None):
+        if isinstance(remote_clients, BaseBackend):
+            self.backend = remote_clients
+        else:
+            self.backend = IPythonBackend(remote_clients)
         self.remote_clients = remote_clients
-        self.prepare_remote_clients(remote_clients, atom_data)
+        self.prepare_remote_clients(self.backend, atom_data)
         self.worker = worker
-        self.lbv = remote_clients.load_balanced_view()
 
 
     @staticmethod
-    def prepare_remote_clients(clients, atom_data):
+    def prepare_remote_clients(backend, atom_data):
         """
         Preparing the remote clients for computation: Uploading the atomic
         data if available and making sure that the clients can run on different
@@ -105,8 +213,8 @@ class BaseLauncher(object):
         Parameters
         ----------
 
-        clients: IPython.parallel.Client
-            remote clients from ipython
+        backend: ~dalek.parallel.backends.BaseBackend
+            execution backend
 
         atom_data: tardis.atomic.AtomData or None
             remote atomic data, if None each queue needs to bring their own one
@@ -114,17 +222,27 @@ class BaseLauncher(object):
 
         logger.info('Sending initial atomic dataset to remote '
                     'clients and importing tardis')
-        clients.block = True
-        for client in clients:
-            client['default_atom_data'] = atom_data
-            client.execute('from tardis.io import config_reader')
-            client.execute('from tardis import model, simulation')
+        backend.push({'default_atom_data': atom_data})
+        backend.execute('from tardis.io import config_reader')
+        backend.execute('from tardis import model, simulation')
 
-        clients.block = False
+        backend.set_cpu_affinity()
 
+    def push_default_config(self, default_config):
+        """
+        Make the default configuration resident on the remote clients so that
+        workers like `fitter_delta_worker` only need to be sent the
+        configuration delta of each parameter set
+
+        Parameters
+        ----------
 
-        for client in clients:
-            client.apply(set_engines_cpu_affinity)
+        default_config: ~tardis.io.config_reader.ConfigurationNameSpace
+        """
+        logger.info('Sending default configuration to remote clients')
+        self.backend.push({'default_config': default_config})
+        self.backend.execute('from dalek.parallel.parameter_collection '
+                             'import apply_config_delta')
 
     def queue_parameter_set(self, parameter_set_dict, atom_data=None):
         """
@@ -137,8 +255,8 @@ class BaseLauncher(object):
             a valid configuration dictionary for TARDIS
         """
 
-        return self.lbv.apply(self.worker, parameter_set_dict,
-                              atom_data=atom_data)
+        return self.backend.apply(self.worker, parameter_set_dict,
+                                  atom_data=atom_data)
 
     def queue_parameter_set_list(self, parameter_set_list,
                                       atom_data=None):
@@ -152,25 +270,230 @@ class BaseLauncher(object):
             a list of valid configuration dictionary for TARDIS
         """
 
-        return self.lbv.map(self.worker, parameter_set_list,
-                            atom_data=atom_data)
+        return self.backend.map(self.worker, parameter_set_list,
+                                atom_data=atom_data)
+
+    def for_engines(self, engine_ids):
+        """
+        Launcher sharing the prepared remote clients of this launcher but
+        only running tasks on the engines engine_ids (an entry of the
+        backend's `engine_groups`)
+
+        Parameters
+        ----------
+
+        engine_ids: ~list or None
+
+        Returns
+        -------
+            : ~dalek.parallel.launcher.BaseLauncher
+        """
+        launcher = copy.copy(self)
+        launcher.backend = self.backend.restrict(engine_ids)
+        return launcher
 
 
 
 class FitterLauncher(BaseLauncher):
+    """
+    Launcher evaluating parameter sets with the pushed fitness function
+
+    Parameters
+    ----------
+
+    remote_clients: ~IPython.parallel.Client or ~dalek.parallel.backends.BaseBackend
+
+    fitness_function: ~dalek.fitter.fitness_function.BaseFitnessFunction
+
+    atom_data: ~tardis.atomic.AtomData
+
+    worker: func
+        a function pointer to the worker function [default=fitter_worker]
+
+    chunk_size: ~int or 'auto'
+        number of parameter sets sent to an engine in one task. 'auto' chooses
+        the chunk size such that a chunk takes about target_chunk_time
+        seconds, based on the run times recorded with `record_time_elapsed`
+        [default=1]
+
+    target_chunk_time: ~float
+        run time of a chunk in seconds aimed at by chunk_size='auto'
+        [default=10.]
+
+    result_format: ~str
+        what the workers send back besides the fitness - one of
+        `result_formats` (see `compact_worker_result`) [default='spectrum']
+
+    timeout: ~float
+        seconds a task may run before it is abandoned and resubmitted
+        [default=None - no timeout]
+
+    max_retries: ~int
+        number of resubmissions (on other engines where possible) of a task
+        that raised or timed out [default=0]
+
+    speculation_threshold: ~float
+        fraction of a batch that has to be finished before the tasks still
+        running are speculatively duplicated [default=None - never]
+
+    penalty_fitness: ~float
+        fitness of parameter sets whose evaluation failed
+        [default=np.inf]
+    """
 
     def __init__(self, remote_clients, fitness_function, atom_data=None,
-                 worker=fitter_worker):
+                 worker=fitter_worker, chunk_size=1, target_chunk_time=10.,
+                 result_format='spectrum', timeout=None, max_retries=0,
+                 speculation_threshold=None, penalty_fitness=np.inf):
+        if result_format not in result_formats:
+            raise ValueError('Unknown result format {0} - allowed are '
+                             '{1}'.format(result_format, result_formats))
         self.fitness_function = fitness_function
+        self.result_format = result_format
+        self.worker = worker
+        self.chunk_size = chunk_size
+        self.target_chunk_time = target_chunk_time
+        self.median_time_elapsed = None
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.speculation_threshold = speculation_threshold
+        self.penalty_fitness = penalty_fitness
+        if (self.fault_tolerant and isinstance(remote_clients, BaseBackend)
+                and not remote_clients.supports_fault_tolerance):
+            raise ValueError('{0} can not abort or avoid hung workers - '
+                             'timeout, max_retries and speculation_threshold '
+                             'need an IPython cluster'.format(
+                                 remote_clients.__class__.__name__))
         super(FitterLauncher, self).__init__(remote_clients,
                                            worker=worker,
                                            atom_data=atom_data)
 
-    def prepare_remote_clients(self, clients, atom_data):
+    def prepare_remote_clients(self, backend, atom_data):
 
-        super(FitterLauncher, self).prepare_remote_clients(clients, atom_data)
-        clients.block = True
-        for client in clients:
-            client['fitness_function'] = self.fitness_function
-        clients.block = False
+        super(FitterLauncher, self).prepare_remote_clients(backend, atom_data)
+        backend.push({'fitness_function': self.fitness_function,
+                      'compact_worker_result': compact_worker_result,
+                      'result_format': self.result_format,
+                      'wavelength_sent': False})
+        if self.chunk_size != 1:
+            backend.push({'chunk_item_worker': self.worker})
         logger.info('Initial setup complete')
+
+    @property
+    def fault_tolerant(self):
+        return (self.timeout is not None or self.max_retries > 0 or
+                self.speculation_threshold is not None)
+
+    def submit_task(self, worker, task, excluded_engine_ids, atom_data=None):
+        return self.backend.apply_excluding(excluded_engine_ids, worker, task,
+                                            atom_data=atom_data)
+
+    def queue_parameter_set(self, parameter_set_dict, atom_data=None):
+        """
+        Add single parameter set to the queue
+
+        Parameters
+        ----------
+
+        parameter_set_dict: ~dict
+            a valid configuration dictionary for TARDIS
+        """
+        if not self.fault_tolerant:
+            return super(FitterLauncher, self).queue_parameter_set(
+                parameter_set_dict, atom_data=atom_data)
+
+        return ResilientTask(
+            lambda task, excluded_engine_ids: self.submit_task(
+                self.worker, task, excluded_engine_ids, atom_data=atom_data),
+            parameter_set_dict, timeout=self.timeout,
+            max_retries=self.max_retries,
+            failure_result=(self.penalty_fitness, None))
+
+    def queue_resilient_list(self, worker, task_list, failure_results,
+                             atom_data=None):
+        tasks = [ResilientTask(
+            lambda task, excluded_engine_ids: self.submit_task(
+                worker, task, excluded_engine_ids, atom_data=atom_data),
+            task, timeout=self.timeout, max_retries=self.max_retries,
+            failure_result=failure_result, queued=True)
+            for task, failure_result in zip(task_list, failure_results)]
+        return ResilientMapResult(tasks, len(self.backend),
+                                  self.speculation_threshold)
+
+    def record_time_elapsed(self, time_elapsed):
+        """
+        Record the run times of evaluated parameter sets for choosing the
+        chunk size automatically
+
+        Parameters
+        ----------
+
+        time_elapsed: ~np.ndarray
+            run times in seconds
+        """
+        time_elapsed = np.asarray(time_elapsed, dtype=np.float64)
+        time_elapsed = time_elapsed[np.isfinite(time_elapsed) &
+                                    (time_elapsed > 0)]
+        if len(time_elapsed) > 0:
+            self.median_time_elapsed = np.median(time_elapsed)
+
+    def get_chunk_size(self, number_of_tasks):
+        """
+        Chunk size for submitting number_of_tasks parameter sets - an
+        automatic chunk size never leaves engines without work
+
+        Parameters
+        ----------
+
+        number_of_tasks: ~int
+
+        Returns
+        -------
+            : ~int
+        """
+        if self.chunk_size != 'auto':
+            return int(self.chunk_size)
+        if self.median_time_elapsed is None:
+            return 1
+        max_chunk_size = int(np.ceil(number_of_tasks /
+                                     float(len(self.backend))))
+        chunk_size = int(self.target_chunk_time / self.median_time_elapsed)
+        return int(np.clip(chunk_size, 1, max(max_chunk_size, 1)))
+
+    def queue_parameter_set_list(self, parameter_set_list, atom_data=None):
+        """
+        Add a list of parameter sets to the queue - in chunks of parameter sets
+        if a chunk size is set
+
+        Parameters
+        ----------
+
+        parameter_set_list: ~list of ~dict
+            a list of valid configuration dictionary for TARDIS
+        """
+        chunk_size = self.get_chunk_size(len(parameter_set_list))
+        if chunk_size == 1:
+            if self.fault_tolerant:
+                return self.queue_resilient_list(
+                    self.worker, parameter_set_list,
+                    [(self.penalty_fitness, None)] * len(parameter_set_list),
+                    atom_data=atom_data)
+            return super(FitterLauncher, self).queue_parameter_set_list(
+                parameter_set_list, atom_data=atom_data)
+
+        logger.debug('Submitting {0} parameter sets in chunks of {1}'.format(
+            len(parameter_set_list), chunk_size))
+        chunks = [parameter_set_list[i:i + chunk_size]
+                  for i in xrange(0, len(parameter_set_list), chunk_size)]
+        if self.fault_tolerant:
+            chunk_result = self.queue_resilient_list(
+                chunked_worker, chunks,
+                [[((self.penalty_fitness, None), 0.)] * len(chunk)
+                 for chunk in chunks], atom_data=atom_data)
+        else:
+            chunk_result = self.backend.map(chunked_worker, chunks,
+                                            atom_data=atom_data)
+        return ChunkedMapResult(chunk_result, [len(chunk) for chunk in chunks])
+
+
+result_formats = ['spectrum', 'fitness', 'flux', 'features']
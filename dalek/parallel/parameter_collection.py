@@ -2,10 +2,14 @@ import itertools
 import operator
 import logging
 from functools import reduce
+import numpy as np
 import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# configuration item set from the 'dalek.seed' column
+SEED_CONFIG_ITEM = 'montecarlo.seed'
+
 def broadcast(lst, length):
     """Extend a given list so it has the given length by repeating values in it.
 
@@ -63,6 +67,59 @@ def apply_dict(d1, d2):
         leaf[path[-1]] = d2[key]
     return d_new
 
+# compiled key paths of dotted configuration keys - filled once per process
+_compiled_config_keys = {}
+
+def compile_config_key(key):
+    """Split a dotted configuration key into the path of dictionary keys and
+    list indices ('item<n>' parts) leading to its value.
+
+    Arguments:
+    ----------
+    key -- dotted configuration key (e.g. 'model.abundances.O')
+
+    Return:
+    -------
+    A tuple of path elements (str for dictionary keys, int for list indices)
+    """
+    if key not in _compiled_config_keys:
+        path = []
+        for part in key.split('.'):
+            if part.startswith('item') and part[4:].isdigit():
+                path.append(int(part[4:]))
+            else:
+                path.append(part)
+        _compiled_config_keys[key] = tuple(path)
+    return _compiled_config_keys[key]
+
+def apply_config_delta(config, config_delta):
+    """Set the values of a flat {dotted.key: value} delta in a (nested)
+    configuration in place. Values replacing a quantity get the unit of the
+    quantity they replace.
+
+    Arguments:
+    ----------
+    config -- nested configuration (e.g. a ConfigurationNameSpace)
+    config_delta -- dictionary of dotted configuration keys and values
+
+    Return:
+    -------
+    config
+    """
+    for key, value in config_delta.items():
+        path = compile_config_key(key)
+        container = config
+        for part in path[:-1]:
+            container = container[part]
+        if isinstance(container, dict):
+            current_value = container.get(path[-1], None)
+        else:
+            current_value = container[path[-1]]
+        if hasattr(current_value, 'unit') and not hasattr(value, 'unit'):
+            value = value * current_value.unit
+        container[path[-1]] = value
+    return config
+
 def combine_parameter_sets(table1, table2, combiner):
     """Create a new parameter set from two parameter sets via a combiner function.
 
@@ -125,7 +182,7 @@ class ParameterCollection(pd.DataFrame):
 
 
 
-    def to_config(self, tardis_configuration):
+    def to_config(self, tardis_configuration, config_overrides=None):
         """
 
         Parameters
@@ -133,19 +190,66 @@ class ParameterCollection(pd.DataFrame):
 
         tardis_configuration: tardis.io.ConfigurationNameSpace
             xxxx
+
+        config_overrides: ~dict
+            {dotted.key: value} configuration items set in every
+            configuration after the parameters (e.g. the number of packets of
+            a fidelity level) [default=None]
+
+        A 'dalek.seed' column sets the Monte Carlo seed (montecarlo.seed) of
+        each row - used to run replicates of a parameter set. Negative or
+        missing seeds keep the seed of the configuration.
         """
         configuration_list = []
         for i, item in self.iterrows():
             current_config = tardis_configuration.deepcopy()
             for key, value in item.to_dict().items():
+                if key == 'dalek.seed':
+                    if value >= 0:
+                        current_config.set_config_item(SEED_CONFIG_ITEM,
+                                                       int(value))
+                    continue
                 if key.lower().strip().startswith('dalek.'):
                     logger.debug('Skipping dalek keys')
                     continue
                 current_config.set_config_item(key, value)
+            for key, value in (config_overrides or {}).items():
+                current_config.set_config_item(key, value)
             configuration_list.append(current_config)
 
         return configuration_list
 
+    def to_config_deltas(self, config_overrides=None):
+        """
+        Flat configuration deltas ({dotted.key: value} with plain python
+        values) of all rows - the counterpart of `to_config` for engines that
+        hold the default configuration and apply the delta with
+        `apply_config_delta`
+
+        Parameters
+        ----------
+
+        config_overrides: ~dict
+            {dotted.key: value} configuration items added to every delta
+            [default=None]
+
+        Returns
+        -------
+            : ~list of ~dict
+        """
+        columns = [column for column in self.columns
+                   if not column.lower().strip().startswith('dalek.')]
+        config_deltas = [dict(zip(columns, row))
+                         for row in self[columns].values.tolist()]
+        if 'dalek.seed' in self.columns:
+            for config_delta, seed in zip(config_deltas,
+                                          self['dalek.seed'].values):
+                if seed >= 0:
+                    config_delta[SEED_CONFIG_ITEM] = int(seed)
+        for config_delta in config_deltas:
+            config_delta.update(config_overrides or {})
+        return config_deltas
+
 class ParameterCollection2(object):
     """A set of parameters -- key/value pairs used for software configuration purposes.
     """
@@ -0,0 +1,117 @@
+from dalek.parallel.backends import (LocalBackend, ChunkedMapResult,
+                                     group_engines)
+from dalek.parallel.launcher import (chunked_worker, compact_worker_result,
+                                     FitterLauncher)
+import numpy as np
+import pytest
+
+
+def namespace_worker(x, offset=0):
+    # resident_factor and sqrt only exist in the worker namespace
+    return sqrt(x) * resident_factor + offset
+
+
+def chunk_item_test_worker(x, atom_data=None):
+    return namespace_worker(x)
+
+
+def spectrum_worker(x):
+    class Quantity(object):
+        def __init__(self, value):
+            self.value = value
+
+    class Spectrum(object):
+        wavelength = Quantity(np.linspace(3000., 9000., 5))
+        flux_lambda = Quantity(np.ones(5) * x)
+
+    return compact_worker_result(x, Spectrum())
+
+
+def failing_worker(x):
+    raise ValueError('raising a test exception')
+
+
+class TestLocalBackend(object):
+
+    def setup(self):
+        self.backend = LocalBackend(2)
+        self.backend.push({'resident_factor': 2.0})
+        self.backend.execute('from math import sqrt')
+
+    def teardown(self):
+        self.backend.stop_pool()
+
+    def test_apply(self):
+        result = self.backend.apply(namespace_worker, 16., offset=1)
+        assert result.get(timeout=10) == 9.
+        assert set(result.metadata.keys()) == set(['started', 'completed',
+                                                   'engine_id'])
+
+    def test_map(self):
+        result = self.backend.map(namespace_worker, [1., 4., 9.])
+        result.wait(timeout=10)
+        assert result.progress == len(result) == 3
+        assert result.result == [2., 4., 6.]
+        assert len(result.metadata) == 3
+
+    def test_push_after_start(self):
+        self.backend.apply(namespace_worker, 1.).get(timeout=10)
+        self.backend.push({'resident_factor': 3.0})
+        assert self.backend.apply(namespace_worker, 1.).get(timeout=10) == 3.
+
+    def test_error(self):
+        result = self.backend.apply(failing_worker, 1.)
+        with pytest.raises(ValueError):
+            result.get(timeout=10)
+
+    def test_chunked_map(self):
+        self.backend.push({'chunk_item_worker': chunk_item_test_worker,
+                           'namespace_worker': namespace_worker})
+        chunks = [[1., 4.], [9., 16.], [25.]]
+        result = ChunkedMapResult(self.backend.map(chunked_worker, chunks),
+                                  [len(chunk) for chunk in chunks])
+        result.wait(timeout=10)
+        assert result.progress == len(result) == 5
+        assert result.result == [2., 4., 6., 8., 10.]
+        metadata = result.metadata
+        assert len(metadata) == 5
+        assert metadata[0]['completed'] == metadata[1]['started']
+
+    @pytest.mark.parametrize('result_format', ['fitness', 'flux'])
+    def test_compact_worker_result(self, result_format):
+        self.backend.push({'compact_worker_result': compact_worker_result,
+                           'result_format': result_format,
+                           'wavelength_sent': False, 'np': np})
+        results = self.backend.map(spectrum_worker, [1., 2., 3.]).get(
+            timeout=10)
+        assert [result[0] for result in results] == [1., 2., 3.]
+        if result_format == 'fitness':
+            assert [result[1] for result in results] == [None, None, None]
+        else:
+            for x, result in zip([1., 2., 3.], results):
+                assert result[1].dtype == np.float32
+                np.testing.assert_array_equal(result[1], x)
+            # the wavelength grid is only sent with the first result of each
+            # worker process
+            assert 1 <= len([result for result in results
+                             if len(result) == 3]) <= 2
+
+
+def test_group_engines():
+    engine_hosts = {0: 'node2', 1: 'node1', 2: 'node2', 3: 'node1',
+                    4: 'node3', 5: 'node3'}
+    assert group_engines(engine_hosts) == [[1, 3], [0, 2], [4, 5]]
+    assert group_engines(engine_hosts, 2) == [[1, 3, 0], [2, 4, 5]]
+    assert group_engines(engine_hosts, 6) == [[1], [3], [0], [2], [4], [5]]
+    with pytest.raises(ValueError):
+        group_engines(engine_hosts, 7)
+
+
+def test_local_backend_rejects_fault_tolerance():
+    backend = LocalBackend(1)
+    for fault_tolerance in [{'timeout': 10.}, {'max_retries': 2},
+                            {'speculation_threshold': 0.8}]:
+        with pytest.raises(ValueError):
+            FitterLauncher(backend, None, **fault_tolerance)
+    assert not FitterLauncher(backend, None).fault_tolerant
+    backend.stop_pool()
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from dalek.parallel.fault_tolerance import ResilientTask, ResilientMapResult
+
+
+class FakeAsyncResult(object):
+    """
+    Finishes after a number of polls - with value, an exception or never
+    (polls_until_ready=None)
+    """
+
+    def __init__(self, value, engine_id, polls_until_ready=0):
+        self.value = value
+        self.polls_until_ready = polls_until_ready
+        self.aborted = False
+        self.msg_ids = ['msg{0}'.format(id(self))]
+        now = datetime.now()
+        self.metadata = {'started': now, 'completed': now,
+                         'engine_id': engine_id}
+
+    def abort(self):
+        self.aborted = True
+
+    def ready(self):
+        if self.polls_until_ready is None:
+            return False
+        self.polls_until_ready -= 1
+        return self.polls_until_ready < 0
+
+    def get(self, timeout=None):
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+class FakeSubmitter(object):
+    """
+    Hands out the prepared outcomes one attempt after the other and records
+    the excluded engines of each submission
+    """
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.excluded_engine_ids = []
+
+    def __call__(self, task, excluded_engine_ids):
+        self.excluded_engine_ids.append(list(excluded_engine_ids))
+        value, engine_id, polls_until_ready = self.outcomes.pop(0)
+        if value is not None and not isinstance(value, Exception):
+            value = value * task
+        return FakeAsyncResult(value, engine_id, polls_until_ready)
+
+
+def test_retry_on_other_engine():
+    submitter = FakeSubmitter([(ValueError('broken engine'), 3, 0),
+                               (1., 4, 0)])
+    task = ResilientTask(submitter, 2., max_retries=1,
+                         failure_result=np.inf)
+    assert task.get(timeout=1) == 2.
+    assert submitter.excluded_engine_ids == [[], [3]]
+    assert task.metadata['attempts'] == 2
+    assert not task.metadata['failed']
+    # the failed attempt is still cleaned up
+    assert len(task.msg_ids) == 2
+
+
+def test_failure_result():
+    submitter = FakeSubmitter([(ValueError('broken engine'), 3, 0),
+                               (ValueError('broken engine'), 4, 0)])
+    task = ResilientTask(submitter, 2., max_retries=1,
+                         failure_result=np.inf)
+    assert task.get(timeout=1) == np.inf
+    assert task.metadata['failed']
+    assert task.metadata['engine_id'] == -1
+
+
+def test_timeout():
+    submitter = FakeSubmitter([(None, 0, None), (1., 1, 0)])
+    task = ResilientTask(submitter, 2., timeout=0.01, max_retries=1)
+    assert task.get(timeout=1) == 2.
+    # the retry avoids the hanging engine and the abandoned attempt is still
+    # cleaned up
+    assert submitter.excluded_engine_ids == [[], [0]]
+    assert len(task.msg_ids) == 2
+
+
+def test_speculation():
+    # the last task hangs forever - its speculative duplicate finishes
+    submitters = [FakeSubmitter([(1., 0, 0)]) for _ in xrange(9)]
+    submitters.append(FakeSubmitter([(None, 0, None), (1., 1, 0)]))
+    tasks = [ResilientTask(submitter, float(i), queued=True)
+             for i, submitter in enumerate(submitters)]
+    map_result = ResilientMapResult(tasks, 2, speculation_threshold=0.9)
+    map_result.wait(timeout=1)
+    assert map_result.ready()
+    assert map_result.result == [float(i) for i in xrange(10)]
+    assert tasks[-1].speculated
+    assert [task.speculated for task in tasks[:-1]] == [False] * 9
+    # the losing attempt is aborted but kept for cleaning
+    assert tasks[-1].abandoned_attempts[0].aborted
+    assert len(tasks[-1].msg_ids) == 2
+
+
+def test_timeout_clock_starts_when_running():
+    # with one worker the queued tasks must not time out while waiting
+    submitters = [FakeSubmitter([(1., 0, 3)]) for _ in xrange(5)]
+    tasks = [ResilientTask(submitter, float(i), timeout=10., queued=True)
+             for i, submitter in enumerate(submitters)]
+    map_result = ResilientMapResult(tasks, 1)
+    map_result.progress
+    assert [attempt[1] is not None for task in tasks
+            for attempt in task.attempts] == [True, False, False, False,
+                                              False]
+    map_result.wait(timeout=1)
+    assert map_result.result == [float(i) for i in xrange(5)]
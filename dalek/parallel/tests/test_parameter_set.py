@@ -1,5 +1,6 @@
 import pytest
-from dalek.parallel.parameter_collection import ParameterCollection, broadcast, merge_dicts, apply_dict
+from dalek.parallel.parameter_collection import (ParameterCollection, broadcast,
+    merge_dicts, apply_dict, apply_config_delta)
 from tardis.io.config_reader import ConfigurationNameSpace
 
 def test_simple_cartesian1():
@@ -80,3 +81,36 @@ def test_apply_dict():
 
 def test_combine_parameter_sets():
     pass
+
+def test_to_config_deltas():
+    config = ConfigurationNameSpace({'a' : {'b' : 1, 'c' : [2, 3]}, 'd' : 4})
+    param = ParameterCollection({'a.b' : [0.1, 0.2], 'a.c.item1' : [0.3, 0.4],
+                                 'dalek.fitness' : [1.0, 2.0]})
+    deltas = param.to_config_deltas()
+    assert deltas == [{'a.b' : 0.1, 'a.c.item1' : 0.3},
+                      {'a.b' : 0.2, 'a.c.item1' : 0.4}]
+    assert all([type(value) is float for value in deltas[0].values()])
+
+    new_config = apply_config_delta(config.deepcopy(), deltas[1])
+    assert new_config == {'a' : {'b' : 0.2, 'c' : [2, 0.4]}, 'd' : 4}
+    assert config == {'a' : {'b' : 1, 'c' : [2, 3]}, 'd' : 4}
+
+
+def test_config_overrides():
+    config = ConfigurationNameSpace({'a' : {'b' : 1}, 'd' : 4})
+    param = ParameterCollection({'a.b' : [0.1, 0.2]})
+    configs = param.to_config(config, config_overrides={'d' : 5})
+    assert [item['d'] for item in configs] == [5, 5]
+    assert configs[1]['a']['b'] == 0.2
+    assert param.to_config_deltas(config_overrides={'d' : 5}) == [
+        {'a.b' : 0.1, 'd' : 5}, {'a.b' : 0.2, 'd' : 5}]
+
+
+def test_seed_column():
+    config = ConfigurationNameSpace({'a' : {'b' : 1},
+                                     'montecarlo' : {'seed' : 23111963}})
+    param = ParameterCollection({'a.b' : [0.1, 0.2], 'dalek.seed' : [5, -1]})
+    configs = param.to_config(config)
+    assert [item['montecarlo']['seed'] for item in configs] == [5, 23111963]
+    assert param.to_config_deltas() == [{'a.b' : 0.1, 'montecarlo.seed' : 5},
+                                        {'a.b' : 0.2}]
@@ -1,3 +1,7 @@
+import numpy as np
+from scipy import sparse
+
+
 def savitzky_golay(y, window_size, order, deriv=0, rate=1):
     r"""Smooth (and optionally differentiate) data with a Savitzky-Golay filter.
     The Savitzky-Golay filter removes high frequency noise from data.
@@ -68,4 +72,100 @@ def savitzky_golay(y, window_size, order, deriv=0, rate=1):
     firstvals = y[0] - np.abs( y[1:half_window+1][::-1] - y[0] )
     lastvals = y[-1] + np.abs(y[-half_window-1:-1][::-1] - y[-1])
     y = np.concatenate((firstvals, y, lastvals))
-    return np.convolve( m[::-1], y, mode='valid')
\ No newline at end of file
+    return np.convolve( m[::-1], y, mode='valid')
+
+
+def wavelength_bin_edges(wavelength):
+    """
+    Edges of the bins around the points of an ascending wavelength grid -
+    halfway between neighbouring points, the outer bins are symmetric
+    around the first and last point
+
+    Parameters
+    ----------
+
+    wavelength: ~np.ndarray
+
+    Returns
+    -------
+        : ~np.ndarray
+        len(wavelength) + 1 edges
+    """
+    wavelength = np.asarray(wavelength, dtype=np.float64)
+    middle = 0.5 * (wavelength[1:] + wavelength[:-1])
+    return np.concatenate(([2 * wavelength[0] - middle[0]], middle,
+                           [2 * wavelength[-1] - middle[-1]]))
+
+
+def rebin_matrix(source_wavelength, target_wavelength):
+    """
+    Sparse flux-conserving rebinning operator from one wavelength grid to
+    another: the flux density in a target bin is the mean of the source flux
+    density over the bin (weighted by the overlap with the source bins), so
+    noise is averaged instead of point sampled. Target bins that are only
+    partly covered by the source grid get the mean over the covered part,
+    target bins outside the source grid the flux of the nearest source bin.
+
+    Parameters
+    ----------
+
+    source_wavelength: ~np.ndarray
+        ascending or descending (e.g. TARDIS spectra) wavelength grid
+
+    target_wavelength: ~np.ndarray
+        ascending wavelength grid (e.g. of the observed spectrum)
+
+    Returns
+    -------
+        : ~scipy.sparse.csr_matrix
+        (len(target_wavelength), len(source_wavelength)) - the rebinned flux
+        is rebin_matrix.dot(flux) for one spectrum and
+        rebin_matrix.dot(fluxes.T).T for a (spectra, wavelength) array
+    """
+    source_wavelength = np.asarray(source_wavelength, dtype=np.float64)
+    target_wavelength = np.asarray(target_wavelength, dtype=np.float64)
+    source_order = np.argsort(source_wavelength, kind='mergesort')
+    source_edges = wavelength_bin_edges(source_wavelength[source_order])
+    target_edges = wavelength_bin_edges(target_wavelength)
+
+    # every segment between two consecutive edges of both grids lies in
+    # exactly one source and one target bin
+    edges = np.union1d(source_edges, target_edges)
+    middles = 0.5 * (edges[1:] + edges[:-1])
+    lengths = np.diff(edges)
+    source_bins = np.searchsorted(source_edges, middles) - 1
+    target_bins = np.searchsorted(target_edges, middles) - 1
+    overlapping = ((source_bins >= 0) & (source_bins < len(source_wavelength)) &
+                   (target_bins >= 0) & (target_bins < len(target_wavelength)))
+
+    rows = target_bins[overlapping]
+    columns = source_order[source_bins[overlapping]]
+    weights = lengths[overlapping]
+    covered_width = np.bincount(rows, weights=weights,
+                                minlength=len(target_wavelength))
+    weights = weights / covered_width[rows]
+
+    uncovered = np.where(covered_width == 0)[0]
+    nearest = np.clip(np.searchsorted(source_wavelength[source_order],
+                                      target_wavelength[uncovered]),
+                      0, len(source_wavelength) - 1)
+    rows = np.concatenate((rows, uncovered))
+    columns = np.concatenate((columns, source_order[nearest]))
+    weights = np.concatenate((weights, np.ones(len(uncovered))))
+
+    return sparse.csr_matrix((weights, (rows, columns)),
+                             shape=(len(target_wavelength),
+                                    len(source_wavelength)))
+
+
+def rebin_flux(source_wavelength, flux, target_wavelength):
+    """
+    Flux-conserving rebinning of one spectrum (flux of shape (wavelength,))
+    or several ((spectra, wavelength)) onto target_wavelength - see
+    `rebin_matrix`
+    """
+    matrix = rebin_matrix(source_wavelength, target_wavelength)
+    flux = np.asarray(flux, dtype=np.float64)
+    if flux.ndim == 1:
+        return matrix.dot(flux)
+    return matrix.dot(flux.T).T